@@ -5,12 +5,14 @@ import sys
 import asyncio
 import json
 import base64
+import hashlib
 import io
 import re
 import datetime
+import time
+import threading
 import webbrowser
-import PyPDF2
-from PIL import Image
+from contextlib import asynccontextmanager
 from dotenv import load_dotenv
 
 # --- SETUP PATHS ---
@@ -19,18 +21,51 @@ parent_dir = os.path.dirname(current_dir)
 if parent_dir not in sys.path:
     sys.path.append(parent_dir)
 
-import google.generativeai as genai
-# from google import genai
-
 from fastapi import FastAPI, WebSocket
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.staticfiles import StaticFiles
 import uvicorn
 
 # IMPORT MEMORY
 try:
     from memory import MemoryManager, SessionManager
+    from ipc import HardwareCommandClient
+    from profiling import STARTUP
+    from uploads import UploadAssembler, UploadError, pack_binary_frame, parse_binary_frame, load_image, read_document
+    from image_pipeline import ImageCache, prepare_image
+    from router import ROUTING, classify, upgrade_reason
+    from response_cache import RESPONSE_CACHE
+    from memory_index import get_memory_index
+    from connection import ConnectionSession, broadcast, latest_session
+    from executors import PoolBusy, PoolTimeout, run_in_pool
+    from preview import BOUNDARY, PreviewFeed
+    from vision_ingest import INGEST_TYPES, VisionIngest
+    from prefetch import WEATHER_CITY, Prefetcher, prefetch_stats, research_topic, search_query, shopping_request, tool_intent
+    from stt import MAX_UTTERANCE, SAMPLE_RATE, SpeechStream, available as stt_available, load_model as load_stt_model
+    from tts import SPEAKER, audio_mime
+    from scheduler import SCHEDULER, QuotaExhausted, SchedulerBusy
+    from jobs import JOBS, JobsBusy
+    from metrics import METRICS, MODEL_LATENCY, REQUEST_LATENCY, CACHE_LOOKUPS, ERRORS, timed, trace_request
 except ImportError:
     from agent.memory import MemoryManager, SessionManager
+    from agent.ipc import HardwareCommandClient
+    from agent.profiling import STARTUP
+    from agent.uploads import UploadAssembler, UploadError, pack_binary_frame, parse_binary_frame, load_image, read_document
+    from agent.image_pipeline import ImageCache, prepare_image
+    from agent.router import ROUTING, classify, upgrade_reason
+    from agent.response_cache import RESPONSE_CACHE
+    from agent.memory_index import get_memory_index
+    from agent.connection import ConnectionSession, broadcast, latest_session
+    from agent.executors import PoolBusy, PoolTimeout, run_in_pool
+    from agent.preview import BOUNDARY, PreviewFeed
+    from agent.vision_ingest import INGEST_TYPES, VisionIngest
+    from agent.prefetch import WEATHER_CITY, Prefetcher, prefetch_stats, research_topic, search_query, shopping_request, tool_intent
+    from agent.stt import MAX_UTTERANCE, SAMPLE_RATE, SpeechStream, available as stt_available, load_model as load_stt_model
+    from agent.tts import SPEAKER, audio_mime
+    from agent.scheduler import SCHEDULER, QuotaExhausted, SchedulerBusy
+    from agent.jobs import JOBS, JobsBusy
+    from agent.metrics import METRICS, MODEL_LATENCY, REQUEST_LATENCY, CACHE_LOOKUPS, ERRORS, timed, trace_request
 
 # --- CONFIGURATION ---
 warnings.filterwarnings("ignore")
@@ -38,16 +73,63 @@ logging.getLogger("uvicorn.error").disabled = True
 logging.getLogger("uvicorn.access").disabled = True
 
 load_dotenv()
-# Note: We configure keys dynamically in the class
-if os.getenv("GOOGLE_API_KEY"):
-    genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
+
+# --- LAZY HEAVY IMPORTS ---
+# google.generativeai (grpc/protobuf), PIL, PyPDF2 and tools.py (selenium, pyautogui)
+# load on first use or in the background warm-up, never before the server is up.
+_GENAI_LOCK = threading.Lock()
+_GENAI_CONFIGURED = False
+
+def _genai():
+    global _GENAI_CONFIGURED
+    genai = STARTUP.lazy_import("google.generativeai")
+    with _GENAI_LOCK:
+        if not _GENAI_CONFIGURED:
+            # Default only: every call is bound to a pooled key by agent/scheduler.py
+            if os.getenv("GOOGLE_API_KEY"):
+                genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
+            _GENAI_CONFIGURED = True
+    return genai
+
+def _tools():
+    return STARTUP.lazy_import("tools")
+
+def _warm_up():
+    for name in ("google.generativeai", "tools", "PIL.Image"):
+        try: STARTUP.lazy_import(name)
+        except Exception as e: print(f"⚠️ Warm-up skipped {name}: {e}")
+    _genai()
+    with STARTUP.stage("memory index bootstrap"):
+        get_memory_index().bootstrap()
+    if stt_available():
+        # Otherwise the first utterance waits seconds for the model
+        try:
+            with STARTUP.stage("speech model load"): load_stt_model()
+        except Exception as e: print(f"⚠️ Warm-up skipped speech model: {e}")
+    print(STARTUP.report())
 
 # --- HARDWARE CONNECTION ---
+# Single process: main.py registers a direct callback.
+# Multi-worker: commands go over IPC to the process that owns the camera.
 SYSTEM_CALLBACK = None
+HARDWARE_CLIENT = HardwareCommandClient.from_env()
 def set_system_state_callback(callback_func):
     global SYSTEM_CALLBACK
     SYSTEM_CALLBACK = callback_func
 
+def send_hardware_command(command):
+    if SYSTEM_CALLBACK:
+        SYSTEM_CALLBACK(command)
+        return True
+    if HARDWARE_CLIENT:
+        return HARDWARE_CLIENT.send(command)
+    return False
+
+# Annotated vision frames for the web UI (only encoded while someone watches)
+PREVIEW = PreviewFeed(send_hardware_command)
+# Browser camera frames / landmarks for the vision worker (latest frame wins)
+VISION_INGEST = VisionIngest()
+
 # ==========================================
 # 1. HELPER CLASSES
 # ==========================================
@@ -60,11 +142,24 @@ class SafetyGuardrail:
 class MultimodalProcessor:
     @staticmethod
     def decode_image(image_data):
+        """Legacy path: base64 data URL inside a JSON text frame."""
         try:
             if "," in image_data: image_data = image_data.split(",")[1]
-            return Image.open(io.BytesIO(base64.b64decode(image_data)))
+            return load_image(io.BytesIO(base64.b64decode(image_data)))
         except: return None
 
+    @staticmethod
+    def open_image(fileobj):
+        """Binary path: spooled upload file -> downscaled PIL image."""
+        try: return load_image(fileobj)
+        except: return None
+
+# Questions about earlier conversations -> get_past_memory instead of guessing
+RECALL_PATTERN = re.compile(
+    r"(what did (we|i|you)|did (we|i) (talk|discuss|say|mention)|last time|do you remember|"
+    r"remember when|previously|past conversation|we talked about|i told you)"
+)
+
 class RealTimeContext:
     @staticmethod
     def get_context():
@@ -225,7 +320,69 @@ You adapt continuously based on feedback and context.
 }
 
 
-app = FastAPI()
+# --- WAKE WORD ---
+# Opt-in: the microphone stays closed unless MIRO_WAKE_WORD=1.
+WAKE_WORD = os.getenv("MIRO_WAKE_WORD", "0") == "1"
+WAKE_STT_POLL = 0.1   # Seconds of microphone audio per speech-recognition chunk after a wake word
+AUDIO_QUEUE = 64      # Binary audio chunks buffered per connection before new ones are dropped
+
+# --- BACKGROUND JOBS (agent/jobs.py) ---
+BACKGROUND_DOCUMENT_BYTES = 512 * 1024   # Bigger uploads are read as a job; smaller ones inline
+
+async def _transcribe_after_wake(listener, event):
+    """Streams what follows the wake word (pre-roll included) to the most recent client's assistant."""
+    session = latest_session()
+    if session is None: return
+    position = event.position
+    deadline = time.monotonic() + MAX_UTTERANCE
+    try:
+        stream = await SpeechStream.create(session.assistant.on_transcript, listener.sample_rate, source="wake_word")
+        while not stream.done and time.monotonic() < deadline:
+            await asyncio.sleep(WAKE_STT_POLL)
+            pcm, position = listener.audio_since(position)
+            await stream.feed(pcm.tobytes())
+        if not stream.done: await stream.finish()
+    except (PoolBusy, PoolTimeout) as e:
+        print(f"⚠️ Speech recognition dropped an utterance: {e}")
+
+async def _relay_wake_events(listener):
+    transcribing = None
+    use_stt = stt_available()
+    while True:
+        event = await listener.events.get()
+        print(f"⚡ Wake word heard: {event.keyword}")
+        await broadcast("WAKE_UP")
+        if use_stt:
+            if transcribing: transcribing.cancel()
+            transcribing = asyncio.create_task(_transcribe_after_wake(listener, event))
+
+def _start_wake_word():
+    if not WAKE_WORD: return None, None
+    if HARDWARE_CLIENT is not None:
+        # Every worker runs this lifespan; only one process may own the microphone
+        print("⚠️ Wake word needs single-worker mode. Skipping.")
+        return None, None
+    try:
+        from wake_word import WakeWordListener
+        listener = WakeWordListener().start(asyncio.get_running_loop())
+    except Exception as e:
+        print(f"⚠️ Wake word unavailable: {e}")
+        return None, None
+    return listener, asyncio.create_task(_relay_wake_events(listener))
+
+@asynccontextmanager
+async def lifespan(app):
+    STARTUP.mark_ready()
+    # Heavy SDKs load off the event loop while the first client connects
+    threading.Thread(target=_warm_up, name="miro-warmup", daemon=True).start()
+    listener, relay = _start_wake_word()
+    yield
+    await JOBS.shutdown()
+    if relay: relay.cancel()
+    if listener: listener.close()
+    SPEAKER.shutdown()
+
+app = FastAPI(lifespan=lifespan)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -234,10 +391,10 @@ app.add_middleware(
 )
 
 class VoiceAssistant:
-    def __init__(self):
-        # 1. Initialize Memory
-        self.memory = MemoryManager()
-        self.session_manager = SessionManager()
+    def __init__(self, user=None):
+        # 1. Initialize Memory (per user: the browser's client id, see agent/memory.py)
+        self.memory = MemoryManager(user)
+        self.session_manager = SessionManager(user)
         self.safety = SafetyGuardrail()
 
         self.user_name = self.memory.get_name()
@@ -252,12 +409,35 @@ class VoiceAssistant:
             self.chat_history = past_history
 
         # 3. Initialize Session
-        self.current_session_id = self.session_manager.create_session()
+        self.current_session_id = self.memory.session_id = self.session_manager.create_session()
 
         # 4. Initialize HYBRID Models
         self.current_persona = "default"
         self.fast_chat, self.smart_chat = self._init_models()
 
+        self.uploads = UploadAssembler()
+        self.image_cache = ImageCache()
+
+        # Async frame sender for follow-up messages (set by websocket_endpoint)
+        self.emit = None
+        self.background = set()
+        self.last_route = None
+
+        # Server-side speech recognition (agent/stt.py)
+        self.submit = None          # starts a reply for a final transcript (set by ConnectionSession)
+        self.audio = None           # binary audio chunks waiting for the recognizer
+        self.listening = None       # task draining self.audio
+        self.partial_route = None   # router's guess from the latest partial transcript
+        self.prefetch = Prefetcher(_tools)
+
+        # Server-side speech output (agent/tts.py), switched on by the client
+        self.tts_enabled = False
+        self.tts_voice = None
+        self.utterances = 0
+
+        # Background jobs (agent/jobs.py) belong to the client, so they survive a reconnect
+        self.client_id = None       # set by ConnectionSession
+
         self.email_mode = False
         self.email_step = 0
         self.email_draft = {}
@@ -266,11 +446,10 @@ class VoiceAssistant:
     def _init_models(self):
         """Initializes Models: FORCES Gemini 2.5 as requested."""
         
-        key_fast = os.getenv("GOOGLE_API_KEY")
-        key_smart = os.getenv("GOOGLE_API_KEY_PRO") or key_fast 
+        # Models carry no key: SCHEDULER binds one per call (GOOGLE_API_KEY, _PRO, MIRO_GEMINI_KEYS)
+        genai = _genai()
 
         # 1. FAST BRAIN (Voice) -> Trying Gemini 2.5 Flash
-        genai.configure(api_key=key_fast)
         try:
             print("🚀 Loading Gemini 2.5 Flash...")
             model_fast = genai.GenerativeModel(
@@ -288,7 +467,6 @@ class VoiceAssistant:
             chat_fast = model_fast.start_chat(history=[])
 
         # 2. SMART BRAIN (Chat) -> Trying Gemini 2.5 Pro
-        if key_smart != key_fast: genai.configure(api_key=key_smart)
         try:
             print("🧠 Loading Gemini 2.5 Pro...")
             model_smart = genai.GenerativeModel(
@@ -305,9 +483,6 @@ class VoiceAssistant:
             )
             chat_smart = model_smart.start_chat(history=[])
 
-        # Reset global config to default key
-        genai.configure(api_key=key_fast)
-        
         return chat_fast, chat_smart
 
 
@@ -328,51 +503,244 @@ class VoiceAssistant:
         return text
 
     def select_brain(self, text, has_image=False, has_file=False):
-        """Decides which brain handles the request."""
-        text = text.lower()
-        # Expanded keywords to catch ALL coding requests
-        smart_triggers = [
-            "code", "script", "analyze", "architect", "complex", "plan", 
-            "debug", "why", "write a", "python", "java", "cpp", "html", 
-            "function", "api", "create a", "list", "generate", "table"
-        ]
-        
-        if has_file or has_image: return self.smart_chat, "smart"
-        if any(trigger in text for trigger in smart_triggers) and len(text) > 10: 
-            return self.smart_chat, "smart"
-        
-        return self.fast_chat, "fast"
+        """Decides which brain handles the request (see agent/router.py)."""
+        route = classify(text, has_image, has_file)
+        self.last_route = route
+        if route.mode == "smart": return self.smart_chat, "smart"
+        # "hedge" answers with Flash first; Pro may follow up as an upgrade frame
+        return self.fast_chat, route.mode
+
+    def cache_context(self):
+        """Everything besides the prompt that changes the answer: persona, whose memory, which document."""
+        doc = hashlib.sha1(self.knowledge_base.encode()).hexdigest()[:8] if self.knowledge_base else "-"
+        return f"{self.current_persona}|{self.memory.user}|{self.user_name}|{doc}"
+
+    def brain_name(self, chat):
+        return "pro" if chat is self.smart_chat else "flash"
+
+    def side_chat(self, chat):
+        """
+        An empty chat on the same model. Background jobs use one: a ChatSession takes
+        one turn at a time, and the user's live sessions are busy with the conversation.
+        """
+        return chat.model.start_chat(history=[])
+
+    async def _ask(self, chat, message, lane="interactive", brain=None):
+        """
+        Every model call goes through here: SCHEDULER picks a key with quota left
+        (the lane decides who waits first) and the call shows up in miro_model_seconds.
+        """
+        brain = brain or self.brain_name(chat)
+        with timed(MODEL_LATENCY, f"model:{brain}", brain=brain):
+            try:
+                return await SCHEDULER.run(brain, chat, lambda bound: bound.send_message_async(message), lane)
+            except Exception:
+                ERRORS.inc(where=f"model:{brain}")
+                raise
+
+    async def _hedged_reply(self, prompt, user_text, route):
+        """Flash answers immediately; Pro runs in parallel only when the classifier or Flash asks for it."""
+        started = time.perf_counter()
+        pro_task = None
+        reason = None
+        if route.escalate_now and self.emit:
+            reason = route.reason
+            pro_task = asyncio.create_task(self._ask(self.smart_chat, prompt, lane="upgrade"))
+
+        flash = await self._ask(self.fast_chat, prompt)
+        flash_latency = time.perf_counter() - started
+
+        if pro_task is None and self.emit:
+            reason = upgrade_reason(user_text, flash)
+            if reason: pro_task = asyncio.create_task(self._ask(self.smart_chat, prompt, lane="upgrade"))
+
+        if pro_task:
+            task = asyncio.create_task(self._deliver_upgrade(pro_task, started, flash_latency, route, reason, user_text))
+            self.background.add(task)
+            task.add_done_callback(self.background.discard)
+        else:
+            ROUTING.record(route=route.mode, reason=route.reason, flash_s=round(flash_latency, 3), upgraded=False)
+        return flash
+
+    async def _deliver_upgrade(self, pro_task, started, flash_latency, route, reason, user_text):
+        try:
+            pro = await pro_task
+            pro_latency = time.perf_counter() - started
+            self.memory.add_message("model", pro.text)
+            # Later repeats of this question get the better answer straight away
+            RESPONSE_CACHE.store(user_text, self.cache_context(), pro.text)
+            await self.emit(json.dumps({"type": "upgrade", "text": pro.text}))
+            ROUTING.record(route=route.mode, reason=route.reason, upgrade_reason=reason,
+                           flash_s=round(flash_latency, 3), pro_s=round(pro_latency, 3), upgraded=True)
+        except asyncio.CancelledError:
+            pro_task.cancel()
+            raise
+        except Exception as e:
+            print(f"⚠️ Smart upgrade failed: {e}")
 
     async def process_file(self, file_data, filename):
+        """Legacy path: base64 data URL inside a JSON text frame."""
         try:
-            print(f"📂 Processing file: {filename}")
             decoded = base64.b64decode(file_data.split(",")[1])
-            text = ""
-            if filename.lower().endswith(".pdf"):
-                reader = PyPDF2.PdfReader(io.BytesIO(decoded))
-                for page in reader.pages: text += page.extract_text() + "\n"
-            else:
-                text = decoded.decode("utf-8")
-            
-            self.knowledge_base = text
-            self.smart_chat.send_message(f"SYSTEM: User uploaded {filename}. Content:\n{text[:10000]}...")
-            
-            resp = f"I have read '{filename}'. You can now ask me questions about it!"
-            self.memory.add_message("model", resp)
-            return resp
         except Exception as e:
             return f"❌ Error reading file: {str(e)}"
-
-    async def process_message(self, data: str):
-        global SYSTEM_CALLBACK
-        
+        return await self.process_file_obj(io.BytesIO(decoded), filename)
+
+    async def process_file_obj(self, fileobj, filename):
+        """Small files are read before replying; big ones become a background job. Closes fileobj."""
+        fileobj.seek(0, io.SEEK_END)
+        size = fileobj.tell()
+        fileobj.seek(0)
+        if size < BACKGROUND_DOCUMENT_BYTES:
+            with fileobj:
+                try:
+                    return await self._read_document(fileobj, filename)
+                except Exception as e:
+                    return f"❌ Error reading file: {str(e)}"
+
+        async def read(progress):
+            with fileobj:
+                return await self._read_document(fileobj, filename, progress)
+        reply = f"'{filename}' is big, so I'm reading it in the background. Keep chatting, I'll tell you when it's done."
+        return self.start_job("document", f"Reading {filename}", read, reply, cleanup=fileobj.close)
+
+    async def _read_document(self, fileobj, filename, progress=None):
+        print(f"📂 Processing file: {filename}")
+        if progress: progress(0.1, "Extracting text...")
+        # PDF parsing is CPU-bound: keep it off the event loop
+        text = await asyncio.to_thread(read_document, fileobj, filename)
+
+        self.knowledge_base = text
+        if progress: progress(0.6, "Reading it into the model...")
+        reader = self.side_chat(self.smart_chat)
+        await self._ask(reader, f"SYSTEM: User uploaded {filename}. Content:\n{text[:10000]}...", lane="document", brain="pro")
+        # Joined onto the conversation in one step, never while a live turn is half-recorded
+        self.smart_chat.history.extend(reader.history)
+
+        resp = f"I have read '{filename}'. You can now ask me questions about it!"
+        self.memory.add_message("model", resp)
+        return resp
+
+    def start_job(self, kind, title, work, reply, cleanup=None):
+        """Runs work(progress) as a background job (agent/jobs.py); `reply` is the answer for now."""
         try:
-            from tools import (get_system_time, search_web, open_website, send_email, 
-                               search_product, get_weather, set_volume, take_screenshot, 
-                               minimize_windows, open_application)
-        except ImportError:
-            return "Error: tools.py not found."
+            JOBS.submit(self.client_id, kind, title, work, notify=self.speak)
+        except JobsBusy:
+            if cleanup: cleanup()
+            return "I'm already working on a few things for you. Let me finish those first."
+        return reply
+
+    def accept_binary(self, data: bytes):
+        """Feeds one binary frame. Returns (header, fileobj) once complete, an error string, or None."""
+        try:
+            header, payload = parse_binary_frame(data)
+            if header.get("type") in INGEST_TYPES:
+                VISION_INGEST.push(header, payload)  # fire-and-forget, no reply
+                return None
+            if header.get("type") == "audio":
+                return self.feed_audio(header, payload)
+            fileobj = self.uploads.feed(header, payload)
+        except UploadError as e:
+            return f"❌ Upload failed: {e}"
+        if fileobj is None: return None  # more chunks to come
+        return header, fileobj
+
+    async def handle_upload(self, header, fileobj):
+        if header.get("type") != "image":
+            # A big document outlives this reply as a background job, which closes the file itself
+            return await self.process_file_obj(fileobj, header.get("name", "upload.txt"))
+        with fileobj:
+            user_image = await asyncio.to_thread(MultimodalProcessor.open_image, fileobj)
+            if user_image is None: return "❌ Could not read that image."
+            return await self.respond(header.get("text", ""), user_image)
+
+    async def process_binary(self, data: bytes):
+        """Binary frames: chunked file uploads and camera captures (see agent/uploads.py)."""
+        work = self.accept_binary(data)
+        if work is None: return ""
+        if isinstance(work, str): return work
+        return await self.handle_upload(*work)
+
+    # --- SPEECH ---
+    def feed_audio(self, header, payload):
+        """Queues one binary audio chunk for the recognizer. Returns an error string or None."""
+        if not stt_available(): return "❌ Server-side speech recognition is not installed."
+        if self.audio is None:
+            self.audio = asyncio.Queue(maxsize=AUDIO_QUEUE)
+            self.listening = asyncio.create_task(self._speech_loop())
+        try:
+            self.audio.put_nowait((header, bytes(payload)))
+        except asyncio.QueueFull:
+            print("⚠️ Speech recognition is behind. Dropping audio.")
+        return None
+
+    async def _speech_loop(self):
+        stream = None
+        while True:
+            header, pcm = await self.audio.get()
+            try:
+                if stream is None or stream.done:
+                    stream = await SpeechStream.create(self.on_transcript, header.get("rate", SAMPLE_RATE))
+                await stream.feed(pcm)
+                if header.get("final") and not stream.done: await stream.finish()
+            except (PoolBusy, PoolTimeout) as e:
+                print(f"⚠️ Speech recognition dropped audio: {e}")
+            except Exception as e:
+                ERRORS.inc(where="stt")
+                print(f"❌ Speech recognition failed: {e!r}")
+                stream = None
+
+    def stop_listening(self):
+        if self.listening: self.listening.cancel()
+        self.listening = self.audio = None
+
+    async def on_transcript(self, kind, text):
+        if not text: return  # silence ended the utterance
+        if self.emit: await self.emit(json.dumps({"type": "transcript", "final": kind == "final", "text": text}))
+        if kind == "partial":
+            self.on_partial(text)
+        elif self.submit:
+            self.partial_route = None
+            self.submit(text)
+
+    def on_partial(self, text):
+        """Runs on every partial transcript while the user is still talking."""
+        self.partial_route = classify(text)
+        clean_text = text.lower().strip()
+        # Recall questions go to get_past_memory first, whatever else they mention
+        self.prefetch.observe(None if RECALL_PATTERN.search(clean_text) else tool_intent(clean_text))
+
+    async def _call_tool(self, tools, name, *args):
+        """The speculative result if the prefetcher already made this call, else a fresh call."""
+        result = await self.prefetch.claim(name, *args)
+        if result is not None: return result
+        return await getattr(tools, name)(*args)
+
+    def set_tts(self, request):
+        """{"type": "tts", "enabled", "voice"?, "say"?} -> tells the client whether the server will speak."""
+        self.tts_enabled = bool(request.get("enabled")) and SPEAKER.available()
+        self.tts_voice = request.get("voice") or None
+        say = request.get("say")
+        if self.tts_enabled:
+            SPEAKER.warm(voice=self.tts_voice)
+            if say:
+                task = asyncio.create_task(self.speak(say))
+                self.background.add(task)
+                task.add_done_callback(self.background.discard)
+        # When the server can't speak, the client says the greeting itself
+        return json.dumps({"type": "tts", "enabled": self.tts_enabled, "say": None if self.tts_enabled else say})
+
+    async def speak(self, text):
+        """Sends reply audio as binary frames, one per sentence, as soon as each is synthesised."""
+        if not (self.tts_enabled and self.emit) or not text or text.startswith("{"): return
+        self.utterances += 1
+        utterance = self.utterances
+        async for seq, sentence, audio, last in SPEAKER.stream(text, self.tts_voice):
+            header = {"type": "tts_audio", "id": utterance, "seq": seq, "final": last,
+                      "text": sentence, "mime": audio_mime(audio)}
+            await self.emit(pack_binary_frame(header, audio))
 
+    async def process_message(self, data: str):
         user_text = ""; user_image = None
         try:
             parsed = json.loads(data)
@@ -382,22 +750,50 @@ class VoiceAssistant:
             if parsed.get("type") == "load_session":
                 sd = self.session_manager.load_session(parsed["id"])
                 if sd:
-                    self.current_session_id = parsed["id"]
+                    self.current_session_id = self.memory.session_id = parsed["id"]
                     return json.dumps({"type": "chat_loaded", "history": sd.get("history", []), "title": sd.get("title")})
             if parsed.get("type") == "new_chat":
-                self.current_session_id = self.session_manager.create_session()
+                self.current_session_id = self.memory.session_id = self.session_manager.create_session()
                 self.fast_chat.history.clear()
                 return json.dumps({"type": "chat_loaded", "history": [], "title": "New Chat"})
 
+            if parsed.get("type") == "tts":
+                return self.set_tts(parsed)
+
+            if parsed.get("type") == "jobs":
+                return json.dumps({"type": "jobs", "jobs": JOBS.list(self.client_id)})
+            if parsed.get("type") == "job_ack":
+                JOBS.ack(self.client_id, parsed.get("id"))
+                return ""
+            if parsed.get("type") == "job_cancel":
+                JOBS.cancel(self.client_id, parsed.get("id"))  # the job's own frame confirms it
+                return ""
+
             if parsed.get("type") == "upload":
                 return await self.process_file(parsed["file"], parsed["filename"])
 
             user_text = parsed.get("text", "")
             if "image" in parsed:
-                user_image = MultimodalProcessor.decode_image(parsed["image"])
+                user_image = await asyncio.to_thread(MultimodalProcessor.decode_image, parsed["image"])
         except json.JSONDecodeError:
             user_text = data
 
+        return await self.respond(user_text, user_image)
+
+    async def respond(self, user_text, user_image=None):
+        kind = "image" if user_image is not None else "text"
+        with trace_request("respond", kind=kind, chars=len(user_text or "")), timed(REQUEST_LATENCY, "respond", kind=kind):
+            try:
+                return await self._respond(user_text, user_image)
+            finally:
+                self.prefetch.settle()
+
+    async def _respond(self, user_text, user_image=None):
+        try:
+            tools = _tools()
+        except ImportError:
+            return "Error: tools.py not found."
+
         clean_text = user_text.lower().strip()
         if not clean_text and not user_image: return "" 
 
@@ -427,33 +823,31 @@ class VoiceAssistant:
         if "play" in clean_text:
             song = clean_text.replace("play", "").strip()
             if song:
-                await open_website("youtube", search_query=song)
+                await tools.open_website("youtube", search_query=song)
                 return f"Playing {song} on YouTube."
             # --- NEW: SHOPPING AGENT ---
 # --- SHOPPING COMMAND (AUTO-COMPARE) ---
-        triggers = ["order", "buy", "purchase", "shop", "get me a"]
-        if any(t in clean_text for t in triggers):
-            
-            # 1. Detect Platform (Default to 'auto' for price comparison)
-            target_platform = "auto" 
-            if "flipkart" in clean_text: target_platform = "Flipkart"
-            if "amazon" in clean_text: target_platform = "Amazon"
-
-            # 2. Clean Input
-            target_item = clean_text
-            for t in triggers: target_item = target_item.replace(t, "")
-            target_item = target_item.replace("from amazon", "").replace("on amazon", "").replace("amazon", "")
-            target_item = target_item.replace("from flipkart", "").replace("on flipkart", "").replace("flipkart", "")
-            target_item = target_item.replace(" me ", " ").replace(" a ", " ").replace(" an ", " ").strip()
-            
+        shopping = shopping_request(clean_text)
+        if shopping:
+            target_item, target_platform = shopping
             if len(target_item) < 2:
                 return "What item would you like me to order?"
 
-            try:
-                from tools import shop_online
-                return await shop_online(target_item, target_platform)
-            except Exception as e:
-                return f"Shopping Error: {str(e)}"
+            # Price comparison may already be running since the user started talking
+            speculative = self.prefetch.take("compare_prices", target_item, target_platform)
+
+            async def order(progress):
+                best_deal = await speculative if speculative else None
+                if not isinstance(best_deal, dict):
+                    progress(0.1, f"Comparing prices for {target_item}...")
+                    best_deal = await tools.compare_prices(target_item, target_platform)
+                    if not isinstance(best_deal, dict): return best_deal  # nothing found / browser busy
+                progress(0.6, f"Opening {best_deal['platform']} at ₹{best_deal['price']}...")
+                return await tools.shop_online(target_item, target_platform, best_deal)
+
+            reply = f"On it. I'm finding the best price for {target_item}. Keep chatting, I'll tell you when it's ready."
+            return self.start_job("shopping", f"Order {target_item}", order, reply,
+                                  cleanup=speculative.cancel if speculative else None)
         
         
 
@@ -465,33 +859,34 @@ class VoiceAssistant:
             opened = False
             for app in apps_list:
                 if app in target:
-                    await open_application(app)
+                    await tools.open_application(app)
                     opened = True
             # If not desktop app, assume website
             if not opened:
                 url = target.replace(" ", "")
                 if "." not in url: url += ".com"
-                webbrowser.open(f"https://{url}")
+                try: await run_in_pool("gui", webbrowser.open, f"https://{url}")
+                except (PoolBusy, PoolTimeout): return f"Couldn't open {target} right now."
                 return f"Opening {target}..."
             return f"Opening {target}."
 
         if "volume" in clean_text:
-            if "up" in clean_text: return await set_volume("up")
-            if "down" in clean_text: return await set_volume("down")
-            if "mute" in clean_text: return await set_volume("mute")
+            if "up" in clean_text: return await tools.set_volume("up")
+            if "down" in clean_text: return await tools.set_volume("down")
+            if "mute" in clean_text: return await tools.set_volume("mute")
         
-        if "screenshot" in clean_text: return await take_screenshot()
-        if "minimize" in clean_text: return await minimize_windows()
+        if "screenshot" in clean_text: return await tools.take_screenshot()
+        if "minimize" in clean_text: return await tools.minimize_windows()
 
         if "disconnect" in clean_text: 
-            if SYSTEM_CALLBACK: SYSTEM_CALLBACK("stop")
+            send_hardware_command("stop")
             return "Disconnected."
 
         if "activate" in clean_text:
             if "mouse" in clean_text: 
-                if SYSTEM_CALLBACK: SYSTEM_CALLBACK("mouse"); return "Mouse Active."
+                if send_hardware_command("mouse"): return "Mouse Active."
             if "vision" in clean_text: 
-                if SYSTEM_CALLBACK: SYSTEM_CALLBACK("vision"); return "Vision Camera On."
+                if send_hardware_command("vision"): return "Vision Camera On."
 
         # --- RESPONSE GENERATION (HYBRID ROUTING) ---
         try:
@@ -499,30 +894,77 @@ class VoiceAssistant:
             selected_chat, mode = self.select_brain(clean_text, has_image=(user_image is not None), has_file=(len(self.knowledge_base)>0))
             
             # Real-time Context Injection
-            context_header = f"[SYSTEM: {RealTimeContext.get_context()} | USER: {self.memory.get_profile_context()}]"
+            context_header = f"[SYSTEM: {RealTimeContext.get_context()} | USER: {self.memory.get_profile_context(user_text)}]"
             
             if user_image:
                 print("📸 Processing Image...")
-                response = selected_chat.send_message([context_header + user_text, user_image])
-                clean_resp = self.clean_response(response.text)
+                prepared = await asyncio.to_thread(prepare_image, user_image)
+                seen = self.image_cache.lookup(prepared.phash)
+                CACHE_LOOKUPS.inc(cache="image", result="hit" if seen else "miss")
+                if seen and ImageCache.same_question(seen, user_text):
+                    # Same view, same question a moment ago -> no new vision call
+                    clean_resp = seen["answer"]
+                elif seen:
+                    # Same view, new question -> text-only call with what we already saw
+                    response = await self._ask(
+                        selected_chat, f"{context_header} [Camera view unchanged. Earlier you saw: {seen['answer']}] {user_text}"
+                    )
+                    clean_resp = self.clean_response(response.text)
+                else:
+                    response = await self._ask(selected_chat, [context_header + user_text, prepared.as_part()])
+                    clean_resp = self.clean_response(response.text)
+                    self.image_cache.store(prepared.phash, user_text, clean_resp)
                 self.memory.add_message("model", clean_resp)
                 return clean_resp
 
             # Tool Checks (Fallback for complex tools like weather)
-            if "time" in clean_text: tool_result = await get_system_time()
-            elif "weather" in clean_text: tool_result = await get_weather("Hyderabad")
+            # Recall first: "last time" must not be mistaken for a clock question
+            topic = research_topic(clean_text)
+            if RECALL_PATTERN.search(clean_text): tool_result = await tools.get_past_memory(user_text, user=self.memory.user)
+            elif topic:
+                async def research(progress):
+                    progress(0.1, f"Searching for {topic}...")
+                    results = await tools.search_web(topic)
+                    progress(0.3, "Looking for recent coverage...")
+                    recent = await tools.search_web(f"{topic} latest news")
+                    progress(0.6, "Writing it up...")
+                    # Own chat: the raw search results stay out of the conversation, only the briefing is kept
+                    response = await self._ask(self.side_chat(self.smart_chat), (
+                        f"{context_header}\nResearch request: {topic}\nSearch results:\n{results}\n"
+                        f"Recent coverage:\n{recent}\nWrite a short briefing and list the sources."),
+                        lane="document", brain="pro")
+                    self.memory.add_message("model", response.text)
+                    return response.text
+                reply = f"I'll research {topic} in the background. Keep chatting, I'll tell you when it's ready."
+                return self.start_job("research", f"Research {topic}", research, reply)
+            elif "time" in clean_text: tool_result = await tools.get_system_time()
+            elif "weather" in clean_text: tool_result = await self._call_tool(tools, "get_weather", WEATHER_CITY)
             elif "search" in clean_text:
-                query = clean_text.replace("search","").replace("for","").strip()
-                tool_result = await search_web(query)
+                tool_result = await self._call_tool(tools, "search_web", search_query(clean_text))
 
             if tool_result:
-                response = selected_chat.send_message(f"{context_header}\nUser: {user_text}\nTool Result: {tool_result}\nSummarize naturally.")
+                response = await self._ask(selected_chat, f"{context_header}\nUser: {user_text}\nTool Result: {tool_result}\nSummarize naturally.")
                 clean_resp = self.clean_response(response.text)
                 self.memory.add_message("model", clean_resp)
                 return clean_resp
             
             # --- NORMAL CHAT ---
-            response = selected_chat.send_message(context_header + " " + user_text)
+            cache_context = self.cache_context()
+            cached = RESPONSE_CACHE.lookup(user_text, cache_context)
+            outcome = "hit" if cached else ("miss" if RESPONSE_CACHE.cacheable(user_text) else "bypass")
+            CACHE_LOOKUPS.inc(cache="response", result=outcome)
+            if cached:
+                self.memory.add_message("model", cached)
+                return cached
+
+            prompt = context_header + " " + user_text
+            if mode == "hedge":
+                response = await self._hedged_reply(prompt, user_text, self.last_route)
+            else:
+                started = time.perf_counter()
+                response = await self._ask(selected_chat, prompt)
+                ROUTING.record(route=mode, reason=self.last_route.reason,
+                               latency_s=round(time.perf_counter() - started, 3))
             
             # CRITICAL LOGIC: If mode is smart (code), DO NOT CLEAN aggressively.
             if mode == "smart":
@@ -531,6 +973,7 @@ class VoiceAssistant:
                 clean_resp = self.clean_response(response.text) # Clean for voice
             
             self.memory.add_message("model", clean_resp)
+            RESPONSE_CACHE.store(user_text, cache_context, clean_resp)
             
             # --- AUTO SAVE ---
             hist_data = [{"role": t.role, "parts": [{"text": t.parts[0].text}]} for t in selected_chat.history]
@@ -539,24 +982,69 @@ class VoiceAssistant:
 
             return clean_resp
 
-        except Exception as e: return f"Error: {str(e)}"
+        except (QuotaExhausted, SchedulerBusy) as e:
+            print(f"⏳ {e}")
+            return "I'm getting a lot of requests right now. Give me a few seconds and ask again."
+        except Exception as e:
+            ERRORS.inc(where="respond")
+            return f"Error: {str(e)}"
 
     def run(self):
         print("🚀 Miro Server running on ws://localhost:8000/ws")
         uvicorn.run(app, host="0.0.0.0", port=8000, log_level="error")
 
+@app.get("/startup")
+async def startup_profile():
+    return STARTUP.as_dict()
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus text exposition (per worker process)."""
+    return PlainTextResponse(METRICS.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/vision/preview.mjpg")
+async def vision_preview():
+    if not PREVIEW.available():
+        return PlainTextResponse("Vision preview unavailable.", status_code=503)
+    return StreamingResponse(PREVIEW.mjpeg(), media_type=f"multipart/x-mixed-replace; boundary={BOUNDARY}")
+
+@app.get("/cache/stats")
+async def cache_stats():
+    return RESPONSE_CACHE.stats()
+
+@app.get("/jobs/stats")
+async def job_stats():
+    return JOBS.stats()
+
+@app.get("/scheduler/stats")
+async def scheduler_stats():
+    return SCHEDULER.stats()
+
+@app.get("/tts/stats")
+async def tts_stats():
+    return SPEAKER.cache.stats()
+
+@app.get("/prefetch/stats")
+async def speculation_stats():
+    return prefetch_stats()
+
 @app.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
     await websocket.accept()
-    assistant = VoiceAssistant()
-    try:
-        while True:
-            data = await websocket.receive_text()
-            if not data: continue
-            response = await assistant.process_message(data)
-            if response:
-                await websocket.send_text(response)
-    except: pass
+    # ?client=<id> from the browser's localStorage: its own memory shard, and jobs are redelivered to it
+    client = websocket.query_params.get("client")
+    await ConnectionSession(websocket, VoiceAssistant(client), client).run()
+
+def mount_frontend(target_app, directory="frontend"):
+    """Serves the web UI. Must run after every API route is registered."""
+    if os.path.exists(directory):
+        target_app.mount("/", StaticFiles(directory=directory, html=True), name="frontend")
+        return True
+    return False
+
+# Multi-worker mode: each worker imports this module, so it mounts the UI itself
+if os.getenv("MIRO_FRONTEND_DIR"):
+    mount_frontend(app, os.getenv("MIRO_FRONTEND_DIR"))
 
 if __name__ == "__main__":
     assistant = VoiceAssistant()
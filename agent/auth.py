@@ -1,11 +1,28 @@
 import os
+import json
+import datetime
+import threading
 from google_auth_oauthlib.flow import Flow
-from googleapiclient.discovery import build
+from google.auth.transport.requests import Request, AuthorizedSession
+from google.oauth2.credentials import Credentials
+
+try:
+    from cryptography.fernet import Fernet, InvalidToken
+except ImportError:
+    Fernet = None
+    print("⚠️ cryptography not installed. Credentials will NOT persist. Run: pip install cryptography")
 
 # Allow HTTP for local testing
 os.environ['OAUTHLIB_INSECURE_TRANSPORT'] = '1'
 
-CLIENT_SECRETS_FILE = os.path.join(os.path.dirname(__file__), "web_credentials.json")
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+CLIENT_SECRETS_FILE = os.path.join(BASE_DIR, "web_credentials.json")
+CREDS_STORE_FILE = os.path.join(BASE_DIR, "credentials.enc")
+CREDS_KEY_FILE = os.path.join(BASE_DIR, ".creds.key")
+USERINFO_URL = "https://www.googleapis.com/oauth2/v2/userinfo"
+
+REFRESH_MARGIN = 300   # Refresh tokens this many seconds before they expire
+REFRESH_INTERVAL = 60  # How often the background refresher wakes up
 
 SCOPES = [
     'https://www.googleapis.com/auth/userinfo.profile',
@@ -16,15 +33,82 @@ SCOPES = [
     'https://www.googleapis.com/auth/drive'
 ]
 
+def _utcnow():
+    # google-auth compares expiry as a naive UTC datetime
+    return datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+
+class CredentialStore:
+    """Encrypted on-disk store for OAuth tokens and the cached userinfo profile."""
+    def __init__(self, path=CREDS_STORE_FILE, key_file=CREDS_KEY_FILE):
+        self.path = path
+        self.key_file = key_file
+        self.fernet = Fernet(self._load_key()) if Fernet else None
+
+    def _load_key(self):
+        key = os.getenv("MIRO_CREDS_KEY")
+        if key: return key.encode()
+        if os.path.exists(self.key_file):
+            with open(self.key_file, "rb") as f: return f.read().strip()
+        key = Fernet.generate_key()
+        with open(self.key_file, "wb") as f: f.write(key)
+        try: os.chmod(self.key_file, 0o600)
+        except OSError: pass
+        return key
+
+    def load(self):
+        """Returns {user_id: {"creds": Credentials, "profile": dict}}."""
+        if not self.fernet or not os.path.exists(self.path): return {}
+        try:
+            with open(self.path, "rb") as f:
+                raw = json.loads(self.fernet.decrypt(f.read()))
+        except (InvalidToken, ValueError, OSError) as e:
+            print(f"⚠️ Could not read credential store: {e}")
+            return {}
+
+        entries = {}
+        for user_id, entry in raw.items():
+            try:
+                creds = Credentials.from_authorized_user_info(entry["creds"], SCOPES)
+                entries[user_id] = {"creds": creds, "profile": entry.get("profile", {})}
+            except Exception: continue
+        return entries
+
+    def mtime(self):
+        try: return os.path.getmtime(self.path)
+        except OSError: return 0
+
+    def save(self, entries):
+        if not self.fernet: return
+        raw = {uid: {"creds": json.loads(e["creds"].to_json()), "profile": e.get("profile", {})}
+               for uid, e in entries.items()}
+        # Write-then-rename so a crash never leaves a half-written store
+        tmp = self.path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(self.fernet.encrypt(json.dumps(raw).encode()))
+        os.replace(tmp, self.path)
+
 class AuthManager:
-    def __init__(self):
+    def __init__(self, store=None, start_refresher=True):
+        self.store = store or CredentialStore()
+        self._lock = threading.RLock()
+        self._listeners = []
+
         self.user_sessions = {}
+        self.user_profiles = {}
+        self._loaded_mtime = None
+        self._reload()
+        if self.user_sessions:
+            print(f"🔐 Restored {len(self.user_sessions)} Google session(s).")
+
+        self._stop = threading.Event()
+        if start_refresher:
+            threading.Thread(target=self._refresh_loop, daemon=True).start()
 
     def get_login_url(self, redirect_uri):
         if not os.path.exists(CLIENT_SECRETS_FILE):
             print(f"❌ Missing {CLIENT_SECRETS_FILE}")
             return "#"
-        
+
         flow = Flow.from_client_secrets_file(
             CLIENT_SECRETS_FILE, scopes=SCOPES, redirect_uri=redirect_uri
         )
@@ -37,12 +121,86 @@ class AuthManager:
         )
         flow.fetch_token(code=code)
         creds = flow.credentials
-        
-        service = build('oauth2', 'v2', credentials=creds)
-        info = service.userinfo().get().execute()
-        
-        self.user_sessions[info['id']] = creds
-        return info['id'], info['name']
+
+        # Plain GET on the userinfo endpoint (no discovery document needed)
+        info = AuthorizedSession(creds).get(USERINFO_URL, timeout=10).json()
+
+        with self._lock:
+            self.user_sessions[info['id']] = creds
+            self.user_profiles[info['id']] = {"name": info.get('name'), "email": info.get('email')}
+            self._persist()
+        return info['id'], info.get('name')
+
+    def _reload(self):
+        """Re-reads the store when another worker process has written it."""
+        mtime = self.store.mtime()
+        if mtime == self._loaded_mtime: return
+        with self._lock:
+            entries = self.store.load()
+            self.user_sessions = {uid: e["creds"] for uid, e in entries.items()}
+            self.user_profiles = {uid: e["profile"] for uid, e in entries.items()}
+            self._loaded_mtime = mtime
 
     def get_creds(self, user_id):
-        return self.user_sessions.get(user_id)
\ No newline at end of file
+        self._reload()
+        creds = self.user_sessions.get(user_id)
+        if creds and not creds.valid and creds.refresh_token:
+            # Only reached if the background refresher fell behind
+            print(f"⚠️ Inline token refresh for {user_id}")
+            self._refresh(user_id, creds)
+        return creds
+
+    def get_profile(self, user_id):
+        """Cached userinfo (name/email) captured at login."""
+        self._reload()
+        return self.user_profiles.get(user_id)
+
+    def logout(self, user_id):
+        with self._lock:
+            self.user_sessions.pop(user_id, None)
+            self.user_profiles.pop(user_id, None)
+            self._persist()
+        self._notify(user_id)
+
+    def add_refresh_listener(self, callback):
+        """callback(user_id) runs whenever a user's token is refreshed or revoked."""
+        self._listeners.append(callback)
+
+    def stop(self):
+        self._stop.set()
+
+    # --- BACKGROUND REFRESH ---
+    def _needs_refresh(self, creds):
+        if not creds.refresh_token: return False
+        if not creds.expiry: return not creds.valid
+        return (creds.expiry - _utcnow()).total_seconds() < REFRESH_MARGIN
+
+    def _refresh(self, user_id, creds):
+        try:
+            with self._lock:
+                creds.refresh(Request())
+                self._persist()
+        except Exception as e:
+            print(f"⚠️ Token refresh failed for {user_id}: {e}")
+            return False
+        self._notify(user_id)
+        return True
+
+    def _refresh_loop(self):
+        while not self._stop.wait(REFRESH_INTERVAL):
+            for user_id, creds in list(self.user_sessions.items()):
+                if self._needs_refresh(creds):
+                    self._refresh(user_id, creds)
+
+    def _persist(self):
+        entries = {uid: {"creds": c, "profile": self.user_profiles.get(uid, {})}
+                   for uid, c in self.user_sessions.items()}
+        try:
+            self.store.save(entries)
+            self._loaded_mtime = self.store.mtime()
+        except Exception as e: print(f"⚠️ Could not save credentials: {e}")
+
+    def _notify(self, user_id):
+        for callback in self._listeners:
+            try: callback(user_id)
+            except Exception: pass
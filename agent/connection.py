@@ -0,0 +1,185 @@
+import json
+import time
+import uuid
+import asyncio
+
+try:
+    from metrics import ERRORS
+    from jobs import JOBS
+except ImportError:
+    from agent.metrics import ERRORS
+    from agent.jobs import JOBS
+
+# --- CONFIGURATION ---
+OUTBOX_SIZE = 32          # Frames queued for a slow client before producers wait
+SEND_TIMEOUT = 10         # Seconds a single send may block before the client counts as dead
+HEARTBEAT_INTERVAL = 20   # Seconds between pings
+HEARTBEAT_TIMEOUT = 60    # Seconds of silence (no pong, no message) before closing
+
+# Frames that only touch local state: answered inline, never cancel the current reply
+CONTROL_TYPES = {"get_history", "load_session", "new_chat", "tts", "jobs", "job_ack", "job_cancel"}
+
+def frame_type(text):
+    try:
+        parsed = json.loads(text)
+    except (ValueError, TypeError):
+        return None
+    return parsed.get("type") if isinstance(parsed, dict) else None
+
+# Open sessions in this process, for server-initiated frames (wake word, ...)
+SESSIONS = set()
+
+def latest_session():
+    """The open session the user interacted with most recently, or None."""
+    sessions = [s for s in SESSIONS if not s.closed.is_set()]
+    return max(sessions, key=lambda s: s.last_active, default=None)
+
+async def broadcast(frame):
+    """Queues `frame` for every connected client. A client that is behind doesn't delay the rest."""
+    sessions = [s for s in SESSIONS if not s.closed.is_set()]
+    if sessions: await asyncio.gather(*(s.send(frame) for s in sessions), return_exceptions=True)
+
+class ConnectionSession:
+    """
+    One per WebSocket. The receive loop never awaits the model: each chat message
+    runs as a task, and a newer message (or a {"type": "cancel"} frame) cancels the
+    one in flight. Outbound frames go through a bounded queue drained by a single
+    sender task, so a slow client applies backpressure instead of piling up memory.
+    Background jobs are not replies: cancel frames and disconnects leave them running.
+    """
+    def __init__(self, websocket, assistant, client_id=None, outbox_size=OUTBOX_SIZE):
+        self.websocket = websocket
+        self.assistant = assistant
+        self.client_id = client_id or uuid.uuid4().hex   # anonymous clients can't reclaim jobs
+        self.outbox = asyncio.Queue(maxsize=outbox_size)
+        self.current = None       # in-flight reply task
+        self.last_seen = time.monotonic()
+        self.last_active = self.last_seen   # last real message (pongs don't count)
+        self.closed = asyncio.Event()
+        self.disconnected = False
+        assistant.emit = self.send
+        assistant.submit = self.submit
+        assistant.client_id = self.client_id
+
+    # --- OUTBOUND ---
+    async def send(self, frame):
+        """Queue a text (str) or binary (bytes) frame. Waits while the client is behind."""
+        if self.closed.is_set() or not frame: return
+        await self.outbox.put(frame)
+
+    async def _sender(self):
+        while True:
+            frame = await self.outbox.get()
+            if isinstance(frame, bytes):
+                send = self.websocket.send_bytes(frame)
+            else:
+                send = self.websocket.send_text(frame)
+            try:
+                await asyncio.wait_for(send, SEND_TIMEOUT)
+            except asyncio.TimeoutError:
+                print(f"⚠️ Client stopped reading for {SEND_TIMEOUT}s. Closing connection.")
+                self.closed.set()
+                return
+
+    async def _heartbeat(self):
+        while not self.closed.is_set():
+            await asyncio.sleep(HEARTBEAT_INTERVAL)
+            if time.monotonic() - self.last_seen > HEARTBEAT_TIMEOUT:
+                print(f"⚠️ No pong for {HEARTBEAT_TIMEOUT}s. Dropping dead client.")
+                self.closed.set()
+                return
+            await self.send(json.dumps({"type": "ping", "ts": time.time()}))
+
+    # --- WORK ---
+    def cancel_current(self):
+        """Stops the reply in flight and any Pro follow-up still pending for it."""
+        cancelled = False
+        if self.current and not self.current.done():
+            self.current.cancel()
+            cancelled = True
+        for task in list(self.assistant.background):
+            task.cancel()
+            cancelled = True
+        self.current = None
+        return cancelled
+
+    async def _run(self, handler, *args):
+        try:
+            response = await handler(*args)
+            if response:
+                await self.send(response)
+                await self.assistant.speak(response)  # no-op unless the client enabled server TTS
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            ERRORS.inc(where="connection")
+            print(f"❌ Reply failed: {e!r}")
+            await self.send(f"Error: {e}")
+
+    def _start(self, handler, *args):
+        self.cancel_current()
+        self.current = asyncio.create_task(self._run(handler, *args))
+
+    def submit(self, text):
+        """A user turn that didn't arrive as a chat frame (server-side speech recognition)."""
+        self.last_active = time.monotonic()
+        self._start(self.assistant.respond, text)
+
+    async def _dispatch(self, message):
+        data = message.get("bytes")
+        if data:
+            self.last_active = time.monotonic()
+            # Chunks are assembled inline so they stay in order; only complete uploads become tasks
+            work = self.assistant.accept_binary(data)
+            if isinstance(work, str):
+                await self.send(work)
+            elif work is not None:
+                self._start(self.assistant.handle_upload, *work)
+            return
+
+        text = message.get("text")
+        if not text: return
+        kind = frame_type(text)
+        if kind == "pong": return
+        self.last_active = time.monotonic()
+        if kind == "cancel":
+            if self.cancel_current(): print("🛑 Reply cancelled by client.")
+            return
+        if kind in CONTROL_TYPES:
+            await self._run(self.assistant.process_message, text)
+            return
+        self._start(self.assistant.process_message, text)
+
+    # --- LIFECYCLE ---
+    async def _receiver(self):
+        while True:
+            message = await self.websocket.receive()
+            self.last_seen = time.monotonic()
+            if message["type"] == "websocket.disconnect":
+                self.disconnected = True
+                return
+            await self._dispatch(message)
+
+    async def run(self):
+        helpers = [asyncio.create_task(self._sender()), asyncio.create_task(self._heartbeat())]
+        receiver = asyncio.create_task(self._receiver())
+        closed = asyncio.create_task(self.closed.wait())
+        SESSIONS.add(self)
+        JOBS.attach(self.client_id, self.send)
+        redelivery = asyncio.create_task(JOBS.redeliver(self.client_id, self.send))
+        try:
+            done, _ = await asyncio.wait([receiver, closed] + helpers, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if not task.cancelled() and task.exception():
+                    print(f"⚠️ Connection closed: {task.exception()!r}")
+        finally:
+            SESSIONS.discard(self)
+            JOBS.detach(self.client_id, self.send)
+            self.closed.set()
+            self.cancel_current()
+            for task in [receiver, closed, redelivery] + helpers: task.cancel()
+            self.assistant.uploads.close()
+            self.assistant.stop_listening()
+            if not self.disconnected:
+                try: await self.websocket.close()
+                except Exception: pass
@@ -0,0 +1,123 @@
+import os
+import time
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    from metrics import METRICS, ERRORS
+except ImportError:
+    from agent.metrics import METRICS, ERRORS
+
+# --- CONFIGURATION ---
+# name: (threads, max queued calls, default timeout in seconds)
+# GUI input must not interleave, and one Chrome session at a time is plenty.
+POOL_LIMITS = {
+    "gui": (1, 4, 15),
+    "network": (8, 32, 20),
+    "browser": (1, 1, 120),
+    "disk": (4, 32, 10),
+    "speech": (2, 16, 10),
+}
+
+POOL_QUEUED = METRICS.gauge("miro_pool_queued", "Calls waiting for a thread, per executor.", ("pool",))
+POOL_ACTIVE = METRICS.gauge("miro_pool_active", "Calls running, per executor.", ("pool",))
+POOL_WAIT = METRICS.histogram("miro_pool_wait_seconds", "Time a call waited for a thread.", ("pool",))
+POOL_REJECTED = METRICS.counter("miro_pool_rejected_total", "Calls refused because the queue was full.", ("pool",))
+POOL_TIMEOUTS = METRICS.counter("miro_pool_timeouts_total", "Calls that exceeded their timeout.", ("pool",))
+
+class PoolBusy(RuntimeError):
+    """The executor's queue is full; the caller should answer 'busy' instead of waiting."""
+
+class PoolTimeout(TimeoutError):
+    """The call did not finish in time. Its thread keeps running until the function returns."""
+
+class ResourcePool:
+    """
+    Bounded thread pool for one class of blocking work. Each class has its own
+    threads, so a 30-second shopping run cannot starve screenshots or searches.
+    """
+    def __init__(self, name, workers, max_queue, timeout):
+        self.name = name
+        self.workers = workers
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"miro-{name}")
+        self.queued = 0
+        self.active = 0
+        self._lock = threading.Lock()
+
+    def _publish(self):
+        POOL_QUEUED.set(self.queued, pool=self.name)
+        POOL_ACTIVE.set(self.active, pool=self.name)
+
+    def _call(self, submitted, func, args, kwargs):
+        with self._lock:
+            self.queued -= 1
+            self.active += 1
+            self._publish()
+        POOL_WAIT.observe(time.perf_counter() - submitted, pool=self.name)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            with self._lock:
+                self.active -= 1
+                self._publish()
+
+    def _dequeue_cancelled(self, future):
+        if future.cancelled():
+            with self._lock:
+                self.queued -= 1
+                self._publish()
+
+    async def run(self, func, *args, timeout=None, **kwargs):
+        """Runs func(*args, **kwargs) on this pool without blocking the event loop."""
+        with self._lock:
+            if self.queued >= self.max_queue:
+                POOL_REJECTED.inc(pool=self.name)
+                raise PoolBusy(f"{self.name} pool is busy")
+            self.queued += 1
+            self._publish()
+
+        try:
+            future = self.executor.submit(self._call, time.perf_counter(), func, args, kwargs)
+        except Exception:
+            with self._lock:
+                self.queued -= 1
+                self._publish()
+            raise
+        # Timeout or a cancelled caller: a call still queued is dropped, a running one
+        # finishes in its thread and the result is discarded.
+        future.add_done_callback(self._dequeue_cancelled)
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), timeout or self.timeout)
+        except asyncio.TimeoutError:
+            POOL_TIMEOUTS.inc(pool=self.name)
+            ERRORS.inc(where=f"pool:{self.name}")
+            raise PoolTimeout(f"{self.name} call took longer than {timeout or self.timeout}s")
+
+    def stats(self):
+        with self._lock:
+            return {"workers": self.workers, "queued": self.queued, "active": self.active, "max_queue": self.max_queue}
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+def _limits(name):
+    """MIRO_POOL_<NAME>=threads[,queue[,timeout]] overrides the defaults."""
+    workers, queue, timeout = POOL_LIMITS[name]
+    override = os.getenv(f"MIRO_POOL_{name.upper()}")
+    if override:
+        values = [v.strip() for v in override.split(",")]
+        if values[0]: workers = int(values[0])
+        if len(values) > 1 and values[1]: queue = int(values[1])
+        if len(values) > 2 and values[2]: timeout = float(values[2])
+    return workers, queue, timeout
+
+POOLS = {name: ResourcePool(name, *_limits(name)) for name in POOL_LIMITS}
+
+async def run_in_pool(name, func, *args, timeout=None, **kwargs):
+    return await POOLS[name].run(func, *args, timeout=timeout, **kwargs)
+
+def pool_stats():
+    return {name: pool.stats() for name, pool in POOLS.items()}
@@ -1,15 +1,45 @@
 import base64
+import threading
 from googleapiclient.discovery import build
 from email.mime.text import MIMEText
 
 class GoogleTools:
-    def __init__(self, auth_manager):
+    def __init__(self, auth_manager, http_factory=None):
         self.auth = auth_manager
+        # Optional hook: http_factory(creds) -> httplib2-compatible object.
+        # Lets tests swap in googleapiclient.http.HttpMock / HttpMockSequence.
+        self.http_factory = http_factory
+        # (user_id, api, version) -> (token, service)
+        self._services = {}
+        self._lock = threading.Lock()
+        if hasattr(auth_manager, "add_refresh_listener"):
+            auth_manager.add_refresh_listener(self.invalidate)
 
     def _get_service(self, user_id, service, version):
         creds = self.auth.get_creds(user_id)
         if not creds: return None
-        return build(service, version, credentials=creds)
+
+        key = (user_id, service, version)
+        with self._lock:
+            cached = self._services.get(key)
+            # A refreshed token means the old client holds stale auth -> rebuild
+            if cached and cached[0] == creds.token:
+                return cached[1]
+
+        if self.http_factory:
+            client = build(service, version, http=self.http_factory(creds), cache_discovery=False)
+        else:
+            client = build(service, version, credentials=creds, cache_discovery=False)
+
+        with self._lock:
+            self._services[key] = (creds.token, client)
+        return client
+
+    def invalidate(self, user_id):
+        """Drops every cached client for a user (logout / credential refresh)."""
+        with self._lock:
+            for key in [k for k in self._services if k[0] == user_id]:
+                del self._services[key]
 
     def check_emails(self, user_id):
         service = self._get_service(user_id, 'gmail', 'v1')
@@ -18,14 +48,31 @@ class GoogleTools:
             results = service.users().messages().list(userId='me', labelIds=['INBOX'], q="is:unread", maxResults=3).execute()
             messages = results.get('messages', [])
             if not messages: return "No unread emails."
+
+            # One batched round trip for all headers instead of one GET per message
+            fetched = {}
+            def _collect(request_id, response, exception):
+                if exception is None: fetched[request_id] = response
+
+            batch = service.new_batch_http_request(callback=_collect)
+            for msg in messages:
+                batch.add(
+                    service.users().messages().get(
+                        userId='me', id=msg['id'], format='metadata', metadataHeaders=['Subject', 'From']
+                    ),
+                    request_id=msg['id']
+                )
+            batch.execute()
+
             summary = []
             for msg in messages:
-                txt = service.users().messages().get(userId='me', id=msg['id']).execute()
+                txt = fetched.get(msg['id'])
+                if not txt: continue
                 headers = txt['payload']['headers']
                 subject = next((h['value'] for h in headers if h['name'] == 'Subject'), "No Subject")
                 sender = next((h['value'] for h in headers if h['name'] == 'From'), "Unknown")
                 summary.append(f"From: {sender} | Subject: {subject}")
-            return "\n".join(summary)
+            return "\n".join(summary) if summary else "Could not read unread emails."
         except Exception as e: return f"Gmail Error: {str(e)}"
 
     def send_email(self, user_id, to, subject, body):
@@ -49,4 +96,4 @@ class GoogleTools:
             requests = [{'insertText': {'location': {'index': 1}, 'text': content}}]
             service.documents().batchUpdate(documentId=doc_id, body={'requests': requests}).execute()
             return f"Created document '{title}'."
-        except Exception as e: return f"Doc Error: {str(e)}"
\ No newline at end of file
+        except Exception as e: return f"Doc Error: {str(e)}"
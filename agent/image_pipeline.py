@@ -0,0 +1,79 @@
+import io
+import re
+import time
+from collections import OrderedDict
+
+# --- CONFIGURATION ---
+MODEL_IMAGE_SIDE = 768     # Gemini tiles images at 768px; more pixels only cost upload time
+JPEG_QUALITY = 80
+HASH_DISTANCE = 6          # Max differing bits (of 64) for two frames to count as "the same view"
+CACHE_TTL = 30             # Seconds a description stays reusable
+CACHE_SIZE = 16
+
+class PreparedImage:
+    def __init__(self, jpeg, phash, size):
+        self.jpeg = jpeg
+        self.phash = phash
+        self.size = size
+
+    def as_part(self):
+        """Inline blob for GenerativeModel.send_message (skips the SDK's PNG re-encode)."""
+        return {"mime_type": "image/jpeg", "data": self.jpeg}
+
+def dhash(img, hash_size=8):
+    """64-bit difference hash: robust to webcam noise, JPEG artefacts and small exposure drift."""
+    from PIL import Image
+    small = img.convert("L").resize((hash_size + 1, hash_size), Image.BILINEAR)
+    px = small.tobytes()
+    bits = 0
+    for row in range(hash_size):
+        base = row * (hash_size + 1)
+        for col in range(hash_size):
+            bits = (bits << 1) | (px[base + col] > px[base + col + 1])
+    return bits
+
+def prepare_image(img, max_side=MODEL_IMAGE_SIDE):
+    """Resize to the model's useful resolution and re-encode as compact JPEG."""
+    img = img.copy()
+    img.thumbnail((max_side, max_side))
+    if img.mode != "RGB": img = img.convert("RGB")
+    buf = io.BytesIO()
+    img.save(buf, format="JPEG", quality=JPEG_QUALITY, optimize=True)
+    return PreparedImage(buf.getvalue(), dhash(img), img.size)
+
+def _normalise(text):
+    return re.sub(r"[^a-z0-9 ]", "", (text or "").lower()).strip()
+
+class ImageCache:
+    """
+    Remembers what the model said about recent frames, keyed by perceptual hash.
+    Near-identical frames sent in quick succession reuse that answer instead of
+    paying for another vision call.
+    """
+    def __init__(self, ttl=CACHE_TTL, max_distance=HASH_DISTANCE, size=CACHE_SIZE):
+        self.ttl = ttl
+        self.max_distance = max_distance
+        self.size = size
+        self.entries = OrderedDict()  # phash -> {"ts", "question", "answer"}
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, phash):
+        now = time.time()
+        for key in list(self.entries):
+            if now - self.entries[key]["ts"] > self.ttl: del self.entries[key]
+        for key, entry in reversed(self.entries.items()):
+            if bin(key ^ phash).count("1") <= self.max_distance:
+                self.hits += 1
+                return entry
+        self.misses += 1
+        return None
+
+    def store(self, phash, question, answer):
+        self.entries[phash] = {"ts": time.time(), "question": _normalise(question), "answer": answer}
+        self.entries.move_to_end(phash)
+        while len(self.entries) > self.size: self.entries.popitem(last=False)
+
+    @staticmethod
+    def same_question(entry, question):
+        return entry["question"] == _normalise(question)
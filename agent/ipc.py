@@ -0,0 +1,74 @@
+import os
+import secrets
+import threading
+from multiprocessing.connection import Listener, Client
+
+# --- CONFIGURATION ---
+# Workers find the hardware process through these env vars (inherited from main.py)
+HW_ADDRESS_ENV = "MIRO_HW_ADDRESS"
+HW_AUTHKEY_ENV = "MIRO_HW_AUTHKEY"
+
+def _parse_address(value):
+    host, port = value.rsplit(":", 1)
+    return host, int(port)
+
+class HardwareCommandServer:
+    """
+    Runs inside the process that owns the camera/mouse.
+    Receives hardware commands ("mouse", "sign", "stop") from agent workers.
+    """
+    def __init__(self, handler, host="127.0.0.1", port=0):
+        self.handler = handler
+        key = os.getenv(HW_AUTHKEY_ENV)
+        self.authkey = bytes.fromhex(key) if key else secrets.token_bytes(16)
+        self.listener = Listener((host, port), authkey=self.authkey)
+        self.address = "%s:%d" % self.listener.address
+
+    def export_env(self):
+        """Publishes address + key so spawned workers can connect."""
+        os.environ[HW_ADDRESS_ENV] = self.address
+        os.environ[HW_AUTHKEY_ENV] = self.authkey.hex()
+
+    def start(self):
+        threading.Thread(target=self._serve, daemon=True).start()
+        return self
+
+    def _serve(self):
+        while True:
+            try: conn = self.listener.accept()
+            except Exception: continue
+            threading.Thread(target=self._handle, args=(conn,), daemon=True).start()
+
+    def _handle(self, conn):
+        with conn:
+            while True:
+                try: command = conn.recv()
+                except (EOFError, OSError): return
+                try: self.handler(command)
+                except Exception as e: print(f"⚠️ Hardware command failed: {e}")
+
+class HardwareCommandClient:
+    """Used by agent workers that do not own the hardware."""
+    def __init__(self, address, authkey):
+        self.address = _parse_address(address)
+        self.authkey = authkey
+        self.conn = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls):
+        address = os.getenv(HW_ADDRESS_ENV)
+        if not address: return None
+        return cls(address, bytes.fromhex(os.getenv(HW_AUTHKEY_ENV, "")))
+
+    def send(self, command):
+        with self._lock:
+            for _ in range(2):  # one reconnect attempt if the pipe went stale
+                try:
+                    if self.conn is None:
+                        self.conn = Client(self.address, authkey=self.authkey)
+                    self.conn.send(command)
+                    return True
+                except (OSError, EOFError):
+                    self.conn = None
+        return False
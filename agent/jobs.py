@@ -0,0 +1,222 @@
+import json
+import time
+import uuid
+import asyncio
+
+try:
+    from metrics import METRICS, ERRORS
+    from state_store import get_state_store
+except ImportError:
+    from agent.metrics import METRICS, ERRORS
+    from agent.state_store import get_state_store
+
+# --- CONFIGURATION ---
+# kind: jobs of that kind running at once per process (the rest wait as "queued").
+# One browser session does the shopping, so orders never run side by side.
+JOB_LIMITS = {"shopping": 1, "document": 2, "research": 2}
+DEFAULT_LIMIT = 2
+MAX_ACTIVE_PER_CLIENT = 4   # queued + running, per client
+JOB_TIMEOUT = 300           # Seconds a job may run
+RETENTION = 24 * 3600       # Finished jobs nobody acknowledged are kept this long
+PROGRESS_INTERVAL = 0.25    # Seconds between progress frames (the final one always goes out)
+STORE_NS = "jobs"
+
+FINISHED = ("done", "failed", "cancelled")
+
+JOBS_ACTIVE = METRICS.gauge("miro_jobs_active", "Background jobs queued or running, per kind and status.", ("kind", "status"))
+JOBS_TOTAL = METRICS.counter("miro_jobs_total", "Background jobs finished, by kind and status.", ("kind", "status"))
+JOB_LATENCY = METRICS.histogram("miro_job_seconds", "Background job run time (excluding queueing).", ("kind",))
+
+class JobsBusy(RuntimeError):
+    """The client already has MAX_ACTIVE_PER_CLIENT jobs in progress."""
+
+def _frame(job):
+    return json.dumps(dict(job, type="job"))
+
+class JobManager:
+    """
+    Long tasks (orders, big documents, research) run here instead of inside the
+    WebSocket reply, so the chat stays free while they work. Each job belongs to a
+    client id, not a connection: progress goes to whichever sessions of that client
+    are attached, and the result waits in the StateStore until the client acks it,
+    so a reconnect (or another worker, in multi-worker mode) still gets it.
+    """
+    def __init__(self, store=None):
+        self._store = store
+        self.tasks = {}      # job id -> asyncio.Task, jobs started by this process
+        self.clients = {}    # client id -> set of send coroutines (one per open session)
+        self.slots = {}      # kind -> asyncio.Semaphore
+        self.last_progress = {}
+        self.frames = set()  # progress deliveries in flight
+        self.stopping = False
+
+    @property
+    def store(self):
+        if self._store is None: self._store = get_state_store()
+        return self._store
+
+    def _slot(self, kind):
+        if kind not in self.slots: self.slots[kind] = asyncio.Semaphore(JOB_LIMITS.get(kind, DEFAULT_LIMIT))
+        return self.slots[kind]
+
+    def _save(self, job):
+        job["updated"] = time.time()
+        self.store.set(STORE_NS, job["id"], job)
+
+    def _publish(self):
+        counts = {}
+        for task in self.tasks.values():
+            job = task.job
+            counts[job["kind"], job["status"]] = counts.get((job["kind"], job["status"]), 0) + 1
+        for kind in set(JOB_LIMITS) | {k for k, _ in counts}:
+            for status in ("queued", "running"):
+                JOBS_ACTIVE.set(counts.get((kind, status), 0), kind=kind, status=status)
+
+    # --- DELIVERY ---
+    def attach(self, client, send):
+        self.clients.setdefault(client, set()).add(send)
+
+    def detach(self, client, send):
+        senders = self.clients.get(client)
+        if senders is None: return
+        senders.discard(send)
+        if not senders: del self.clients[client]
+
+    async def _deliver(self, client, frame):
+        senders = list(self.clients.get(client, ()))
+        if senders: await asyncio.gather(*(send(frame) for send in senders), return_exceptions=True)
+
+    async def redeliver(self, client, send):
+        """On (re)connect: the state of every job this client hasn't acknowledged yet."""
+        jobs = self.list(client)
+        if jobs: await send(json.dumps({"type": "jobs", "jobs": jobs}))
+
+    # --- LIFECYCLE ---
+    def submit(self, client, kind, title, work, notify=None):
+        """
+        Starts work(progress) as a background job and returns its record right away.
+        progress(fraction, message) reports 0..1; the return value is the job's result text.
+        notify(result) is awaited after the result frame went out (e.g. to speak it).
+        """
+        active = [t for t in self.tasks.values() if t.job["client"] == client]
+        if len(active) >= MAX_ACTIVE_PER_CLIENT:
+            raise JobsBusy(f"{len(active)} jobs already running")
+        self.prune()
+        now = time.time()
+        job = {"id": uuid.uuid4().hex[:12], "client": client, "kind": kind, "title": title,
+               "status": "queued", "progress": 0.0, "message": "Waiting for a free worker...",
+               "result": None, "error": None, "created": now, "finished": None}
+        self._save(job)
+        task = asyncio.create_task(self._run(job, work, notify))
+        task.job = job
+        self.tasks[job["id"]] = task
+        task.add_done_callback(lambda t: self.tasks.pop(job["id"], None))
+        self._publish()
+        print(f"🧵 Job {job['id']} queued: {title}")
+        return job
+
+    async def _run(self, job, work, notify):
+        def progress(fraction, message=None):
+            job["progress"] = round(max(0.0, min(1.0, fraction)), 3)
+            if message: job["message"] = message
+            now = time.monotonic()
+            if now - self.last_progress.get(job["id"], 0) < PROGRESS_INTERVAL: return
+            self.last_progress[job["id"]] = now
+            self._save(job)
+            frame = asyncio.get_running_loop().create_task(self._deliver(job["client"], _frame(job)))
+            self.frames.add(frame)
+            frame.add_done_callback(self.frames.discard)
+
+        started = None
+        try:
+            async with self._slot(job["kind"]):
+                started = time.perf_counter()
+                job.update(status="running", message="Working...")
+                self._save(job)
+                self._publish()
+                await self._deliver(job["client"], _frame(job))
+                result = await asyncio.wait_for(work(progress), JOB_TIMEOUT)
+            job.update(status="done", progress=1.0, message="Done.", result=result)
+        except asyncio.CancelledError:
+            if self.stopping:
+                job.update(status="failed", error="The server stopped while this was running.", message="Interrupted.")
+            else:
+                job.update(status="cancelled", message="Cancelled.")
+        except asyncio.TimeoutError:
+            job.update(status="failed", error=f"Gave up after {JOB_TIMEOUT}s.", message="Timed out.")
+        except Exception as e:
+            ERRORS.inc(where=f"job:{job['kind']}")
+            print(f"❌ Job {job['id']} failed: {e!r}")
+            job.update(status="failed", error=str(e), message="Failed.")
+        finally:
+            self.last_progress.pop(job["id"], None)
+
+        job["finished"] = time.time()
+        self._save(job)
+        JOBS_TOTAL.inc(kind=job["kind"], status=job["status"])
+        if started is not None: JOB_LATENCY.observe(time.perf_counter() - started, kind=job["kind"])
+        self.tasks.pop(job["id"], None)
+        self._publish()
+        print(f"🧵 Job {job['id']} {job['status']}: {job['title']}")
+        await self._deliver(job["client"], _frame(job))
+        if notify and job["status"] == "done" and job["result"]:
+            try: await notify(job["result"])
+            except Exception as e: print(f"⚠️ Job {job['id']} notify failed: {e!r}")
+
+    def cancel(self, client, job_id):
+        task = self.tasks.get(job_id)
+        if task is None or task.job["client"] != client: return False
+        task.cancel()
+        return True
+
+    def ack(self, client, job_id):
+        """The client has shown the result: forget the job."""
+        job = self.store.get(STORE_NS, job_id)
+        if job and job["client"] == client and job["status"] in FINISHED:
+            self.store.delete(STORE_NS, job_id)
+            return True
+        return False
+
+    def list(self, client):
+        jobs = []
+        for job_id in self.store.keys(STORE_NS):
+            job = self.store.get(STORE_NS, job_id)
+            if not job or job["client"] != client: continue
+            if job["status"] not in FINISHED and job_id not in self.tasks and self._stale(job):
+                # Started by a process that has since stopped
+                job.update(status="failed", error="The server restarted while this was running.",
+                           message="Interrupted.", finished=time.time())
+                self._save(job)
+            jobs.append(job)
+        return sorted(jobs, key=lambda j: j["created"])
+
+    @staticmethod
+    def _stale(job):
+        # A live job saves at least once per JOB_TIMEOUT (it is killed after that)
+        return time.time() - job["updated"] > JOB_TIMEOUT + 60
+
+    def prune(self):
+        cutoff = time.time() - RETENTION
+        for job_id in self.store.keys(STORE_NS):
+            job = self.store.get(STORE_NS, job_id)
+            if job and job["status"] in FINISHED and job["finished"] < cutoff:
+                self.store.delete(STORE_NS, job_id)
+
+    async def shutdown(self, timeout=2):
+        """Cancels this process's jobs and waits briefly so they are saved as interrupted."""
+        self.stopping = True
+        tasks = list(self.tasks.values())
+        for task in tasks: task.cancel()
+        if tasks: await asyncio.wait(tasks, timeout=timeout)
+
+    def stats(self):
+        jobs = [task.job for task in self.tasks.values()]
+        return {
+            "running": sum(1 for j in jobs if j["status"] == "running"),
+            "queued": sum(1 for j in jobs if j["status"] == "queued"),
+            "limits": JOB_LIMITS,
+            "clients_attached": len(self.clients),
+            "jobs": [{k: j[k] for k in ("id", "kind", "title", "status", "progress")} for j in jobs],
+        }
+
+JOBS = JobManager()
@@ -1,74 +1,306 @@
 import json
 import os
+import re
 import glob
+import math
+import heapq
+import time
 import uuid
+import sqlite3
+import hashlib
 import datetime
+import threading
+
+try:
+    from memory_index import get_memory_index
+    from metrics import DISK_LATENCY, ERRORS, timed
+except ImportError:
+    from agent.memory_index import get_memory_index
+    from agent.metrics import DISK_LATENCY, ERRORS, timed
 
 # --- CONFIGURATION ---
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-MEMORY_FILE = os.path.join(BASE_DIR, "brain.json")
+MEMORY_FILE = os.path.join(BASE_DIR, "brain.json")   # legacy single-user store, migrated on first use
+USERS_DIR = os.getenv("MIRO_USERS_DIR", os.path.join(BASE_DIR, "users"))
 SESSIONS_DIR = os.path.join(BASE_DIR, "sessions")
+DEFAULT_USER = "default"  # connections without a client id (scripts, hardware client)
+# Whose shard takes over brain.json (main.py --legacy-user). Unset: the first browser client to connect.
+LEGACY_USER = os.getenv("MIRO_LEGACY_USER")
+HISTORY_LIMIT = 30        # Rolling long-term history kept per user
+# create_session ids (uuid4 prefix) or full uuids; anything else never reaches the file system
+SESSION_ID = re.compile(r"[0-9a-f]{8}(?:-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12})?")
+
+FACT_TOKEN_BUDGET = 120   # Max (approx.) prompt tokens spent on profile facts per message
+MAX_GENERAL_FACTS = 2     # Facts with no overlap with the message that may still be included
+FACT_TRIGGERS = ("i like", "i love", "my name is")
+FACT_STOPWORDS = {"i", "a", "an", "the", "is", "am", "my", "to", "and", "of", "it", "me", "like", "love", "really"}
 
 # Create sessions folder if it doesn't exist
 if not os.path.exists(SESSIONS_DIR):
     os.makedirs(SESSIONS_DIR)
 
-class MemoryManager:
-    """Manages the global 'brain.json' for user facts and long-term history."""
-    def __init__(self):
-        self.data = self._load()
-        if "profile" not in self.data:
-            self.data["profile"] = {"facts": [], "preferences": {}}
-            self.save()
-
-    def _load(self):
-        if os.path.exists(MEMORY_FILE):
-            try:
-                with open(MEMORY_FILE, "r") as f:
-                    return json.load(f)
-            except: pass
-        return {"user_name": None, "history": [], "profile": {"facts": []}}
+def _fact_tokens(text):
+    return {w for w in re.findall(r"[a-z0-9]+", text.lower()) if w not in FACT_STOPWORDS and len(w) > 1}
+
+class FactStore:
+    """
+    Structured profile facts (one row each in the user's shard, see UserShard).
+    Dedup by normalised key, per-fact usage stats, and an inverted token index
+    so picking the relevant facts stays cheap with thousands of them.
+    """
+    def __init__(self, facts):
+        self.facts = {}   # key -> {"text", "created", "uses", "last_used"}
+        self.index = {}   # token -> set(keys)
+        now = time.time()
+        for f in facts:
+            # Old brain.json files stored plain strings
+            if isinstance(f, str): f = {"text": f, "created": now, "uses": 0, "last_used": None}
+            self._add(f)
+
+    @staticmethod
+    def normalise(text):
+        return re.sub(r"\s+", " ", re.sub(r"[^a-z0-9 ]+", " ", text.lower())).strip()
+
+    def _add(self, fact):
+        key = self.normalise(fact["text"])
+        if not key or key in self.facts: return False
+        self.facts[key] = fact
+        for token in _fact_tokens(key): self.index.setdefault(token, set()).add(key)
+        return True
+
+    def add(self, text):
+        return self._add({"text": text, "created": time.time(), "uses": 0, "last_used": None})
+
+    def to_list(self):
+        return list(self.facts.values())
+
+    def _score(self, fact, overlap, now):
+        recency = 1.0 / (1.0 + (now - fact["created"]) / 86400.0 / 30.0)  # ~monthly decay
+        return 2.0 * overlap + 0.3 * math.log1p(fact["uses"]) + 0.5 * recency
+
+    def select(self, query, budget=FACT_TOKEN_BUDGET):
+        """Top facts for this message within a token budget (~4 chars per token)."""
+        now = time.time()
+        overlap = {}
+        for token in _fact_tokens(query or ""):
+            keys = self.index.get(token, ())
+            if not keys: continue
+            idf = math.log(1 + len(self.facts) / len(keys))
+            for key in keys: overlap[key] = overlap.get(key, 0.0) + idf
+
+        ranked = sorted(overlap, key=lambda k: self._score(self.facts[k], overlap[k], now), reverse=True)
+        # A couple of generally useful facts (most used / newest), even if unrelated
+        general = heapq.nlargest(MAX_GENERAL_FACTS, (k for k in self.facts if k not in overlap),
+                                 key=lambda k: self._score(self.facts[k], 0.0, now))
+
+        chosen, spent = [], 0
+        for key in ranked + general:
+            cost = len(self.facts[key]["text"]) // 4 + 1
+            if spent + cost > budget: continue
+            chosen.append(self.facts[key])
+            spent += cost
+
+        for fact in chosen:
+            fact["uses"] += 1
+            fact["last_used"] = now
+        return [f["text"] for f in chosen]
+
+def _shard_path(user):
+    """One SQLite file per user. Ids come from the browser, so the file name is derived, not trusted."""
+    safe = re.sub(r"[^A-Za-z0-9_-]", "", user)[:32]
+    digest = hashlib.sha1(user.encode()).hexdigest()[:8]
+    return os.path.join(USERS_DIR, f"{safe}-{digest}.db")
+
+class UserShard:
+    """
+    One user's name, facts and rolling history in their own SQLite file (WAL).
+    Every MemoryManager of that user in this process shares the shard, and its
+    lock makes it the only writer here. Each write is one small transaction,
+    so other users never wait on it. Writes by other worker processes are picked
+    up through PRAGMA data_version.
+    """
+    def __init__(self, user, path):
+        self.user = user
+        self.path = path
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        created = not os.path.exists(path)
+        self.conn = sqlite3.connect(path, check_same_thread=False, timeout=10)
+        with self._lock, self.conn:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("PRAGMA synchronous=NORMAL")
+            self.conn.execute("CREATE TABLE IF NOT EXISTS profile (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS facts ("
+                " key TEXT PRIMARY KEY, text TEXT NOT NULL, created REAL, uses INTEGER, last_used REAL)"
+            )
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS history ("
+                " id INTEGER PRIMARY KEY AUTOINCREMENT, session TEXT, role TEXT, text TEXT, ts REAL)"
+            )
+        self.version = None
+        self.name = None
+        self.facts = None
+        # Not only new shards: a client's shard may predate the first run that could adopt brain.json
+        if os.path.exists(MEMORY_FILE) and _may_adopt(user): self._adopt_legacy()
+        with self._lock: self._refresh()
 
-    def save(self):
-        with open(MEMORY_FILE, "w") as f:
-            json.dump(self.data, f, indent=2)
+    def _refresh(self):
+        """Reloads the cached name and facts if another connection committed since. Caller holds the lock."""
+        version = self.conn.execute("PRAGMA data_version").fetchone()[0]
+        if version == self.version: return
+        self.version = version
+        row = self.conn.execute("SELECT value FROM profile WHERE key='user_name'").fetchone()
+        self.name = json.loads(row[0]) if row else None
+        rows = self.conn.execute("SELECT text, created, uses, last_used FROM facts ORDER BY created")
+        self.facts = FactStore([{"text": t, "created": c, "uses": u or 0, "last_used": l} for t, c, u, l in rows])
+
+    def _adopt_legacy(self):
+        """Takes over the old single-user brain.json, unless another shard has claimed it already."""
+        try:
+            # O_EXCL: exactly one shard, in any worker process, wins the claim
+            fd = os.open(MEMORY_FILE + ".claimed", os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            return
+        with os.fdopen(fd, "w") as f: f.write(self.user)
+        claimed = MEMORY_FILE + ".migrated"
+        try:
+            os.replace(MEMORY_FILE, claimed)
+        except FileNotFoundError:
+            return
+        try:
+            with open(claimed, "r") as f: data = json.load(f)
+        except Exception:
+            ERRORS.inc(where="brain_migrate")
+            print(f"⚠️ Could not read {claimed}. Starting {self.user} with an empty memory.")
+            return
+        facts = FactStore(data.get("profile", {}).get("facts", []))
+        history = data.get("history", [])[-HISTORY_LIMIT:]
+        now = time.time()
+        old_turns = []
+        for turn in history:
+            parts = turn.get("parts") or [""]
+            text = parts[0].get("text", "") if isinstance(parts[0], dict) else str(parts[0])
+            old_turns.append((None, turn.get("role"), text, now))
+        with self._lock, self.conn:
+            # The shard may already hold a few turns of its own: keep its name, put the old turns first
+            if data.get("user_name"):
+                self.conn.execute("INSERT OR IGNORE INTO profile VALUES ('user_name', ?)", (json.dumps(data["user_name"]),))
+            for key, fact in facts.facts.items():
+                self.conn.execute("INSERT OR IGNORE INTO facts VALUES (?, ?, ?, ?, ?)",
+                                  (key, fact["text"], fact["created"], fact["uses"], fact["last_used"]))
+            own_turns = self.conn.execute("SELECT session, role, text, ts FROM history ORDER BY id").fetchall()
+            self.conn.execute("DELETE FROM history")
+            self.conn.executemany("INSERT INTO history (session, role, text, ts) VALUES (?, ?, ?, ?)",
+                                  (old_turns + own_turns)[-HISTORY_LIMIT:])
+        try:
+            get_memory_index().index_brain(history, self.user)   # recall keeps finding the old turns
+        except Exception as e:
+            print(f"⚠️ Memory index update failed: {e}")
+        print(f"🧠 Migrated brain.json into {os.path.basename(self.path)} ({len(facts.facts)} facts, {len(history)} turns).")
+
+    # --- PROFILE ---
+    def get_name(self):
+        with self._lock:
+            self._refresh()
+            return self.name
+
+    def set_name(self, name):
+        with self._lock, timed(DISK_LATENCY, op="brain_save"), self.conn:
+            self.conn.execute("INSERT OR REPLACE INTO profile VALUES ('user_name', ?)", (json.dumps(name),))
+            self.name = name
+
+    def add_fact(self, text):
+        with self._lock:
+            self._refresh()
+            if not self.facts.add(text): return False
+            key = FactStore.normalise(text)
+            fact = self.facts.facts[key]
+            with timed(DISK_LATENCY, op="brain_save"), self.conn:
+                self.conn.execute("INSERT OR IGNORE INTO facts VALUES (?, ?, ?, ?, ?)",
+                                  (key, fact["text"], fact["created"], fact["uses"], fact["last_used"]))
+            return True
+
+    def select_facts(self, query):
+        with self._lock:
+            self._refresh()
+            chosen = self.facts.select(query)
+            if chosen:
+                # Usage stats of the handful of facts picked, not the whole profile
+                with self.conn:
+                    self.conn.executemany(
+                        "UPDATE facts SET uses=?, last_used=? WHERE key=?",
+                        [(self.facts.facts[k]["uses"], self.facts.facts[k]["last_used"], k)
+                         for k in map(FactStore.normalise, chosen)]
+                    )
+            return chosen
+
+    # --- HISTORY ---
+    def add_message(self, session, role, text):
+        """One INSERT plus trimming the oldest row: the cost doesn't grow with the history."""
+        with self._lock, timed(DISK_LATENCY, op="brain_save"), self.conn:
+            cur = self.conn.execute("INSERT INTO history (session, role, text, ts) VALUES (?, ?, ?, ?)",
+                                    (session, role, text, time.time()))
+            self.conn.execute("DELETE FROM history WHERE id <= ?", (cur.lastrowid - HISTORY_LIMIT,))
+
+    def history(self, limit=HISTORY_LIMIT):
+        with self._lock, timed(DISK_LATENCY, op="brain_load"):
+            rows = self.conn.execute("SELECT role, text FROM history ORDER BY id DESC LIMIT ?", (limit,)).fetchall()
+        return [{"role": role, "parts": [text]} for role, text in reversed(rows)]
+
+def _may_adopt(user):
+    """brain.json goes to MIRO_LEGACY_USER if set, else to the first client that connects with an id."""
+    return user == LEGACY_USER if LEGACY_USER else user != DEFAULT_USER
+
+_SHARDS = {}
+_SHARDS_LOCK = threading.Lock()
+
+def get_shard(user=None):
+    """The process-wide shard for a user, opened on first use."""
+    user = user or DEFAULT_USER
+    with _SHARDS_LOCK:
+        shard = _SHARDS.get(user)
+        if shard is None:
+            shard = _SHARDS[user] = UserShard(user, _shard_path(user))
+        return shard
+
+class MemoryManager:
+    """One user's facts, name and long-term history (a view on their UserShard)."""
+    def __init__(self, user=None):
+        self.user = user or DEFAULT_USER
+        self.shard = get_shard(self.user)
+        self.session_id = None   # tags history rows with the chat they came from
 
     def set_name(self, name):
-        self.data["user_name"] = name
-        self.save()
+        self.shard.set_name(name)
 
     def get_name(self):
-        return self.data.get("user_name")
+        return self.shard.get_name()
 
     def add_message(self, role, text):
-        """Saves a message to the main history."""
-        self.data["history"].append({"role": role, "parts": [text]})
-        # Limit to last 30 messages to prevent JSON bloat
-        if len(self.data["history"]) > 30:
-            self.data["history"] = self.data["history"][-30:]
-        self.save()
+        """Saves a message to the user's rolling history."""
+        self.shard.add_message(self.session_id, role, text)
 
     def get_history(self):
-        return self.data.get("history", [])
+        return self.shard.history()
     
     # --- LEARNING CAPABILITY ---
     def learn_fact(self, text):
         """Scans text for user preferences and saves them."""
         text_lower = text.lower()
-        if "i like" in text_lower or "i love" in text_lower or "my name is" in text_lower:
-            if text not in self.data["profile"].get("facts", []):
-                self.data["profile"]["facts"].append(text)
-                self.save()
+        if any(t in text_lower for t in FACT_TRIGGERS):
+            self.shard.add_fact(text)
 
-    def get_profile_context(self):
-        """Returns learned facts."""
-        facts = self.data.get("profile", {}).get("facts", [])
-        return "\n".join(f"- {f}" for f in facts[-5:]) if facts else "None"
+    def get_profile_context(self, query=""):
+        """Returns the learned facts most relevant to this message."""
+        facts = self.shard.select_facts(query)
+        return "\n".join(f"- {f}" for f in facts) if facts else "None"
 
 class SessionManager:
-    """Manages separate JSON files for sidebar chat history."""
-    def __init__(self):
+    """Manages separate JSON files for sidebar chat history (one file per session, tagged with its user)."""
+    def __init__(self, user=None):
         self.sessions_dir = SESSIONS_DIR
+        self.user = user or DEFAULT_USER
 
     def create_session(self):
         return str(uuid.uuid4())[:8]
@@ -85,30 +317,52 @@ class SessionManager:
             
         data = {
             "id": session_id,
+            "user": self.user,
             "title": title or current_title,
             "history": history,
             "timestamp": str(datetime.datetime.now())
         }
-        with open(session_file, "w") as f:
-            json.dump(data, f, indent=2)
+        # Write-then-rename: a crash mid-save never leaves a truncated session behind
+        temp_file = f"{session_file}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with timed(DISK_LATENCY, op="session_save"):
+            with open(temp_file, "w") as f: json.dump(data, f, indent=2)
+            os.replace(temp_file, session_file)
+
+        # Keep the long-term search index in step (only new turns are added)
+        try:
+            with timed(DISK_LATENCY, op="index_update"):
+                get_memory_index().index_session(session_id, history, user=self.user)
+        except Exception as e:
+            ERRORS.inc(where="memory_index")
+            print(f"⚠️ Memory index update failed: {e}")
     
     def load_session(self, session_id):
+        """The session, or None if it doesn't exist or belongs to another user."""
+        if not isinstance(session_id, str) or not SESSION_ID.fullmatch(session_id): return None
         session_file = os.path.join(self.sessions_dir, f"{session_id}.json")
         if os.path.exists(session_file):
             try:
-                with open(session_file, "r") as f: return json.load(f)
-            except: pass
+                with timed(DISK_LATENCY, op="session_load"), open(session_file, "r") as f: data = json.load(f)
+            except:
+                ERRORS.inc(where="session_load")
+                return None
+            # Same rule as get_all_sessions: unowned (pre per-user) sessions are open to everyone
+            if data.get("user", self.user) == self.user: return data
         return None
     
     def get_all_sessions(self):
         sessions = []
         if os.path.exists(self.sessions_dir):
+            started = time.perf_counter()
             files = glob.glob(os.path.join(self.sessions_dir, "*.json"))
             files.sort(key=os.path.getmtime, reverse=True)
             for file_path in files:
                 try:
                     with open(file_path, "r") as f:
                         data = json.load(f)
-                        sessions.append({"id": data["id"], "title": data.get("title", "Chat")})
+                    # Sessions saved before per-user memory have no owner and stay visible to everyone
+                    if data.get("user", self.user) != self.user: continue
+                    sessions.append({"id": data["id"], "title": data.get("title", "Chat")})
                 except: continue
+            DISK_LATENCY.observe(time.perf_counter() - started, op="session_list")
         return sessions
\ No newline at end of file
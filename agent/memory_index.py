@@ -0,0 +1,204 @@
+import os
+import re
+import json
+import glob
+import sqlite3
+import hashlib
+import datetime
+import threading
+
+# --- CONFIGURATION ---
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+INDEX_DB = os.path.join(BASE_DIR, "memory_index.db")
+SESSIONS_DIR = os.path.join(BASE_DIR, "sessions")
+
+# "[SYSTEM: Current Time: 01:09 PM, Date: Saturday, January 17, 2026 | USER: ...] text"
+CONTEXT_PREFIX = re.compile(r"^\[SYSTEM:.*?\]\s*", re.S)
+CONTEXT_STAMP = re.compile(r"Current Time: (\d{1,2}:\d{2} [AP]M), Date: \w+, (\w+ \d{1,2}, \d{4})")
+STOPWORDS = {
+    "a", "an", "the", "and", "or", "of", "to", "in", "on", "for", "is", "was", "we", "i", "you",
+    "me", "my", "did", "do", "what", "about", "talk", "talked", "say", "said", "remember", "when",
+    "last", "time", "past", "conversation", "us", "our", "it", "that", "this", "with", "miro"
+}
+
+def _text_of(part):
+    return part.get("text", "") if isinstance(part, dict) else str(part)
+
+def _stamp_of(raw_text):
+    """Reads the real message time back out of the injected context header."""
+    match = CONTEXT_STAMP.search(raw_text)
+    if not match: return None
+    try:
+        return datetime.datetime.strptime(f"{match.group(2)} {match.group(1)}", "%B %d, %Y %I:%M %p").timestamp()
+    except ValueError:
+        return None
+
+def _fts_query(text, joiner):
+    words = [w for w in re.findall(r"[a-z0-9]+", text.lower()) if w not in STOPWORDS and len(w) > 1]
+    return f" {joiner} ".join(f'"{w}"' for w in words)
+
+class MemoryIndex:
+    """
+    SQLite FTS5 index over every chat session and brain.json history.
+    Sessions are indexed incrementally from SessionManager.save_session, so
+    recall questions become a local query instead of replaying history into the prompt.
+    Every row carries the user it belongs to and search only returns that user's
+    rows (plus sessions saved before per-user memory, which have no owner).
+    """
+    def __init__(self, path=INDEX_DB):
+        self.path = path
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.has_fts = True
+        with self._lock, self.conn:
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS messages ("
+                " id INTEGER PRIMARY KEY, source TEXT NOT NULL, pos TEXT NOT NULL,"
+                " role TEXT, text TEXT, ts REAL, user TEXT, UNIQUE(source, pos))"
+            )
+            columns = {row[1] for row in self.conn.execute("PRAGMA table_info(messages)")}
+            migrating = "user" not in columns
+            if migrating: self.conn.execute("ALTER TABLE messages ADD COLUMN user TEXT")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS messages_ts ON messages(ts)")
+            self.conn.execute("CREATE TABLE IF NOT EXISTS sources (source TEXT PRIMARY KEY, count INTEGER)")
+            try:
+                self.conn.execute(
+                    "CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5("
+                    " text, content='messages', content_rowid='id')"
+                )
+            except sqlite3.OperationalError:
+                print("⚠️ SQLite FTS5 unavailable. Memory search falls back to LIKE.")
+                self.has_fts = False
+            self.conn.execute("CREATE INDEX IF NOT EXISTS messages_user ON messages(user)")
+            # brain.json turns indexed before rows had owners can't be attributed: drop them.
+            # Session rows get their owner back from the session files on bootstrap.
+            if migrating: self._drop_source("brain")
+        self._bootstrapped = False
+
+    # --- INDEXING ---
+    def _insert(self, source, pos, role, text, ts, user):
+        cur = self.conn.execute(
+            "INSERT OR IGNORE INTO messages (source, pos, role, text, ts, user) VALUES (?, ?, ?, ?, ?, ?)",
+            (source, pos, role, text, ts, user)
+        )
+        if cur.rowcount and self.has_fts:
+            self.conn.execute("INSERT INTO messages_fts (rowid, text) VALUES (?, ?)", (cur.lastrowid, text))
+
+    def _drop_source(self, source):
+        if self.has_fts:
+            self.conn.execute(
+                "INSERT INTO messages_fts (messages_fts, rowid, text) "
+                "SELECT 'delete', id, text FROM messages WHERE source=?", (source,)
+            )
+        self.conn.execute("DELETE FROM messages WHERE source=?", (source,))
+        self.conn.execute("DELETE FROM sources WHERE source=?", (source,))
+
+    def index_session(self, session_id, history, saved_at=None, user=None):
+        """Adds only the turns not indexed yet. A shrunk history (chat reset) is re-indexed."""
+        source = f"session:{session_id}"
+        saved_at = saved_at or datetime.datetime.now().timestamp()
+        with self._lock, self.conn:
+            row = self.conn.execute("SELECT count FROM sources WHERE source=?", (source,)).fetchone()
+            done = row[0] if row else 0
+            if done > len(history):
+                self._drop_source(source)
+                done = 0
+            # Turns indexed earlier follow the session's current owner (legacy sessions get claimed)
+            self.conn.execute("UPDATE messages SET user=? WHERE source=? AND user IS NOT ?", (user, source, user))
+
+            ts = None
+            for pos in range(done, len(history)):
+                turn = history[pos]
+                raw = " ".join(_text_of(p) for p in turn.get("parts", []))
+                ts = _stamp_of(raw) or ts or saved_at
+                text = CONTEXT_PREFIX.sub("", raw).strip()
+                if text: self._insert(source, str(pos), turn.get("role"), text, ts, user)
+
+            self.conn.execute(
+                "INSERT INTO sources (source, count) VALUES (?, ?) "
+                "ON CONFLICT(source) DO UPDATE SET count=excluded.count", (source, len(history))
+            )
+
+    def index_brain(self, history, user):
+        """brain.json is a rolling window, so dedup by content instead of position."""
+        now = datetime.datetime.now().timestamp()
+        source = f"brain:{user}"
+        with self._lock, self.conn:
+            for turn in history:
+                text = " ".join(_text_of(p) for p in turn.get("parts", [])).strip()
+                if not text: continue
+                digest = hashlib.sha1(f"{turn.get('role')}:{text}".encode()).hexdigest()
+                self._insert(source, digest, turn.get("role"), text, now, user)
+
+    def bootstrap(self):
+        """Indexes everything on disk once per process (cheap when already up to date)."""
+        if self._bootstrapped: return
+        self._bootstrapped = True
+        for path in glob.glob(os.path.join(SESSIONS_DIR, "*.json")):
+            try:
+                with open(path, "r") as f: data = json.load(f)
+                saved = datetime.datetime.fromisoformat(data["timestamp"]).timestamp() if data.get("timestamp") else None
+                self.index_session(data["id"], data.get("history", []), saved, data.get("user"))
+            except Exception: continue
+        # brain.json has no owner until memory.py migrates it into a user's shard (and indexes it there)
+
+    # --- QUERYING ---
+    def search(self, query, start=None, end=None, limit=5, user=None):
+        """Best-matching past messages of `user`. start/end are datetimes (inclusive range)."""
+        self.bootstrap()
+        where, args = ["(m.user = ? OR m.user IS NULL)"], [user]
+        if start: where.append("m.ts >= ?"); args.append(start.timestamp())
+        if end: where.append("m.ts <= ?"); args.append(end.timestamp())
+        extra = " AND " + " AND ".join(where)
+
+        with self._lock:
+            if self.has_fts:
+                for joiner in ("AND", "OR"):
+                    match = _fts_query(query, joiner)
+                    if not match: break
+                    rows = self.conn.execute(
+                        "SELECT m.source, m.role, m.text, m.ts FROM messages_fts f "
+                        "JOIN messages m ON m.id = f.rowid WHERE messages_fts MATCH ?" + extra +
+                        " ORDER BY bm25(messages_fts) LIMIT ?", [match] + args + [limit]
+                    ).fetchall()
+                    if rows: return rows
+                if match: return []
+            else:
+                words = [w for w in re.findall(r"[a-z0-9]+", query.lower()) if w not in STOPWORDS]
+                if words:
+                    like = " OR ".join("m.text LIKE ?" for _ in words)
+                    return self.conn.execute(
+                        f"SELECT m.source, m.role, m.text, m.ts FROM messages m WHERE ({like})" + extra +
+                        " ORDER BY m.ts DESC LIMIT ?", [f"%{w}%" for w in words] + args + [limit]
+                    ).fetchall()
+
+            # No usable keywords ("what did we talk about yesterday?") -> latest user turns in range
+            return self.conn.execute(
+                "SELECT m.source, m.role, m.text, m.ts FROM messages m WHERE m.role = 'user'" + extra +
+                " ORDER BY m.ts DESC LIMIT ?", args + [limit]
+            ).fetchall()
+
+def parse_date_range(text, now=None):
+    """Turns 'yesterday' / 'last week' / 'YYYY-MM-DD' in a question into (start, end)."""
+    now = now or datetime.datetime.now()
+    day = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    text = text.lower()
+    if "yesterday" in text: return day - datetime.timedelta(days=1), day
+    if "today" in text: return day, now
+    if "last week" in text: return day - datetime.timedelta(days=7), now
+    if "last month" in text: return day - datetime.timedelta(days=30), now
+    dates = re.findall(r"\d{4}-\d{2}-\d{2}", text)
+    if dates:
+        start = datetime.datetime.fromisoformat(dates[0])
+        end = datetime.datetime.fromisoformat(dates[-1]) + datetime.timedelta(days=1)
+        return start, end
+    return None, None
+
+_INDEX = None
+_INDEX_LOCK = threading.Lock()
+
+def get_memory_index():
+    global _INDEX
+    with _INDEX_LOCK:
+        if _INDEX is None: _INDEX = MemoryIndex()
+        return _INDEX
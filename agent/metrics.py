@@ -0,0 +1,215 @@
+import os
+import json
+import time
+import uuid
+import bisect
+import threading
+import contextvars
+from contextlib import contextmanager
+
+# --- CONFIGURATION ---
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+TRACE_ENABLED = os.getenv("MIRO_TRACE") == "1"
+TRACE_LOG = os.path.join(BASE_DIR, "logs", "traces.jsonl")
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _label_str(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs: return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+def _num(value):
+    if value == float("inf"): return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        if set(labels) != set(self.labels):
+            raise ValueError(f"{self.name} expects labels {self.labels}, got {tuple(labels)}")
+        return tuple(str(labels[n]) for n in self.labels)
+
+    def header(self):
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock: self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        with self._lock: return self._values.get(self._key(labels), 0)
+
+    def render(self):
+        with self._lock: items = sorted(self._values.items())
+        return self.header() + [f"{self.name}{_label_str(self.labels, k)} {_num(v)}" for k, v in items]
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock: self._values[key] = value
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            i = bisect.bisect_left(self.buckets, value)
+            if i < len(self.buckets): entry["counts"][i] += 1
+            entry["sum"] += value
+            entry["count"] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try: yield
+        finally: self.observe(time.perf_counter() - started, **labels)
+
+    def render(self):
+        with self._lock:
+            items = sorted((k, dict(v, counts=list(v["counts"]))) for k, v in self._values.items())
+        lines = self.header()
+        for key, entry in items:
+            running = 0
+            for bound, count in zip(self.buckets, entry["counts"]):
+                running += count
+                lines.append(f"{self.name}_bucket{_label_str(self.labels, key, [('le', _num(bound))])} {running}")
+            lines.append(f"{self.name}_bucket{_label_str(self.labels, key, [('le', '+Inf')])} {entry['count']}")
+            lines.append(f"{self.name}_sum{_label_str(self.labels, key)} {_num(entry['sum'])}")
+            lines.append(f"{self.name}_count{_label_str(self.labels, key)} {entry['count']}")
+        return lines
+
+class Registry:
+    """Minimal Prometheus registry: enough for /metrics without the client library."""
+    def __init__(self):
+        self.metrics = {}
+        self._lock = threading.Lock()
+
+    def _register(self, cls, name, *args, **kwargs):
+        with self._lock:
+            if name not in self.metrics: self.metrics[name] = cls(name, *args, **kwargs)
+            return self.metrics[name]
+
+    def counter(self, name, help_text, labels=()):
+        return self._register(Counter, name, help_text, labels)
+
+    def gauge(self, name, help_text, labels=()):
+        return self._register(Gauge, name, help_text, labels)
+
+    def histogram(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        return self._register(Histogram, name, help_text, labels, buckets=buckets)
+
+    def render(self):
+        with self._lock: metrics = list(self.metrics.values())
+        lines = []
+        for metric in metrics: lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+METRICS = Registry()
+
+# --- SHARED METRICS ---
+REQUEST_LATENCY = METRICS.histogram("miro_request_seconds", "End-to-end reply time per chat message.", ("kind",))
+MODEL_LATENCY = METRICS.histogram("miro_model_seconds", "Gemini call latency.", ("brain",))
+TOOL_LATENCY = METRICS.histogram("miro_tool_seconds", "Tool call latency per AVAILABLE_TOOLS entry.", ("tool",))
+DISK_LATENCY = METRICS.histogram("miro_disk_io_seconds", "Memory and session file I/O.", ("op",))
+CACHE_LOOKUPS = METRICS.counter("miro_cache_lookups_total", "Cache lookups by outcome.", ("cache", "result"))
+ERRORS = METRICS.counter("miro_errors_total", "Errors by component.", ("where",))
+VISION_FPS = METRICS.gauge("miro_vision_fps", "Frames processed per second by the vision worker.")
+VISION_DROPPED = METRICS.counter("miro_vision_dropped_total", "Browser frames skipped as stale or superseded.")
+VISION_INGEST = METRICS.counter("miro_vision_ingest_total", "Browser frames/landmark sets received.", ("kind",))
+VISION_STAGE = METRICS.histogram(
+    "miro_vision_stage_seconds", "Per-frame time spent in each vision stage.", ("stage",),
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.02, 0.033, 0.05, 0.1, 0.25)
+)
+
+# ==========================================
+# TRACING (MIRO_TRACE=1)
+# ==========================================
+_TRACE = contextvars.ContextVar("miro_trace", default=None)
+_TRACE_LOCK = threading.Lock()
+
+@contextmanager
+def trace_request(name, **attrs):
+    """Collects the spans of one request and appends them to logs/traces.jsonl."""
+    if not TRACE_ENABLED:
+        yield None
+        return
+    trace = {"trace_id": uuid.uuid4().hex[:16], "name": name, "start": time.time(), "attrs": attrs, "spans": []}
+    trace["_t0"] = time.perf_counter()
+    token = _TRACE.set(trace)
+    try:
+        yield trace
+    finally:
+        _TRACE.reset(token)
+        trace["duration_s"] = round(time.perf_counter() - trace.pop("_t0"), 4)
+        try:
+            os.makedirs(os.path.dirname(TRACE_LOG), exist_ok=True)
+            with _TRACE_LOCK, open(TRACE_LOG, "a") as f:
+                f.write(json.dumps(trace, default=str) + "\n")
+        except OSError:
+            pass
+
+@contextmanager
+def timed(histogram, span=None, **labels):
+    """Observes the block in `histogram` and, inside a trace, records it as a span."""
+    trace = _TRACE.get()
+    started = time.perf_counter()
+    error = None
+    try:
+        yield
+    except BaseException as e:
+        error = type(e).__name__
+        raise
+    finally:
+        elapsed = time.perf_counter() - started
+        histogram.observe(elapsed, **labels)
+        if trace is not None:
+            trace["spans"].append({
+                "name": span or histogram.name, "labels": labels, "error": error,
+                "offset_s": round(started - trace.get("_t0", started), 4),
+                "duration_s": round(elapsed, 4),
+            })
+
+def instrument_tool(name, func):
+    """Wraps an async tool so every call lands in TOOL_LATENCY (and ERRORS on failure)."""
+    async def wrapper(*args, **kwargs):
+        with timed(TOOL_LATENCY, f"tool:{name}", tool=name):
+            try:
+                return await func(*args, **kwargs)
+            except Exception:
+                ERRORS.inc(where=f"tool:{name}")
+                raise
+    wrapper.__name__ = getattr(func, "__name__", name)
+    wrapper.__doc__ = func.__doc__
+    wrapper.__wrapped__ = func
+    return wrapper
+
+def record_vision_stats(stats):
+    """Folds a stats report from the vision worker pipe into the registry."""
+    VISION_FPS.set(stats.get("fps", 0.0))
+    if stats.get("dropped"): VISION_DROPPED.inc(stats["dropped"])
+    for stage, samples in stats.get("stages", {}).items():
+        for value in samples: VISION_STAGE.observe(value, stage=stage)
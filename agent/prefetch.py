@@ -0,0 +1,174 @@
+import time
+import asyncio
+
+try:
+    from metrics import METRICS
+except ImportError:
+    from agent.metrics import METRICS
+
+# --- CONFIGURATION ---
+# tool: seconds an intent must hold across partial transcripts before the call starts.
+# Only side-effect-free calls belong here: compare_prices, never shop_online.
+SPECULATIVE_TOOLS = {"get_weather": 0.0, "search_web": 0.25, "compare_prices": 0.5}
+RESULT_TTL = 30          # Seconds a finished speculative result stays usable
+WEATHER_CITY = "Hyderabad"
+SHOPPING_TRIGGERS = ["order", "buy", "purchase", "shop", "get me a"]
+
+PREFETCH = METRICS.counter("miro_prefetch_total", "Speculative tool calls by outcome (started/hit/miss/waste).", ("tool", "outcome"))
+PREFETCH_SAVED = METRICS.histogram("miro_prefetch_saved_seconds", "Tool time hidden behind the user's own input.", ("tool",))
+
+# Process-wide totals for /prefetch/stats (the counters above are per tool)
+STATS = {"started": 0, "hit": 0, "miss": 0, "waste": 0, "saved_s": 0.0}
+
+def _count(tool, outcome):
+    PREFETCH.inc(tool=tool, outcome=outcome)
+    STATS[outcome] += 1
+
+def prefetch_stats():
+    decided = STATS["hit"] + STATS["miss"]
+    return dict(STATS,
+                saved_s=round(STATS["saved_s"], 3),
+                hit_ratio=round(STATS["hit"] / decided, 3) if decided else None,
+                waste_ratio=round(STATS["waste"] / STATS["started"], 3) if STATS["started"] else None)
+
+# ==========================================
+# INTENTS (shared with VoiceAssistant._respond)
+# ==========================================
+def shopping_request(clean_text):
+    """(item, platform) for a shopping command, else None. The item may be empty."""
+    if not any(t in clean_text for t in SHOPPING_TRIGGERS): return None
+
+    # 1. Detect Platform (Default to 'auto' for price comparison)
+    target_platform = "auto"
+    if "flipkart" in clean_text: target_platform = "Flipkart"
+    if "amazon" in clean_text: target_platform = "Amazon"
+
+    # 2. Clean Input
+    target_item = clean_text
+    for t in SHOPPING_TRIGGERS: target_item = target_item.replace(t, "")
+    target_item = target_item.replace("from amazon", "").replace("on amazon", "").replace("amazon", "")
+    target_item = target_item.replace("from flipkart", "").replace("on flipkart", "").replace("flipkart", "")
+    target_item = target_item.replace(" me ", " ").replace(" a ", " ").replace(" an ", " ").strip()
+    return target_item, target_platform
+
+def search_query(clean_text):
+    return clean_text.replace("search", "").replace("for", "").strip()
+
+def research_topic(clean_text):
+    """Topic of a "research ..." request (a background job, see agent/jobs.py), else None."""
+    if "research" not in clean_text: return None
+    topic = clean_text.split("research", 1)[1].strip()
+    for prefix in ("about ", "on ", "into "):
+        if topic.startswith(prefix): topic = topic[len(prefix):]
+    return topic.strip(" ?.!") or None
+
+def tool_intent(clean_text):
+    """
+    The speculatable call _respond would make for this text, as (tool, args), or None.
+    Follows its precedence: "play" wins over shopping, "time" over weather and search.
+    """
+    if "play" in clean_text: return None
+    shopping = shopping_request(clean_text)
+    if shopping:
+        item, platform = shopping
+        return ("compare_prices", (item, platform)) if len(item) >= 2 else None
+    if "time" in clean_text: return None
+    if "weather" in clean_text: return "get_weather", (WEATHER_CITY,)
+    if "research" in clean_text: return None   # runs as a job; "search" below would misread it
+    if "search" in clean_text:
+        query = search_query(clean_text)
+        return ("search_web", (query,)) if len(query) >= 3 else None
+    return None
+
+# ==========================================
+# SPECULATION
+# ==========================================
+class Prefetcher:
+    """
+    One per connection. observe() follows the partial transcript and keeps at most
+    one speculative tool call running; claim() hands its result to the confirmed
+    request if that asks for the same call. Anything else is cancelled as waste.
+    """
+    def __init__(self, tools):
+        self.tools = tools       # callable returning the tools module (loaded lazily)
+        self.key = None          # (tool, args) being speculated
+        self.task = None
+        self.timing = None       # {"started", "finished"} monotonic times of the tool call itself
+        self.observed = False    # partials were seen for the current utterance
+
+    def observe(self, intent):
+        self.observed = True
+        if intent == self.key: return
+        self.discard()
+        if intent is None or intent[0] not in SPECULATIVE_TOOLS: return
+        self.key = intent
+        self.timing = {"started": None, "finished": None}
+        self.task = asyncio.create_task(self._speculate(*intent, self.timing))
+        self.task.add_done_callback(_retrieve)
+
+    async def _speculate(self, tool, args, timing):
+        await asyncio.sleep(SPECULATIVE_TOOLS[tool])   # intent must survive the next partial or two
+        timing["started"] = time.monotonic()
+        _count(tool, "started")
+        try:
+            return await getattr(self.tools(), tool)(*args)
+        finally:
+            timing["finished"] = time.monotonic()
+
+    async def claim(self, tool, *args):
+        """The speculative result for tool(*args), or None when the caller must run it itself."""
+        handle = self.take(tool, *args)
+        return await handle if handle else None
+
+    def take(self, tool, *args):
+        """
+        Like claim(), but hands the matching call over without waiting for it (for
+        background jobs that outlive the request). Await the returned task for the
+        result, None if the speculative call failed. Returns None on a miss.
+        """
+        if tool not in SPECULATIVE_TOOLS: return None
+        timing = self.timing
+        matched = self.key == (tool, args) and timing["started"] is not None
+        if matched and self.task.done() and time.monotonic() - timing["finished"] > RESULT_TTL:
+            matched = False
+        if not matched:
+            if self.observed: _count(tool, "miss")
+            self.settle()
+            return None
+
+        task = self.task
+        self.key = self.task = self.timing = None
+        self.settle()
+        return asyncio.ensure_future(_collect(tool, task, timing, time.monotonic()))
+
+    def discard(self):
+        """Drops the current speculation; a call that already started counts as waste."""
+        if self.task is not None:
+            if self.timing["started"] is not None: _count(self.key[0], "waste")
+            self.task.cancel()
+        self.key = self.task = self.timing = None
+
+    def settle(self):
+        """End of a request: whatever was not claimed is waste."""
+        self.discard()
+        self.observed = False
+
+async def _collect(tool, task, timing, claimed):
+    try:
+        result = await task   # cancelling the reply cancels the tool call too
+    except asyncio.CancelledError:
+        task.cancel()
+        raise
+    except Exception as e:
+        print(f"⚠️ Speculative {tool} failed ({e}). Running it again.")
+        _count(tool, "miss")
+        return None
+    saved = min(claimed, timing["finished"]) - timing["started"]
+    _count(tool, "hit")
+    STATS["saved_s"] += saved
+    PREFETCH_SAVED.observe(saved, tool=tool)
+    return result
+
+def _retrieve(task):
+    # Unclaimed speculation is allowed to fail quietly
+    if not task.cancelled(): task.exception()
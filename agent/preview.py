@@ -0,0 +1,57 @@
+import os
+import asyncio
+import threading
+
+# --- CONFIGURATION ---
+PREVIEW_FPS = float(os.getenv("MIRO_PREVIEW_FPS", "10"))
+BOUNDARY = "frame"
+
+class PreviewFeed:
+    """
+    Read side of the vision worker's preview slot (see vision_worker.JpegBuffer).
+    The worker only draws and encodes while at least one client is watching, so
+    watch/unwatch are reference-counted and forwarded as "preview:on"/"preview:off".
+    """
+    def __init__(self, notify):
+        self.notify = notify      # send_hardware_command
+        self.buffer = None
+        self.watchers = 0
+        self._lock = threading.Lock()
+
+    def available(self):
+        if self.buffer is not None: return True
+        name = os.getenv("MIRO_VISION_PREVIEW")
+        if not name: return False
+        try:
+            from vision_worker import JpegBuffer
+            self.buffer = JpegBuffer(name=name)
+        except (ImportError, FileNotFoundError, ValueError) as e:
+            print(f"⚠️ Vision preview unavailable: {e}")
+            return False
+        return True
+
+    def _watch(self, delta):
+        with self._lock:
+            before = self.watchers
+            self.watchers = max(0, self.watchers + delta)
+            changed = (before == 0) != (self.watchers == 0)
+        if changed: self.notify("preview:on" if self.watchers else "preview:off")
+
+    async def frames(self):
+        """Newest JPEG at most PREVIEW_FPS times a second; repeats are skipped."""
+        self._watch(+1)
+        last_seq = 0
+        try:
+            while True:
+                last_seq, jpeg = self.buffer.read(last_seq)
+                if jpeg: yield jpeg
+                await asyncio.sleep(1 / PREVIEW_FPS)
+        finally:
+            self._watch(-1)
+
+    async def mjpeg(self):
+        async for jpeg in self.frames():
+            yield (
+                f"--{BOUNDARY}\r\nContent-Type: image/jpeg\r\nContent-Length: {len(jpeg)}\r\n\r\n".encode()
+                + jpeg + b"\r\n"
+            )
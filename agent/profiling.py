@@ -0,0 +1,49 @@
+import sys
+import time
+import importlib
+import threading
+from contextlib import contextmanager
+
+class StartupProfile:
+    """Records how long each startup stage and each lazy heavy import took."""
+    def __init__(self):
+        self.t0 = time.perf_counter()
+        self.stages = []   # (name, seconds)
+        self.imports = {}  # module -> seconds
+        self.ready_at = None
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try: yield
+        finally:
+            with self._lock: self.stages.append((name, time.perf_counter() - start))
+
+    def lazy_import(self, module_name):
+        """importlib.import_module that records the first (cold) import time."""
+        if module_name in sys.modules: return sys.modules[module_name]
+        start = time.perf_counter()
+        module = importlib.import_module(module_name)
+        with self._lock: self.imports.setdefault(module_name, time.perf_counter() - start)
+        return module
+
+    def mark_ready(self):
+        if self.ready_at is None: self.ready_at = time.perf_counter() - self.t0
+
+    def as_dict(self):
+        with self._lock:
+            return {
+                "ready_after_s": round(self.ready_at, 3) if self.ready_at is not None else None,
+                "stages": {n: round(s, 3) for n, s in self.stages},
+                "lazy_imports": {m: round(s, 3) for m, s in self.imports.items()},
+            }
+
+    def report(self):
+        data = self.as_dict()
+        lines = [f"⏱️ Server ready after {data['ready_after_s']}s"]
+        lines += [f"   stage  {n:<28} {s:>7.3f}s" for n, s in data["stages"].items()]
+        lines += [f"   import {m:<28} {s:>7.3f}s" for m, s in data["lazy_imports"].items()]
+        return "\n".join(lines)
+
+STARTUP = StartupProfile()
@@ -0,0 +1,107 @@
+import os
+import re
+import math
+import time
+import threading
+from collections import Counter, OrderedDict
+
+# --- CONFIGURATION ---
+CACHE_THRESHOLD = float(os.getenv("MIRO_CACHE_THRESHOLD", "0.9"))  # cosine similarity of char 3-grams
+CACHE_TTL = float(os.getenv("MIRO_CACHE_TTL", str(6 * 3600)))     # seconds
+CACHE_SIZE = int(os.getenv("MIRO_CACHE_SIZE", "500"))
+CACHE_MIN_WORDS = int(os.getenv("MIRO_CACHE_MIN_WORDS", "3"))  # shorter prompts lean on the conversation
+NGRAM = 3
+
+# Answers to these change with time or trigger side effects -> never cache
+BYPASS_PATTERN = re.compile(
+    r"\b(time|date|day|today|tonight|tomorrow|yesterday|now|current|latest|news|weather|"
+    r"price|stock|score|search|play|open|volume|screenshot|minimi[sz]e|buy|order|shop|email|"
+    r"remind|remember|my name|i like|i love|last time|activate|disconnect)\b"
+)
+# Follow-ups whose meaning comes from the previous turns ("tell me more", "why?", "yes do it")
+ANAPHORA_PATTERN = re.compile(
+    r"\b(it|its|that|this|these|those|they|them|he|she|him|her|more|why|yes|yeah|no|nope|ok|okay|"
+    r"again|continue|same|above|previous|another|else|also|then)\b"
+)
+
+def normalise(text):
+    text = re.sub(r"[^a-z0-9 ]+", " ", (text or "").lower())
+    return re.sub(r"\s+", " ", text).strip()
+
+def ngram_vector(text, n=NGRAM):
+    padded = f" {text} "
+    grams = Counter(padded[i:i + n] for i in range(max(1, len(padded) - n + 1)))
+    norm = math.sqrt(sum(c * c for c in grams.values())) or 1.0
+    return grams, norm
+
+def cosine(a, b):
+    (va, na), (vb, nb) = a, b
+    if len(va) > len(vb): va, vb = vb, va
+    return sum(c * vb.get(g, 0) for g, c in va.items()) / (na * nb)
+
+class ResponseCache:
+    """
+    Local similarity cache for repeated questions ("what can you do", "who made you").
+    Entries are bucketed by context key (persona, memory shard and loaded
+    document) and matched by character n-gram cosine similarity; nothing
+    leaves the machine. Short or anaphoric prompts are never cached: their answer
+    depends on the conversation, not on the words.
+    """
+    def __init__(self, threshold=CACHE_THRESHOLD, ttl=CACHE_TTL, size=CACHE_SIZE):
+        self.threshold = threshold
+        self.ttl = ttl
+        self.size = size
+        self.entries = OrderedDict()  # (context, normalised prompt) -> {"vec", "answer", "ts"}
+        self.hits = self.misses = self.bypassed = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def cacheable(prompt):
+        text = normalise(prompt)
+        if len(text.split()) < CACHE_MIN_WORDS: return False
+        return not (BYPASS_PATTERN.search(prompt.lower()) or ANAPHORA_PATTERN.search(text))
+
+    def lookup(self, prompt, context):
+        if not self.cacheable(prompt):
+            with self._lock: self.bypassed += 1
+            return None
+
+        text = normalise(prompt)
+        vec = ngram_vector(text)
+        now = time.time()
+        with self._lock:
+            exact = self.entries.get((context, text))
+            best, best_score = (exact, 1.0) if exact else (None, 0.0)
+            if not best:
+                for (ctx, _), entry in self.entries.items():
+                    if ctx != context: continue
+                    score = cosine(vec, entry["vec"])
+                    if score > best_score: best, best_score = entry, score
+
+            if best and best_score >= self.threshold and now - best["ts"] <= self.ttl:
+                self.hits += 1
+                return best["answer"]
+            self.misses += 1
+            return None
+
+    def store(self, prompt, context, answer):
+        if not answer or not self.cacheable(prompt): return
+        text = normalise(prompt)
+        with self._lock:
+            key = (context, text)
+            self.entries[key] = {"vec": ngram_vector(text), "answer": answer, "ts": time.time()}
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.size: self.entries.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self.entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "bypassed": self.bypassed,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+RESPONSE_CACHE = ResponseCache()
@@ -0,0 +1,76 @@
+import os
+import json
+import time
+import threading
+
+# --- CONFIGURATION ---
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+ROUTING_LOG = os.path.join(BASE_DIR, "logs", "routing.jsonl")
+
+# Clear signals that Flash will not be enough -> go straight to Pro
+HARD_TRIGGERS = [
+    "code", "script", "analyze", "architect", "complex", "debug", "python", "java",
+    "cpp", "html", "function", "api", "write a"
+]
+# Maybe-hard signals -> answer with Flash now, let Pro follow up if needed
+SOFT_TRIGGERS = ["why", "plan", "list", "generate", "table", "create a", "explain", "compare"]
+
+# Phrases that suggest Flash is out of its depth
+LOW_CONFIDENCE = [
+    "i'm not sure", "i am not sure", "i don't know", "i cannot", "i can't", "it depends",
+    "hard to say", "unclear", "as an ai"
+]
+
+class Route:
+    def __init__(self, mode, reason, escalate_now=False):
+        self.mode = mode                  # "fast" | "smart" | "hedge"
+        self.reason = reason
+        self.escalate_now = escalate_now  # hedge: start Pro in parallel right away
+
+def classify(text, has_image=False, has_file=False):
+    """Cheap keyword classifier (no model call)."""
+    text = text.lower()
+    if has_file or has_image: return Route("smart", "attachment")
+    if len(text) <= 10: return Route("fast", "short")
+
+    hard = [t for t in HARD_TRIGGERS if t in text]
+    if hard: return Route("smart", f"hard:{hard[0]}")
+
+    soft = [t for t in SOFT_TRIGGERS if t in text]
+    if soft:
+        # Several soft signals or a long request: don't wait for Flash to admit defeat
+        eager = len(soft) >= 2 or len(text) > 160
+        return Route("hedge", f"soft:{','.join(soft)}", escalate_now=eager)
+    return Route("fast", "default")
+
+def upgrade_reason(user_text, response):
+    """Flash's own confidence signal: truncated, hedging or suspiciously thin answers."""
+    try:
+        finish = response.candidates[0].finish_reason
+        name = getattr(finish, "name", str(finish))
+        if name not in ("STOP", "1"): return f"finish:{name}"
+    except Exception:
+        pass
+
+    text = (response.text or "").lower()
+    if any(p in text for p in LOW_CONFIDENCE): return "hedging"
+    asks_for_detail = any(t in user_text.lower() for t in ("list", "plan", "table", "compare"))
+    if asks_for_detail and len(text) < 200: return "thin"
+    return None
+
+class RoutingLog:
+    """Appends one JSON line per routed request for offline tuning."""
+    def __init__(self, path=ROUTING_LOG):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def record(self, **fields):
+        fields["ts"] = round(time.time(), 3)
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with self._lock, open(self.path, "a") as f:
+                f.write(json.dumps(fields) + "\n")
+        except OSError:
+            pass
+
+ROUTING = RoutingLog()
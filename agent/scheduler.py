@@ -0,0 +1,245 @@
+import os
+import re
+import time
+import asyncio
+import itertools
+
+try:
+    from metrics import METRICS, ERRORS
+except ImportError:
+    from agent.metrics import METRICS, ERRORS
+
+# --- CONFIGURATION ---
+# Requests per minute per key and model; Gemini quotas are per project and model.
+RPM = {
+    "flash": float(os.getenv("MIRO_RPM_FLASH", "60")),
+    "pro": float(os.getenv("MIRO_RPM_PRO", "30")),
+}
+BURST = 5                 # Bucket size: requests a key may fire back to back
+MAX_INFLIGHT = int(os.getenv("MIRO_KEY_CONCURRENCY", "8"))   # per key and model
+MAX_ATTEMPTS = 3          # Rate-limited calls are retried on another key (or later) this often
+BACKOFF_BASE = 2.0        # Seconds; doubles per consecutive 429 on the same key/model
+BACKOFF_MAX = 60.0
+
+# Lower number goes first. Background lanes leave part of each bucket for interactive turns.
+LANES = {
+    "interactive": (0, 0.0, 30),   # (priority, bucket share left untouched, max queue seconds)
+    "upgrade": (1, 0.2, 60),       # Pro follow-ups to an answer the user already has
+    "document": (2, 0.4, 120),     # uploaded files and background jobs (agent/jobs.py)
+}
+
+RETRY_DELAY = re.compile(r"retry(?:_delay)?[^0-9]{0,20}(\d+(?:\.\d+)?)\s*s?", re.I)
+
+SCHED_QUEUED = METRICS.gauge("miro_scheduler_queued", "Model calls waiting for a key, per lane.", ("lane",))
+SCHED_WAIT = METRICS.histogram("miro_scheduler_wait_seconds", "Time a model call waited for a key.", ("lane",))
+SCHED_THROTTLED = METRICS.counter("miro_scheduler_throttled_total", "429 responses per key and model.", ("key", "brain"))
+SCHED_CALLS = METRICS.counter("miro_scheduler_calls_total", "Model calls per key and model by outcome.", ("key", "brain", "outcome"))
+SCHED_TOKENS = METRICS.gauge("miro_scheduler_tokens", "Requests left in each key's bucket.", ("key", "brain"))
+
+class SchedulerBusy(RuntimeError):
+    """No key had capacity within the lane's queue time."""
+
+class QuotaExhausted(RuntimeError):
+    """Every attempt was rate limited."""
+
+def is_rate_limited(error):
+    code = getattr(error, "code", None)
+    try:
+        if int(code) == 429: return True
+    except (TypeError, ValueError):
+        pass
+    return type(error).__name__ in ("ResourceExhausted", "TooManyRequests") or "429" in str(error)[:200]
+
+class TokenBucket:
+    def __init__(self, rate_per_minute, capacity=BURST):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+
+    def refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        return self.tokens
+
+    def wait_for(self, needed):
+        """Seconds until `needed` tokens are available."""
+        missing = needed - self.refill()
+        return 0.0 if missing <= 0 else missing / self.rate
+
+class ApiKey:
+    """One Gemini API key: a bucket, a cooldown and an in-flight count per model."""
+    def __init__(self, name, secret, brains=("flash", "pro")):
+        self.name = name
+        self.secret = secret
+        self.brains = set(brains)
+        self.buckets = {b: TokenBucket(RPM[b]) for b in self.brains}
+        self.inflight = {b: 0 for b in self.brains}
+        self.cooldown = {b: 0.0 for b in self.brains}
+        self.strikes = {b: 0 for b in self.brains}
+        self.client = None
+        self.async_client = None
+
+    def ready_in(self, brain, reserve):
+        """0 when a call may start now, else seconds to wait (inf while saturated)."""
+        if self.inflight[brain] >= MAX_INFLIGHT: return float("inf")
+        bucket = self.buckets[brain]
+        cooling = self.cooldown[brain] - time.monotonic()
+        return max(cooling, bucket.wait_for(1 + reserve * bucket.capacity), 0.0)
+
+    def bind(self, chat):
+        """Points the chat's model at this key's clients instead of the global genai.configure."""
+        if self.client is None:
+            try:
+                from google.ai import generativelanguage as glm
+            except ImportError:
+                return chat  # SDK stand-in (bench): nothing to bind
+            options = {"api_key": self.secret}
+            self.client = glm.GenerativeServiceClient(client_options=options)
+            self.async_client = glm.GenerativeServiceAsyncClient(client_options=options)
+        chat.model._client = self.client
+        chat.model._async_client = self.async_client
+        return chat
+
+def keys_from_env():
+    """
+    GOOGLE_API_KEY serves Flash (and Pro unless GOOGLE_API_KEY_PRO is set, as before).
+    MIRO_GEMINI_KEYS adds comma-separated keys that serve both.
+    """
+    fast, pro = os.getenv("GOOGLE_API_KEY"), os.getenv("GOOGLE_API_KEY_PRO")
+    keys = []
+    if fast: keys.append(ApiKey("primary", fast, ("flash",) if pro and pro != fast else ("flash", "pro")))
+    if pro and pro != fast: keys.append(ApiKey("pro", pro, ("pro",)))
+    extra = [k.strip() for k in os.getenv("MIRO_GEMINI_KEYS", "").split(",") if k.strip()]
+    for i, secret in enumerate(extra, 1):
+        if secret not in (fast, pro): keys.append(ApiKey(f"pool{i}", secret))
+    return keys
+
+class Scheduler:
+    """
+    Hands out (key, model) slots to model calls. Calls queue by lane priority when
+    every key is out of tokens, cooling down after a 429 or saturated; a rate-limited
+    call goes back in the queue and usually lands on another key.
+    """
+    def __init__(self, keys=None):
+        self._keys = keys
+        self.waiting = []      # [priority, seq, lane, brain, future], kept sorted
+        self.seq = itertools.count()
+        self.timer = None
+
+    @property
+    def keys(self):
+        if self._keys is None: self._keys = keys_from_env()
+        return self._keys
+
+    def _candidates(self, brain):
+        return [k for k in self.keys if brain in k.brains]
+
+    def _pump(self):
+        """Grants every waiter that can start now; arms a timer for the next one that can't."""
+        if self.timer: self.timer.cancel()
+        self.timer = None
+        next_check = float("inf")
+        for entry in list(self.waiting):
+            _, _, lane, brain, future = entry
+            if future.done():
+                self.waiting.remove(entry)
+                continue
+            reserve = LANES[lane][1]
+            best, best_wait = None, float("inf")
+            for key in self._candidates(brain):
+                wait = key.ready_in(brain, reserve)
+                if wait < best_wait or (wait == best_wait and best and key.inflight[brain] < best.inflight[brain]):
+                    best, best_wait = key, wait
+            if best is not None and best_wait <= 0:
+                best.buckets[brain].tokens -= 1
+                best.inflight[brain] += 1
+                SCHED_TOKENS.set(round(best.buckets[brain].tokens, 2), key=best.name, brain=brain)
+                self.waiting.remove(entry)
+                future.set_result(best)
+            else:
+                next_check = min(next_check, best_wait)
+        self._publish()
+        if self.waiting and next_check != float("inf"):
+            self.timer = asyncio.get_running_loop().call_later(max(next_check, 0.01), self._pump)
+
+    def _publish(self):
+        for lane in LANES:
+            SCHED_QUEUED.set(sum(1 for e in self.waiting if e[2] == lane), lane=lane)
+
+    async def acquire(self, brain, lane="interactive"):
+        if not self._candidates(brain): raise RuntimeError(f"No API key configured for {brain}.")
+        future = asyncio.get_running_loop().create_future()
+        entry = [LANES[lane][0], next(self.seq), lane, brain, future]
+        self.waiting.append(entry)
+        self.waiting.sort(key=lambda e: (e[0], e[1]))
+        started = time.perf_counter()
+        self._pump()
+        try:
+            return await asyncio.wait_for(future, LANES[lane][2])
+        except asyncio.TimeoutError:
+            raise SchedulerBusy(f"No {brain} capacity for {LANES[lane][2]}s")
+        except asyncio.CancelledError:
+            # Granted in the same tick the caller was cancelled: hand the slot back
+            if future.done() and not future.cancelled(): self.release(future.result(), brain, cancelled=True)
+            raise
+        finally:
+            if entry in self.waiting: self.waiting.remove(entry)
+            self._publish()
+            SCHED_WAIT.observe(time.perf_counter() - started, lane=lane)
+
+    def release(self, key, brain, error=None, cancelled=False):
+        key.inflight[brain] -= 1
+        if cancelled:
+            SCHED_CALLS.inc(key=key.name, brain=brain, outcome="cancelled")
+        elif error is None:
+            key.strikes[brain] = 0
+            SCHED_CALLS.inc(key=key.name, brain=brain, outcome="ok")
+        elif is_rate_limited(error):
+            key.strikes[brain] += 1
+            hinted = RETRY_DELAY.search(str(error))
+            delay = float(hinted.group(1)) if hinted else BACKOFF_BASE * 2 ** (key.strikes[brain] - 1)
+            key.cooldown[brain] = time.monotonic() + min(delay, BACKOFF_MAX)
+            key.buckets[brain].tokens = 0.0
+            SCHED_THROTTLED.inc(key=key.name, brain=brain)
+            SCHED_CALLS.inc(key=key.name, brain=brain, outcome="throttled")
+            print(f"⏳ {key.name}/{brain} rate limited. Cooling down {min(delay, BACKOFF_MAX):.0f}s.")
+        else:
+            SCHED_CALLS.inc(key=key.name, brain=brain, outcome="error")
+        self._pump()
+
+    async def run(self, brain, chat, call, lane="interactive"):
+        """Runs call(chat) on a key with capacity; 429s are retried on the next free key."""
+        for attempt in range(MAX_ATTEMPTS):
+            key = await self.acquire(brain, lane)
+            try:
+                result = await call(key.bind(chat))
+            except asyncio.CancelledError:
+                self.release(key, brain, cancelled=True)
+                raise
+            except Exception as e:
+                self.release(key, brain, e)
+                if not is_rate_limited(e): raise
+                continue
+            self.release(key, brain)
+            return result
+        ERRORS.inc(where="scheduler")
+        raise QuotaExhausted(f"{brain} is rate limited on every key")
+
+    def stats(self):
+        now = time.monotonic()
+        return {
+            "queued": {lane: sum(1 for e in self.waiting if e[2] == lane) for lane in LANES},
+            "keys": {
+                key.name: {
+                    brain: {
+                        "tokens": round(key.buckets[brain].refill(), 2),
+                        "inflight": key.inflight[brain],
+                        "cooldown_s": round(max(0.0, key.cooldown[brain] - now), 1),
+                    } for brain in sorted(key.brains)
+                } for key in self.keys
+            },
+        }
+
+SCHEDULER = Scheduler()
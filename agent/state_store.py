@@ -0,0 +1,78 @@
+import os
+import json
+import sqlite3
+import threading
+
+# --- CONFIGURATION ---
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+STATE_DB = os.getenv("MIRO_STATE_DB", os.path.join(BASE_DIR, "state.db"))
+
+class StateStore:
+    """
+    Small namespaced key/value store on SQLite (WAL mode).
+    Safe to share between threads and between uvicorn worker processes,
+    so anything that used to live in a module global can live here instead.
+    """
+    def __init__(self, path=STATE_DB):
+        self.path = path
+        self._local = threading.local()
+        with self._conn() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS kv ("
+                " ns TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL,"
+                " PRIMARY KEY (ns, key))"
+            )
+
+    def _conn(self):
+        # sqlite3 connections must not cross threads -> one per thread
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10)
+            self._local.conn = conn
+        return conn
+
+    def get(self, ns, key, default=None):
+        row = self._conn().execute("SELECT value FROM kv WHERE ns=? AND key=?", (ns, key)).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def set(self, ns, key, value):
+        with self._conn() as conn:
+            conn.execute(
+                "INSERT INTO kv (ns, key, value) VALUES (?, ?, ?) "
+                "ON CONFLICT(ns, key) DO UPDATE SET value=excluded.value",
+                (ns, key, json.dumps(value))
+            )
+
+    def delete(self, ns, key):
+        with self._conn() as conn:
+            conn.execute("DELETE FROM kv WHERE ns=? AND key=?", (ns, key))
+
+    def append(self, ns, key, item):
+        """Atomically appends to a JSON list (read-modify-write inside one transaction)."""
+        conn = self._conn()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute("SELECT value FROM kv WHERE ns=? AND key=?", (ns, key)).fetchone()
+            items = json.loads(row[0]) if row else []
+            items.append(item)
+            conn.execute(
+                "INSERT INTO kv (ns, key, value) VALUES (?, ?, ?) "
+                "ON CONFLICT(ns, key) DO UPDATE SET value=excluded.value",
+                (ns, key, json.dumps(items))
+            )
+        return items
+
+    def keys(self, ns):
+        return [r[0] for r in self._conn().execute("SELECT key FROM kv WHERE ns=?", (ns,))]
+
+_STORE = None
+_STORE_LOCK = threading.Lock()
+
+def get_state_store():
+    """Process-wide shared StateStore (lazily created)."""
+    global _STORE
+    with _STORE_LOCK:
+        if _STORE is None:
+            _STORE = StateStore()
+        return _STORE
@@ -0,0 +1,157 @@
+"""
+Optional server-side speech recognition on a local Vosk model (no network).
+
+Audio arrives as 16-bit mono PCM, either from the wake-word microphone
+(wake_word.WakeWordListener.audio_since) or as binary WebSocket frames:
+
+    header {"type": "audio", "id": "...", "rate": 16000, "final": false}, payload = int16 PCM
+
+Each utterance yields ("partial", text) updates while the user is still talking
+and one ("final", text) at the end, so routing can start before they stop.
+
+    python agent/stt.py recording.wav     # prints partials/finals with timings
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import threading
+
+try:
+    from metrics import METRICS
+    from executors import run_in_pool
+except ImportError:
+    from agent.metrics import METRICS
+    from agent.executors import run_in_pool
+
+# --- CONFIGURATION ---
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+STT_MODEL = os.getenv("MIRO_STT_MODEL", os.path.join(BASE_DIR, "models", "vosk-model-small-en-us-0.15"))
+SAMPLE_RATE = 16000
+MAX_UTTERANCE = 15.0    # Seconds of audio before an utterance is forced to end
+MIN_PARTIAL_CHARS = 3   # Shorter partials are noise as far as routing is concerned
+
+STT_CHUNK = METRICS.histogram("miro_stt_chunk_seconds", "Decode time per audio chunk.")
+STT_UTTERANCES = METRICS.counter("miro_stt_utterances_total", "Utterances transcribed, by source.", ("source",))
+
+_MODEL = None
+_MODEL_LOCK = threading.Lock()
+
+def load_model():
+    """The Vosk model is shared by every recognizer; it loads once (assistant warm-up, else first use)."""
+    global _MODEL
+    with _MODEL_LOCK:
+        if _MODEL is None:
+            from vosk import Model, SetLogLevel
+            SetLogLevel(-1)
+            print(f"🗣️ Loading speech model from {STT_MODEL}...")
+            _MODEL = Model(STT_MODEL)
+        return _MODEL
+
+def available():
+    if _MODEL is not None: return True
+    try:
+        import vosk  # noqa: F401
+    except ImportError:
+        return False
+    return os.path.isdir(STT_MODEL)
+
+class Transcriber:
+    """One utterance. feed() is blocking C work: call it through the "speech" pool."""
+    def __init__(self, rate=SAMPLE_RATE):
+        from vosk import KaldiRecognizer
+        self.recognizer = KaldiRecognizer(load_model(), rate)
+        self.rate = rate
+        self.samples = 0
+        self.partial = ""
+        self.done = False
+
+    def feed(self, pcm):
+        """pcm: int16 bytes. Returns ("partial", text), ("final", text) or None."""
+        if self.done or not len(pcm): return None
+        with STT_CHUNK.time():
+            self.samples += len(pcm) // 2
+            if self.recognizer.AcceptWaveform(bytes(pcm)):
+                return self._final(json.loads(self.recognizer.Result()).get("text", ""))
+            if self.samples > MAX_UTTERANCE * self.rate:
+                return self.finish()
+            text = json.loads(self.recognizer.PartialResult()).get("partial", "")
+        if text != self.partial and len(text) >= MIN_PARTIAL_CHARS:
+            self.partial = text
+            return "partial", text
+        return None
+
+    def finish(self):
+        if self.done: return None
+        return self._final(json.loads(self.recognizer.FinalResult()).get("text", ""))
+
+    def _final(self, text):
+        self.done = True
+        return "final", text.strip()
+
+class SpeechStream:
+    """
+    Async wrapper for one utterance: chunks are decoded in order on the "speech"
+    pool and every update goes to on_update(kind, text), awaited on the loop.
+    Build it with `await SpeechStream.create(...)`: the recognizer (and, the first
+    time, the model) is built on the pool too.
+    """
+    def __init__(self, on_update, transcriber, source="ws"):
+        self.on_update = on_update
+        self.source = source
+        self.transcriber = transcriber
+        self._lock = asyncio.Lock()   # Kaldi state is sequential: one chunk at a time
+
+    @classmethod
+    async def create(cls, on_update, rate=SAMPLE_RATE, source="ws"):
+        return cls(on_update, await run_in_pool("speech", Transcriber, rate), source)
+
+    @property
+    def done(self):
+        return self.transcriber.done
+
+    async def _apply(self, func, *args):
+        async with self._lock:
+            update = await run_in_pool("speech", func, *args)
+        if update:
+            if update[0] == "final": STT_UTTERANCES.inc(source=self.source)
+            await self.on_update(*update)
+        return update
+
+    async def feed(self, pcm):
+        return await self._apply(self.transcriber.feed, pcm)
+
+    async def finish(self):
+        return await self._apply(self.transcriber.finish)
+
+def read_wav(path):
+    """(16-bit mono PCM bytes, sample rate) from a WAV file."""
+    import wave
+    with wave.open(path, "rb") as wav:
+        if wav.getsampwidth() != 2 or wav.getnchannels() != 1:
+            raise ValueError("Expected 16-bit mono WAV.")
+        return wav.readframes(wav.getnframes()), wav.getframerate()
+
+def transcribe_wav(path, chunk_seconds=0.1):
+    """Replays a recording at chunk_seconds per feed. Returns [(audio_time, kind, text)]."""
+    pcm, rate = read_wav(path)
+    step = int(rate * chunk_seconds) * 2
+    updates = []
+    transcriber = Transcriber(rate)
+    for offset in range(0, len(pcm), step):
+        update = transcriber.feed(pcm[offset:offset + step])
+        if update: updates.append((min(offset + step, len(pcm)) / 2 / rate, *update))
+        if transcriber.done: transcriber = Transcriber(rate)  # next utterance
+    tail = transcriber.finish()
+    if tail and tail[1]: updates.append((len(pcm) / 2 / rate, *tail))
+    return updates
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Usage: python agent/stt.py recording.wav")
+        sys.exit(1)
+    started = time.perf_counter()
+    for at, kind, text in transcribe_wav(sys.argv[1]):
+        print(f"{at:6.2f}s {kind:<7} {text}")
+    print(f"⏱️ Decoded in {time.perf_counter() - started:.2f}s")
@@ -0,0 +1,200 @@
+import os
+import re
+import time
+import asyncio
+import hashlib
+import tempfile
+import threading
+import importlib.util
+import multiprocessing
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    from metrics import METRICS, CACHE_LOOKUPS, ERRORS
+except ImportError:
+    from agent.metrics import METRICS, CACHE_LOOKUPS, ERRORS
+
+# --- CONFIGURATION ---
+TTS_ENABLED = os.getenv("MIRO_TTS", "1") == "1"        # used only when a client asks for it
+TTS_WORKERS = int(os.getenv("MIRO_TTS_WORKERS", "2"))  # synthesis processes
+TTS_VOICE = os.getenv("MIRO_TTS_VOICE", "Zira")        # substring of an installed voice name
+TTS_RATE = int(os.getenv("MIRO_TTS_RATE", "185"))      # words per minute
+CACHE_BYTES = int(os.getenv("MIRO_TTS_CACHE_MB", "32")) * 1024 * 1024
+SYNTH_TIMEOUT = 20      # Seconds per sentence
+MAX_SENTENCES = 20      # Longer replies are cut off (the text is still on screen)
+
+# Fixed replies from _respond and tools.py, synthesised when the first client turns voice on
+WARM_PHRASES = [
+    "Mouse Active.", "Vision Camera On.", "Disconnected.", "Volume Up.", "Volume Down.", "Muted.",
+    "Request unsafe.", "What item would you like me to order?",
+]
+
+SENTENCE_SPLIT = re.compile(r"(?<=[.!?])\s+|\n+")
+CODE_BLOCK = re.compile(r"```.*?(```|$)", re.S)
+MARKUP = re.compile(r"[*#`_>|]")
+
+TTS_LATENCY = METRICS.histogram("miro_tts_seconds", "Synthesis time per sentence (cache misses).")
+TTS_FIRST_AUDIO = METRICS.histogram("miro_tts_first_audio_seconds", "Reply text to first audio chunk.")
+
+def split_sentences(text):
+    """Speakable sentences: code blocks and markdown symbols are dropped."""
+    text = MARKUP.sub("", CODE_BLOCK.sub(" ", text or ""))
+    sentences = [s.strip() for s in SENTENCE_SPLIT.split(text)]
+    return [s for s in sentences if re.search(r"\w", s)][:MAX_SENTENCES]
+
+def audio_mime(audio):
+    if audio[:4] == b"RIFF": return "audio/wav"
+    if audio[:4] == b"FORM": return "audio/aiff"   # macOS NSSpeechSynthesizer
+    return "application/octet-stream"
+
+# --- WORKER PROCESS ---
+# pyttsx3 engines are neither thread-safe nor re-entrant, so each worker process owns one.
+_ENGINE = None
+_VOICES = {}
+
+def _init_worker():
+    global _ENGINE
+    import pyttsx3
+    _ENGINE = pyttsx3.init()
+
+def _voice_id(name):
+    if name not in _VOICES:
+        voices = _ENGINE.getProperty("voices") or []
+        match = next((v for v in voices if name and name.lower() in (v.name or "").lower()), None)
+        _VOICES[name] = match.id if match else None
+    return _VOICES[name]
+
+def _synthesize(text, voice, rate):
+    voice_id = _voice_id(voice)
+    if voice_id: _ENGINE.setProperty("voice", voice_id)
+    _ENGINE.setProperty("rate", rate)
+    fd, path = tempfile.mkstemp(suffix=".wav")
+    os.close(fd)
+    try:
+        _ENGINE.save_to_file(text, path)
+        _ENGINE.runAndWait()
+        with open(path, "rb") as f: return f.read()
+    finally:
+        try: os.remove(path)
+        except OSError: pass
+
+# --- AGENT SIDE ---
+class AudioCache:
+    """LRU of synthesised sentences keyed by text + voice + rate, bounded in bytes."""
+    def __init__(self, max_bytes=CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()  # key -> audio bytes
+        self.size = 0
+        self.hits = self.misses = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(text, voice, rate=TTS_RATE):
+        return hashlib.sha1(f"{voice}|{rate}|{text.strip().lower()}".encode()).hexdigest()
+
+    def get(self, key):
+        with self._lock:
+            audio = self.entries.get(key)
+            if audio is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return audio
+
+    def put(self, key, audio):
+        if len(audio) > self.max_bytes: return
+        with self._lock:
+            old = self.entries.pop(key, None)
+            if old is not None: self.size -= len(old)
+            self.entries[key] = audio
+            self.size += len(audio)
+            while self.size > self.max_bytes:
+                _, evicted = self.entries.popitem(last=False)
+                self.size -= len(evicted)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self.entries),
+                "bytes": self.size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+class Speaker:
+    """
+    Server-side text-to-speech on a local engine (pyttsx3: SAPI5 / NSSpeech / eSpeak).
+    Sentences are synthesised in parallel on worker processes and handed back in
+    order, so a long reply starts playing after its first sentence.
+    """
+    def __init__(self, workers=TTS_WORKERS):
+        self.workers = workers
+        self.cache = AudioCache()
+        self.executor = None
+        self.warming = None
+        self._lock = threading.Lock()
+
+    def available(self):
+        return TTS_ENABLED and importlib.util.find_spec("pyttsx3") is not None
+
+    def _pool(self):
+        with self._lock:
+            if self.executor is None:
+                ctx = multiprocessing.get_context("spawn")
+                self.executor = ProcessPoolExecutor(self.workers, mp_context=ctx, initializer=_init_worker)
+            return self.executor
+
+    async def synthesize(self, text, voice=None):
+        voice = voice or TTS_VOICE
+        key = AudioCache.key(text, voice)
+        audio = self.cache.get(key)
+        CACHE_LOOKUPS.inc(cache="tts", result="hit" if audio else "miss")
+        if audio: return audio
+        with TTS_LATENCY.time():
+            future = self._pool().submit(_synthesize, text, voice, TTS_RATE)
+            audio = await asyncio.wait_for(asyncio.wrap_future(future), SYNTH_TIMEOUT)
+        self.cache.put(key, audio)
+        return audio
+
+    async def stream(self, text, voice=None):
+        """Yields (seq, sentence, audio, last) in reply order."""
+        sentences = split_sentences(text)
+        if not sentences: return
+        started = time.perf_counter()
+        # Everything is queued at once; the pool works ahead while earlier sentences play
+        jobs = [asyncio.ensure_future(self.synthesize(s, voice)) for s in sentences]
+        try:
+            for seq, (sentence, job) in enumerate(zip(sentences, jobs)):
+                try:
+                    audio = await job
+                except Exception as e:
+                    ERRORS.inc(where="tts")
+                    print(f"⚠️ Speech synthesis skipped a sentence: {e!r}")
+                    continue
+                if seq == 0: TTS_FIRST_AUDIO.observe(time.perf_counter() - started)
+                yield seq, sentence, audio, seq == len(jobs) - 1
+        finally:
+            for job in jobs:
+                job.cancel()
+                if job.done() and not job.cancelled(): job.exception()  # already logged or unneeded
+
+    def warm(self, phrases=WARM_PHRASES, voice=None):
+        """Fills the cache with fixed replies in the background (once per process)."""
+        if self.warming: return self.warming
+        async def _warm():
+            for phrase in phrases:
+                try: await self.synthesize(phrase, voice)
+                except Exception as e:
+                    print(f"⚠️ TTS warm-up stopped: {e!r}")
+                    return
+        self.warming = asyncio.create_task(_warm())
+        return self.warming
+
+    def shutdown(self):
+        if self.executor: self.executor.shutdown(wait=False, cancel_futures=True)
+
+SPEAKER = Speaker()
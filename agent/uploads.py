@@ -0,0 +1,87 @@
+import json
+import struct
+import tempfile
+
+# --- CONFIGURATION ---
+# Binary WebSocket frame: [uint32 big-endian header length][JSON header][raw payload]
+# Header: {"type": "upload" | "image", "id": "...", "name": "...", "text": "...", "final": true}
+# Large files are sent as several frames with the same id; the last one has final=true.
+# "vision_frame"/"landmarks" (agent/vision_ingest.py) and "audio" (agent/stt.py) frames never reach the assembler.
+HEADER_LEN = struct.Struct(">I")
+SPOOL_IN_MEMORY = 1 * 1024 * 1024    # Bigger uploads spill to a temp file on disk
+MAX_UPLOAD_BYTES = 50 * 1024 * 1024
+MAX_OPEN_UPLOADS = 4                 # Per connection
+MAX_IMAGE_SIDE = 1024                # Gemini gains nothing from larger inputs
+
+class UploadError(Exception):
+    pass
+
+def pack_binary_frame(header, payload):
+    """Inverse of parse_binary_frame, for frames the server sends (e.g. agent/tts.py audio)."""
+    head = json.dumps(header).encode()
+    return HEADER_LEN.pack(len(head)) + head + bytes(payload)
+
+def parse_binary_frame(data):
+    """Splits a frame into (header dict, payload memoryview) without copying the payload."""
+    view = memoryview(data)
+    if len(view) < HEADER_LEN.size: raise UploadError("Frame too short.")
+    (n,) = HEADER_LEN.unpack_from(view)
+    end = HEADER_LEN.size + n
+    if end > len(view): raise UploadError("Bad frame header length.")
+    try:
+        header = json.loads(bytes(view[HEADER_LEN.size:end]))
+    except ValueError:
+        raise UploadError("Bad frame header.")
+    if not isinstance(header, dict): raise UploadError("Bad frame header.")
+    return header, view[end:]
+
+class UploadAssembler:
+    """Streams chunked uploads for one connection into spooled temp files."""
+    def __init__(self):
+        self.pending = {}  # id -> [SpooledTemporaryFile, size]
+
+    def feed(self, header, payload):
+        """Appends a chunk. Returns the finished file (rewound) on the final chunk, else None."""
+        upload_id = str(header.get("id") or "single")
+        entry = self.pending.get(upload_id)
+        if entry is None:
+            if len(self.pending) >= MAX_OPEN_UPLOADS:
+                raise UploadError("Too many uploads in progress.")
+            entry = self.pending[upload_id] = [tempfile.SpooledTemporaryFile(max_size=SPOOL_IN_MEMORY), 0]
+
+        entry[1] += len(payload)
+        if entry[1] > MAX_UPLOAD_BYTES:
+            self.discard(upload_id)
+            raise UploadError("Upload too large.")
+        entry[0].write(payload)
+
+        if header.get("final", True):
+            fileobj = self.pending.pop(upload_id)[0]
+            fileobj.seek(0)
+            return fileobj
+        return None
+
+    def discard(self, upload_id):
+        entry = self.pending.pop(upload_id, None)
+        if entry: entry[0].close()
+
+    def close(self):
+        for upload_id in list(self.pending): self.discard(upload_id)
+
+def load_image(fileobj, max_side=MAX_IMAGE_SIDE):
+    """Decodes an image and shrinks it to max_side. JPEGs are decoded at reduced scale directly."""
+    from PIL import Image
+    img = Image.open(fileobj)
+    # draft() lets libjpeg skip detail we would throw away anyway
+    img.draft("RGB", (max_side, max_side))
+    img.thumbnail((max_side, max_side))
+    if img.mode not in ("RGB", "L"): img = img.convert("RGB")
+    return img
+
+def read_document(fileobj, filename):
+    """Extracts text from an uploaded PDF or text file."""
+    if filename.lower().endswith(".pdf"):
+        import PyPDF2
+        reader = PyPDF2.PdfReader(fileobj)
+        return "".join((page.extract_text() or "") + "\n" for page in reader.pages)
+    return fileobj.read().decode("utf-8", errors="replace")
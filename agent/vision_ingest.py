@@ -0,0 +1,43 @@
+import os
+import json
+
+try:
+    from metrics import VISION_INGEST
+except ImportError:
+    from agent.metrics import VISION_INGEST
+
+# Binary WebSocket frame types handled here instead of by the upload assembler
+INGEST_TYPES = ("vision_frame", "landmarks")
+
+class VisionIngest:
+    """
+    Write side of the vision worker's ingest slot (see vision_worker.IngestBuffer).
+    Browser frames overwrite each other, so the worker always sees the newest one
+    and nothing queues up in the agent when it falls behind.
+    """
+    def __init__(self):
+        self.buffer = None
+        self.kinds = None
+
+    def available(self):
+        if self.buffer is not None: return True
+        name = os.getenv("MIRO_VISION_INGEST")
+        if not name: return False
+        try:
+            from vision_worker import IngestBuffer, INGEST_JPEG, INGEST_LANDMARKS
+            self.buffer = IngestBuffer(name=name)
+        except (ImportError, FileNotFoundError, ValueError) as e:
+            print(f"⚠️ Vision ingest unavailable: {e}")
+            return False
+        self.kinds = {"vision_frame": INGEST_JPEG, "landmarks": INGEST_LANDMARKS}
+        return True
+
+    def push(self, header, payload):
+        """header["type"]: "vision_frame" (JPEG payload) or "landmarks" (JSON payload or header["hands"])."""
+        if not self.available(): return False
+        kind = header.get("type")
+        if kind == "landmarks" and not payload:
+            payload = json.dumps({"w": header.get("w", 640), "h": header.get("h", 480),
+                                  "hands": header.get("hands", [])}).encode()
+        VISION_INGEST.inc(kind=kind)
+        return self.buffer.write(payload, self.kinds[kind])
@@ -0,0 +1,104 @@
+"""
+Deterministic stand-in for google.generativeai, used by the load harness.
+
+Only the surface Miro touches is implemented: configure(), GenerativeModel,
+start_chat() and ChatSession.send_message / send_message_async. Replies are
+derived from a hash of the prompt, and latency is first-token latency plus
+reply length divided by the token rate, so runs are repeatable.
+"""
+import time
+import types
+import random
+import asyncio
+import hashlib
+
+# --- CONFIGURATION (overridden by ws_load.py) ---
+SETTINGS = {
+    "latency": 0.4,       # seconds before the first token
+    "token_rate": 80.0,   # tokens per second after that
+    "min_tokens": 20,
+    "max_tokens": 220,
+    "jitter": 0.1,        # +/- fraction applied to latency
+}
+CALLS = {"sync": 0, "async": 0}
+
+WORDS = (
+    "sure here is what i found the answer depends on a few things first second finally "
+    "python code example result weather today search item price list plan step note"
+).split()
+
+def configure(api_key=None, **kwargs):
+    pass
+
+def _plan(model_name, prompt):
+    """Reply text and total latency, both derived from the prompt."""
+    seed = int(hashlib.sha1(f"{model_name}|{prompt}".encode()).hexdigest()[:12], 16)
+    rng = random.Random(seed)
+    tokens = rng.randint(SETTINGS["min_tokens"], SETTINGS["max_tokens"])
+    if "pro" in model_name: tokens = int(tokens * 1.5)
+    text = " ".join(rng.choice(WORDS) for _ in range(tokens)).capitalize() + "."
+    jitter = 1 + rng.uniform(-SETTINGS["jitter"], SETTINGS["jitter"])
+    delay = SETTINGS["latency"] * jitter + tokens / SETTINGS["token_rate"]
+    return text, delay
+
+def _prompt_text(message):
+    if isinstance(message, (list, tuple)):
+        return " ".join(m if isinstance(m, str) else f"<{type(m).__name__}>" for m in message)
+    return str(message)
+
+class _Response:
+    def __init__(self, text):
+        self.text = text
+        finish = types.SimpleNamespace(name="STOP")
+        self.candidates = [types.SimpleNamespace(finish_reason=finish)]
+
+def _turn(role, text):
+    return types.SimpleNamespace(role=role, parts=[types.SimpleNamespace(text=text)])
+
+class ChatSession:
+    def __init__(self, model, history=None):
+        self.model = model
+        self.history = list(history or [])
+
+    def _record(self, prompt, text):
+        self.history.append(_turn("user", prompt))
+        self.history.append(_turn("model", text))
+        return _Response(text)
+
+    def send_message(self, message, **kwargs):
+        CALLS["sync"] += 1
+        prompt = _prompt_text(message)
+        text, delay = _plan(self.model.model_name, prompt)
+        time.sleep(delay)
+        return self._record(prompt, text)
+
+    async def send_message_async(self, message, **kwargs):
+        CALLS["async"] += 1
+        prompt = _prompt_text(message)
+        text, delay = _plan(self.model.model_name, prompt)
+        await asyncio.sleep(delay)
+        return self._record(prompt, text)
+
+class GenerativeModel:
+    def __init__(self, model_name="gemini-2.5-flash", system_instruction=None, **kwargs):
+        self.model_name = model_name
+        self.system_instruction = system_instruction
+
+    def start_chat(self, history=None, **kwargs):
+        return ChatSession(self, history)
+
+    def generate_content(self, contents, **kwargs):
+        text, delay = _plan(self.model_name, _prompt_text(contents))
+        time.sleep(delay)
+        return _Response(text)
+
+def install():
+    """Registers this module as google.generativeai before the agent imports it."""
+    import sys
+    module = sys.modules[__name__]
+    google = sys.modules.get("google") or types.ModuleType("google")
+    if not hasattr(google, "__path__"): google.__path__ = []
+    google.generativeai = module
+    sys.modules.setdefault("google", google)
+    sys.modules["google.generativeai"] = module
+    return module
@@ -0,0 +1,279 @@
+"""
+End-to-end load test for the /ws endpoint.
+
+Runs the real FastAPI app in-process on a fake Gemini backend (bench/fake_genai.py)
+with tool side effects stubbed out, then drives N concurrent WebSocket clients
+through user messages replayed from agent/sessions. Prints a JSON report.
+
+    python bench/ws_load.py --clients 20 --messages 10 --latency 0.4 --token-rate 80
+
+Nothing is written to the real brain.json, sessions or state database: the run
+uses a temporary directory that is removed afterwards.
+"""
+import os
+import re
+import sys
+import json
+import glob
+import time
+import types
+import random
+import shutil
+import asyncio
+import argparse
+import tempfile
+import threading
+import statistics
+import contextlib
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCH_DIR)
+if ROOT_DIR not in sys.path: sys.path.insert(0, ROOT_DIR)
+
+import fake_genai
+
+SESSIONS_GLOB = os.path.join(ROOT_DIR, "agent", "sessions", "*.json")
+CONTEXT_PREFIX = re.compile(r"^\[SYSTEM:.*?\]\s*", re.S)
+FALLBACK_MESSAGES = [
+    "hi", "what can you do", "what time is it", "explain how a hash map works",
+    "write a python function to reverse a list", "search for python asyncio tutorial",
+    "what's the weather like", "compare tea and coffee", "tell me a joke", "thanks",
+]
+LAG_INTERVAL = 0.05  # seconds between event-loop lag probes
+
+# ==========================================
+# 1. MESSAGE MIX
+# ==========================================
+def load_message_mix(pattern=SESSIONS_GLOB):
+    """User turns from saved sessions, with the injected context header removed."""
+    messages = []
+    for path in glob.glob(pattern):
+        try:
+            with open(path, "r") as f: history = json.load(f).get("history", [])
+        except (OSError, ValueError):
+            continue
+        for turn in history:
+            if turn.get("role") != "user": continue
+            parts = turn.get("parts", [])
+            text = " ".join(p.get("text", "") if isinstance(p, dict) else str(p) for p in parts)
+            text = CONTEXT_PREFIX.sub("", text).strip()
+            if text and not text.startswith("SYSTEM:"): messages.append(text[:500])
+    return messages or list(FALLBACK_MESSAGES)
+
+# ==========================================
+# 2. STUBBED SIDE EFFECTS
+# ==========================================
+def install_stubs(tool_latency):
+    """Replaces GUI, browser, e-mail and network side effects with sleeps of `tool_latency`."""
+    fake_genai.install()
+
+    gui = types.ModuleType("pyautogui")
+    gui.press = gui.hotkey = gui.write = lambda *a, **k: time.sleep(tool_latency / 10)
+    gui.screenshot = lambda *a, **k: time.sleep(tool_latency)
+    sys.modules["pyautogui"] = gui
+
+    ddgs = types.ModuleType("duckduckgo_search")
+    class DDGS:
+        def text(self, query, max_results=3):
+            time.sleep(tool_latency)
+            return [{"title": f"Result {i} for {query}", "href": f"https://example.com/{i}"} for i in range(max_results)]
+    ddgs.DDGS = DDGS
+    sys.modules["duckduckgo_search"] = ddgs
+
+    import webbrowser, smtplib
+    webbrowser.open = lambda *a, **k: True
+    os.system = lambda *a, **k: 0
+    class SMTP:
+        def __init__(self, *a, **k): time.sleep(tool_latency)
+        def __getattr__(self, name): return lambda *a, **k: None
+    smtplib.SMTP = SMTP
+
+    import tools
+    from agent.metrics import instrument_tool
+    def find_deal(product, forced_platform=None):
+        time.sleep(tool_latency * 5)
+        return {"platform": "Amazon", "price": 999, "url": "https://example.com/item", "title": product}
+    def shopping(product, forced_platform=None, best_deal=None):
+        deal = best_deal or find_deal(product, forced_platform)
+        return f"Found {product} for ₹{deal['price']}."
+    tools.shopper.find_best_deal = find_deal
+    tools.shopper.execute_shopping = shopping
+
+    async def get_weather(city):
+        await asyncio.sleep(tool_latency)
+        return f"{city}: ☀️ +31°C"
+    tools.get_weather = tools.AVAILABLE_TOOLS["get_weather"] = instrument_tool("get_weather", get_weather)
+
+def isolate_state(workdir, rpm=0):
+    """
+    Points every on-disk store at a scratch directory. The key scheduler runs with
+    `rpm` requests per minute per model (0 = unlimited), so by default the report
+    measures the server rather than the 60 RPM production quota.
+    """
+    os.environ["MIRO_STATE_DB"] = os.path.join(workdir, "state.db")
+    os.environ.setdefault("GOOGLE_API_KEY", "bench")   # the scheduler only hands out configured keys
+    from agent import memory, memory_index, router, scheduler
+    if not rpm:
+        scheduler.MAX_INFLIGHT = 10 ** 6
+    for brain in scheduler.RPM: scheduler.RPM[brain] = float(rpm) if rpm else 1e9
+    scheduler.SCHEDULER._keys = None   # buckets are built with the limits above on first use
+    sessions = os.path.join(workdir, "sessions")
+    os.makedirs(sessions, exist_ok=True)
+    memory.MEMORY_FILE = os.path.join(workdir, "brain.json")
+    memory.SESSIONS_DIR = memory_index.SESSIONS_DIR = sessions
+    memory.USERS_DIR = os.path.join(workdir, "users")
+    memory_index._INDEX = memory_index.MemoryIndex(os.path.join(workdir, "memory_index.db"))
+    router.ROUTING.path = os.path.join(workdir, "routing.jsonl")
+
+# ==========================================
+# 3. SERVER (own thread + loop, lag probe)
+# ==========================================
+class BenchServer:
+    def __init__(self, port):
+        self.port = port
+        self.lag = []
+        self.loop = None
+        self.server = None
+        self.thread = None
+
+    async def _probe(self):
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(LAG_INTERVAL)
+            self.lag.append(max(0.0, time.perf_counter() - start - LAG_INTERVAL))
+
+    async def _serve(self):
+        probe = asyncio.create_task(self._probe())
+        try: await self.server.serve()
+        finally: probe.cancel()
+
+    def start(self):
+        import uvicorn
+        from agent.assistant import app
+        config = uvicorn.Config(app, host="127.0.0.1", port=self.port, log_level="error", lifespan="on")
+        self.server = uvicorn.Server(config)
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_until_complete, args=(self._serve(),), daemon=True)
+        self.thread.start()
+        deadline = time.time() + 15
+        while not self.server.started:
+            if time.time() > deadline: raise RuntimeError("Bench server did not start")
+            time.sleep(0.05)
+
+    def stop(self):
+        self.server.should_exit = True
+        self.thread.join(timeout=10)
+
+# ==========================================
+# 4. CLIENTS
+# ==========================================
+async def run_client(url, messages, think, timeout, results):
+    import websockets
+    async with websockets.connect(url, max_size=None) as ws:
+        for text in messages:
+            sent = time.perf_counter()
+            await ws.send(json.dumps({"text": text}))
+            try:
+                while True:
+                    frame = await asyncio.wait_for(ws.recv(), timeout)
+                    if isinstance(frame, str) and frame.startswith("{"):
+                        kind = json.loads(frame).get("type")
+                        if kind == "ping":
+                            await ws.send(json.dumps({"type": "pong"}))
+                            continue
+                        if kind == "upgrade":
+                            results["upgrades"] += 1
+                            continue
+                    break
+                latency = time.perf_counter() - sent
+                results["latency"].append(latency)
+                if isinstance(frame, str) and frame.startswith("Error"): results["errors"] += 1
+            except asyncio.TimeoutError:
+                results["timeouts"] += 1
+            if think: await asyncio.sleep(think)
+
+def percentile(values, pct):
+    if not values: return None
+    ordered = sorted(values)
+    k = min(len(ordered) - 1, max(0, int(round(pct / 100 * (len(ordered) - 1)))))
+    return ordered[k]
+
+def summarise(values, scale=1000.0):
+    if not values: return {"p50": None, "p90": None, "p99": None, "max": None, "mean": None}
+    return {
+        "p50": round(percentile(values, 50) * scale, 2),
+        "p90": round(percentile(values, 90) * scale, 2),
+        "p99": round(percentile(values, 99) * scale, 2),
+        "max": round(max(values) * scale, 2),
+        "mean": round(statistics.fmean(values) * scale, 2),
+    }
+
+async def drive(args, mix):
+    rng = random.Random(args.seed)
+    results = {"latency": [], "errors": 0, "timeouts": 0, "upgrades": 0}
+    url = f"ws://127.0.0.1:{args.port}/ws"
+    plans = [[rng.choice(mix) for _ in range(args.messages)] for _ in range(args.clients)]
+
+    started = time.perf_counter()
+    outcomes = await asyncio.gather(
+        *(run_client(f"{url}?client=bench-{i}", plan, args.think, args.timeout, results) for i, plan in enumerate(plans)),
+        return_exceptions=True
+    )
+    duration = time.perf_counter() - started
+    failed = [repr(o) for o in outcomes if isinstance(o, BaseException)]
+    return results, duration, failed
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test Miro's /ws endpoint with a fake model.")
+    parser.add_argument("--clients", type=int, default=10)
+    parser.add_argument("--messages", type=int, default=5, help="messages per client")
+    parser.add_argument("--latency", type=float, default=0.4, help="fake model first-token latency (s)")
+    parser.add_argument("--token-rate", type=float, default=80.0, help="fake model tokens per second")
+    parser.add_argument("--tool-latency", type=float, default=0.2, help="stubbed tool duration (s)")
+    parser.add_argument("--think", type=float, default=0.0, help="client pause between messages (s)")
+    parser.add_argument("--timeout", type=float, default=60.0, help="per-reply timeout (s)")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--rpm", type=float, default=0, help="scheduler requests/minute per model (0 = unlimited)")
+    parser.add_argument("--output", help="also write the JSON report to this file")
+    args = parser.parse_args()
+
+    fake_genai.SETTINGS.update(latency=args.latency, token_rate=args.token_rate)
+    mix = load_message_mix()
+    workdir = tempfile.mkdtemp(prefix="miro-bench-")
+    # The agent's emoji logging goes to stderr so stdout stays parseable JSON
+    with contextlib.redirect_stdout(sys.stderr):
+        try:
+            isolate_state(workdir, args.rpm)
+            install_stubs(args.tool_latency)
+            server = BenchServer(args.port)
+            server.start()
+            try:
+                results, duration, failed = asyncio.run(drive(args, mix))
+            finally:
+                server.stop()
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    completed = len(results["latency"])
+    report = {
+        "config": vars(args),
+        "message_mix": len(mix),
+        "requests": completed,
+        "errors": results["errors"],
+        "timeouts": results["timeouts"],
+        "client_failures": failed,
+        "upgrades": results["upgrades"],
+        "duration_s": round(duration, 3),
+        "throughput_rps": round(completed / duration, 2) if duration else 0.0,
+        "latency_ms": summarise(results["latency"]),
+        "loop_lag_ms": summarise(server.lag),
+        "model_calls": dict(fake_genai.CALLS),
+    }
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w") as f: f.write(text + "\n")
+
+if __name__ == "__main__":
+    main()
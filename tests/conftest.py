@@ -0,0 +1,6 @@
+import os
+import sys
+
+# Tests import the app the way bench/ does: agent.* and the top-level modules from the repo root
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT_DIR not in sys.path: sys.path.insert(0, ROOT_DIR)
@@ -0,0 +1,87 @@
+import json
+
+import pytest
+
+pytest.importorskip("googleapiclient")
+from googleapiclient.http import HttpMockSequence
+
+from agent.google_tools import GoogleTools
+
+BOUNDARY = "batch_miro"
+
+class Creds:
+    def __init__(self, token):
+        self.token = token
+
+class Auth:
+    """Stand-in for the auth manager: one user, a token the test can 'refresh'."""
+    def __init__(self):
+        self.creds = Creds("token-1")
+        self.listeners = []
+
+    def get_creds(self, user_id):
+        return self.creds
+
+    def add_refresh_listener(self, listener):
+        self.listeners.append(listener)
+
+def message(msg_id, sender, subject):
+    return {"id": msg_id, "payload": {"headers": [{"name": "From", "value": sender}, {"name": "Subject", "value": subject}]}}
+
+def batch_response(messages):
+    parts = []
+    for msg in messages:
+        parts.append(
+            f"--{BOUNDARY}\r\nContent-Type: application/http\r\nContent-ID: <response-x + {msg['id']}>\r\n\r\n"
+            f"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n\r\n{json.dumps(msg)}\r\n"
+        )
+    body = "".join(parts) + f"--{BOUNDARY}--"
+    return {"status": "200", "content-type": f'multipart/mixed; boundary="{BOUNDARY}"'}, body
+
+def inbox_sequence(messages):
+    listing = json.dumps({"messages": [{"id": m["id"]} for m in messages]})
+    return HttpMockSequence([({"status": "200"}, listing), batch_response(messages)])
+
+def test_check_emails_fetches_all_metadata_in_one_batch():
+    messages = [message("m1", "ana@example.com", "Lunch"), message("m2", "bo@example.com", "Invoice"),
+                message("m3", "cy@example.com", "Hello")]
+    http = inbox_sequence(messages)
+    tools = GoogleTools(Auth(), http_factory=lambda creds: http)
+
+    summary = tools.check_emails("u1")
+
+    assert summary.splitlines() == [
+        "From: ana@example.com | Subject: Lunch",
+        "From: bo@example.com | Subject: Invoice",
+        "From: cy@example.com | Subject: Hello",
+    ]
+    uris = [uri for uri, _, _, _ in http.request_sequence]
+    assert len(uris) == 2                      # the list call, then a single batch
+    assert "/messages" in uris[0] and "batch" in uris[1]
+    batch_body = http.request_sequence[1][2]
+    assert all(f"/messages/{m['id']}" in batch_body for m in messages)
+
+def test_service_is_cached_until_the_token_changes():
+    auth = Auth()
+    built = []
+    def factory(creds):
+        built.append(creds.token)
+        return inbox_sequence([message("m1", "ana@example.com", "Lunch")])
+    tools = GoogleTools(auth, http_factory=factory)
+
+    assert "Lunch" in tools.check_emails("u1")
+    assert tools._get_service("u1", "gmail", "v1") is tools._get_service("u1", "gmail", "v1")
+    assert built == ["token-1"]
+
+    auth.creds = Creds("token-2")              # refreshed credentials
+    assert "Lunch" in tools.check_emails("u1")
+    assert built == ["token-1", "token-2"]
+
+def test_refresh_listener_drops_cached_services():
+    auth = Auth()
+    built = []
+    tools = GoogleTools(auth, http_factory=lambda creds: built.append(creds.token) or HttpMockSequence([]))
+    tools._get_service("u1", "gmail", "v1")
+    for listener in auth.listeners: listener("u1")
+    tools._get_service("u1", "gmail", "v1")
+    assert built == ["token-1", "token-1"]
@@ -0,0 +1,60 @@
+import datetime
+
+import pytest
+
+from agent import memory_index
+from agent.memory_index import MemoryIndex, parse_date_range
+
+NOW = datetime.datetime(2026, 3, 18, 15, 30)   # a Wednesday afternoon
+DAY = datetime.datetime(2026, 3, 18)
+
+@pytest.mark.parametrize("question, expected", [
+    ("what did we talk about yesterday", (DAY - datetime.timedelta(days=1), DAY)),
+    ("anything today?", (DAY, NOW)),
+    ("recap last week", (DAY - datetime.timedelta(days=7), NOW)),
+    ("what about last month", (DAY - datetime.timedelta(days=30), NOW)),
+    ("between 2026-01-02 and 2026-01-05",
+     (datetime.datetime(2026, 1, 2), datetime.datetime(2026, 1, 6))),
+    ("what did I say about tea", (None, None)),
+])
+def test_parse_date_range(question, expected):
+    assert parse_date_range(question, now=NOW) == expected
+
+@pytest.fixture
+def index(tmp_path, monkeypatch):
+    monkeypatch.setattr(memory_index, "SESSIONS_DIR", str(tmp_path / "sessions"))
+    return MemoryIndex(str(tmp_path / "index.db"))
+
+def turn(role, text):
+    return {"role": role, "parts": [{"text": text}]}
+
+def test_search_finds_keywords_and_honours_dates(index):
+    saved = datetime.datetime(2026, 3, 10, 12).timestamp()
+    index.index_session("aaaa0001", [turn("user", "I planted tomatoes"), turn("model", "Nice, tomatoes love sun")], saved)
+    rows = index.search("tomatoes")
+    assert {text for _, _, text, _ in rows} == {"I planted tomatoes", "Nice, tomatoes love sun"}
+    assert index.search("tomatoes", start=datetime.datetime(2026, 3, 11)) == []
+
+def test_index_session_only_adds_new_turns(index):
+    history = [turn("user", "first question about rust")]
+    index.index_session("aaaa0002", history)
+    index.index_session("aaaa0002", history + [turn("model", "rust answer")])
+    assert len(index.search("rust", limit=10)) == 2
+
+def test_search_only_returns_the_callers_rows(index):
+    index.index_session("aaaa0003", [turn("user", "alice loves pineapple")], user="alice")
+    index.index_session("bbbb0003", [turn("user", "bob hates pineapple")], user="bob")
+    index.index_session("cccc0003", [turn("user", "legacy pineapple chat")])      # saved before owners existed
+    index.index_brain([turn("user", "alice pineapple brain")], "alice")
+
+    found = lambda user: {text for _, _, text, _ in index.search("pineapple", limit=10, user=user)}
+    assert found("alice") == {"alice loves pineapple", "alice pineapple brain", "legacy pineapple chat"}
+    assert found("bob") == {"bob hates pineapple", "legacy pineapple chat"}
+    assert found(None) == {"legacy pineapple chat"}
+
+def test_reindexed_session_follows_its_owner(index):
+    history = [turn("user", "secret mango recipe")]
+    index.index_session("dddd0004", history)
+    index.index_session("dddd0004", history, user="carol")
+    assert index.search("mango", user="dave") == []
+    assert len(index.search("mango", user="carol")) == 1
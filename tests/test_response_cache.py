@@ -0,0 +1,34 @@
+import pytest
+
+from agent.response_cache import ResponseCache
+
+CONTEXT = "default|alice|Revanth|-"
+
+@pytest.mark.parametrize("prompt", [
+    "hi", "why", "tell me more", "yes do it", "what is it used for",   # short or anaphoric
+    "what time is it now", "search for python tutorials",              # time-dependent or side effects
+])
+def test_bypassed_prompts(prompt):
+    cache = ResponseCache()
+    assert not cache.cacheable(prompt)
+    cache.store(prompt, CONTEXT, "answer")
+    assert cache.lookup(prompt, CONTEXT) is None
+    assert not cache.entries
+
+def test_similar_prompt_hits_within_threshold():
+    cache = ResponseCache(threshold=0.8)
+    cache.store("what can you do", CONTEXT, "Lots.")
+    assert cache.lookup("What can you do?", CONTEXT) == "Lots."
+    assert cache.lookup("what can you do for me", CONTEXT) == "Lots."
+    assert cache.lookup("explain how a hash map works", CONTEXT) is None
+
+def test_threshold_is_respected():
+    cache = ResponseCache(threshold=0.99)
+    cache.store("what can you do", CONTEXT, "Lots.")
+    assert cache.lookup("what can you do for me", CONTEXT) is None
+
+def test_entries_are_scoped_by_context_and_expire():
+    cache = ResponseCache(ttl=-1)
+    cache.store("who made you", CONTEXT, "Revanth did.")
+    assert cache.lookup("who made you", "default|bob|Bob|-") is None
+    assert cache.lookup("who made you", CONTEXT) is None       # negative ttl: already stale
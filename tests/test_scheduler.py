@@ -0,0 +1,64 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from agent import scheduler
+from agent.scheduler import ApiKey, Scheduler, is_rate_limited
+
+class RateLimited(Exception):
+    code = 429
+
+def chat():
+    return SimpleNamespace(model=SimpleNamespace())
+
+@pytest.fixture(autouse=True)
+def no_sdk_binding(monkeypatch):
+    # Keys bind the real SDK clients when it is installed; calls here never leave the test
+    monkeypatch.setattr(ApiKey, "bind", lambda self, c: c)
+
+@pytest.mark.parametrize("error, limited", [
+    (RateLimited("slow down"), True),
+    (type("ResourceExhausted", (Exception,), {})("quota"), True),
+    (RuntimeError("429 Too Many Requests"), True),
+    (RuntimeError("500 Internal"), False),
+    (ValueError("bad prompt"), False),
+])
+def test_is_rate_limited(error, limited):
+    assert is_rate_limited(error) is limited
+
+def test_429_cools_the_key_down_and_retries_on_another():
+    first, second = ApiKey("a", "sa", ("flash",)), ApiKey("b", "sb", ("flash",))
+    sched = Scheduler([first, second])
+    used = []
+    async def call(bound):
+        used.append(next(k.name for k in sched.keys if k.inflight["flash"]))
+        if len(used) == 1: raise RateLimited("quota exceeded")
+        return "ok"
+
+    assert asyncio.run(sched.run("flash", chat(), call)) == "ok"
+    assert used == ["a", "b"]
+    assert first.strikes["flash"] == 1 and first.buckets["flash"].tokens < 1
+    cooling = first.cooldown["flash"] - time.monotonic()
+    assert 0 < cooling <= scheduler.BACKOFF_BASE
+    assert first.ready_in("flash", 0) > 0 and second.ready_in("flash", 0) == 0
+    assert first.inflight["flash"] == second.inflight["flash"] == 0
+
+def test_retry_hint_sets_the_cooldown():
+    key = ApiKey("a", "sa", ("flash",))
+    sched = Scheduler([key])
+    async def grab():
+        granted = await sched.acquire("flash")
+        sched.release(granted, "flash", RateLimited("429: retry_delay 7s"))
+    asyncio.run(grab())
+    assert 6 < key.cooldown["flash"] - time.monotonic() <= 7
+
+def test_success_clears_strikes():
+    key = ApiKey("a", "sa", ("flash",))
+    key.strikes["flash"] = 3
+    sched = Scheduler([key])
+    async def once():
+        sched.release(await sched.acquire("flash"), "flash")
+    asyncio.run(once())
+    assert key.strikes["flash"] == 0 and key.cooldown["flash"] == 0.0
@@ -0,0 +1,34 @@
+import wave
+
+import pytest
+
+from agent import stt
+
+def write_wav(path, frames, rate=stt.SAMPLE_RATE, channels=1):
+    with wave.open(str(path), "wb") as wav:
+        wav.setnchannels(channels)
+        wav.setsampwidth(2)
+        wav.setframerate(rate)
+        wav.writeframes(frames)
+    return str(path)
+
+def test_read_wav_returns_pcm_and_rate(tmp_path):
+    path = write_wav(tmp_path / "a.wav", b"\x01\x00" * 800, rate=8000)
+    pcm, rate = stt.read_wav(path)
+    assert rate == 8000 and len(pcm) == 1600
+
+def test_read_wav_rejects_stereo(tmp_path):
+    path = write_wav(tmp_path / "stereo.wav", b"\x00\x00" * 1600, channels=2)
+    with pytest.raises(ValueError):
+        stt.read_wav(path)
+
+@pytest.mark.skipif(not stt.available(), reason="Vosk or its model (MIRO_STT_MODEL) is not installed")
+def test_transcribe_short_wav(tmp_path):
+    seconds = 1.5
+    path = write_wav(tmp_path / "silence.wav", b"\x00\x00" * int(stt.SAMPLE_RATE * seconds))
+    updates = stt.transcribe_wav(path, chunk_seconds=0.1)
+    times = [at for at, _, _ in updates]
+    assert times == sorted(times) and all(0 < at <= seconds for at in times)
+    assert all(kind in ("partial", "final") for _, kind, _ in updates)
+    # Nothing was said, so no utterance may come out with words in it
+    assert not [text for _, kind, text in updates if kind == "final" and text]
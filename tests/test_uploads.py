@@ -0,0 +1,43 @@
+import pytest
+
+from agent import uploads
+from agent.uploads import UploadAssembler, UploadError, pack_binary_frame, parse_binary_frame
+
+def test_frame_round_trip():
+    header, payload = parse_binary_frame(pack_binary_frame({"type": "upload", "id": "a"}, b"abc"))
+    assert header == {"type": "upload", "id": "a"}
+    assert bytes(payload) == b"abc"
+
+@pytest.mark.parametrize("frame", [
+    b"\x00\x00",                                   # shorter than the length prefix
+    b"\x00\x00\x00\x10{}",                         # header length past the end
+    b"\x00\x00\x00\x03{x}",                        # not JSON
+    b"\x00\x00\x00\x02[]",                         # JSON, but not an object
+])
+def test_bad_frames_raise_upload_error(frame):
+    with pytest.raises(UploadError):
+        parse_binary_frame(frame)
+
+def test_chunks_are_joined_on_the_final_frame():
+    assembler = UploadAssembler()
+    assert assembler.feed({"id": "f", "final": False}, b"hello ") is None
+    fileobj = assembler.feed({"id": "f", "final": True}, b"world")
+    assert fileobj.read() == b"hello world"
+    assert not assembler.pending
+
+def test_upload_size_limit(monkeypatch):
+    monkeypatch.setattr(uploads, "MAX_UPLOAD_BYTES", 10)
+    assembler = UploadAssembler()
+    assembler.feed({"id": "big", "final": False}, b"x" * 6)
+    with pytest.raises(UploadError):
+        assembler.feed({"id": "big", "final": False}, b"x" * 6)
+    assert "big" not in assembler.pending      # the partial file is discarded
+
+def test_open_upload_limit():
+    assembler = UploadAssembler()
+    for i in range(uploads.MAX_OPEN_UPLOADS):
+        assembler.feed({"id": str(i), "final": False}, b"x")
+    with pytest.raises(UploadError):
+        assembler.feed({"id": "one-too-many", "final": False}, b"x")
+    assembler.close()
+    assert not assembler.pending
@@ -2,34 +2,52 @@ import os
 import ssl
 import smtplib
 import urllib.parse
-import asyncio
 import platform
 import subprocess
 import aiohttp
 import logging
 import webbrowser
-import pyautogui
+import importlib
 import time
 import re
 from datetime import datetime
 from typing import Optional, Union, List, Dict
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
-from duckduckgo_search import DDGS
-from selenium import webdriver
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.common.by import By
-from selenium.webdriver.common.keys import Keys
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from webdriver_manager.chrome import ChromeDriverManager
 
 logger = logging.getLogger("Tools")
 
-# Global In-Memory state
+# --- LAZY HEAVY IMPORTS ---
+# pyautogui, duckduckgo_search and selenium are only needed when a tool actually
+# runs, so importing this module stays cheap for the agent's startup path.
+def _gui():
+    return importlib.import_module("pyautogui")
+
+def _ddgs():
+    return importlib.import_module("duckduckgo_search").DDGS
+
+# Shared state (SQLite-backed so every uvicorn worker sees the same cart)
+from agent.state_store import get_state_store
+from agent.metrics import instrument_tool
+from agent.executors import PoolBusy, PoolTimeout, run_in_pool
+
+async def _offload(pool, func, *args, busy="I'm still busy with the last request.", **kwargs):
+    """Runs blocking work on its resource pool (gui / network / browser / disk)."""
+    try:
+        return await run_in_pool(pool, func, *args, **kwargs)
+    except PoolBusy:
+        return busy
+    except PoolTimeout:
+        return "That took too long, so I stopped waiting."
+
 class GlobalStore:
-    cart: List[Dict] = []
-    
+    @property
+    def cart(self) -> List[Dict]:
+        return get_state_store().get("cart", "default", [])
+
+    def add_to_cart(self, item: Dict) -> List[Dict]:
+        return get_state_store().append("cart", "default", item)
+
 STORE = GlobalStore()
 
 # ==========================================
@@ -38,6 +56,7 @@ STORE = GlobalStore()
 async def set_volume(level: str) -> str:
     level = level.lower()
     def _perform_volume():
+        pyautogui = _gui()
         if "up" in level:
             for _ in range(5): pyautogui.press("volumeup")
             return "Volume Up."
@@ -48,35 +67,34 @@ async def set_volume(level: str) -> str:
             pyautogui.press("volumemute")
             return "Muted."
         return "Unchanged."
-    loop = asyncio.get_event_loop()
-    return await loop.run_in_executor(None, _perform_volume)
+    return await _offload("gui", _perform_volume)
 
 async def take_screenshot() -> str:
     def _perform_screenshot():
+        pyautogui = _gui()
         ts = datetime.now().strftime("%Y%m%d_%H%M%S")
         fn = f"screenshot_{ts}.png"
         pyautogui.screenshot(fn)
-        return fn
-    loop = asyncio.get_event_loop()
-    fn = await loop.run_in_executor(None, _perform_screenshot)
-    return f"Saved: {fn}"
+        return f"Saved: {fn}"
+    return await _offload("gui", _perform_screenshot)
 
 async def minimize_windows() -> str:
-    loop = asyncio.get_event_loop()
-    await loop.run_in_executor(None, lambda: pyautogui.hotkey('win', 'd'))
-    return "Desktop visible."
+    def _perform_minimize():
+        _gui().hotkey('win', 'd')
+        return "Desktop visible."
+    return await _offload("gui", _perform_minimize)
 
 async def open_application(app_name: str) -> str:
     app_name = app_name.lower().strip()
     app_map = {"chrome": "start chrome", "notepad": "notepad", "calc": "calc", "code": "code"}
     def _perform_open():
+        pyautogui = _gui()
         if app_map.get(app_name):
             os.system(app_map[app_name])
             return f"Opened {app_name}"
         pyautogui.press("win"); time.sleep(0.2); pyautogui.write(app_name); time.sleep(0.2); pyautogui.press("enter")
         return f"Launched {app_name}"
-    loop = asyncio.get_event_loop()
-    return await loop.run_in_executor(None, _perform_open)
+    return await _offload("gui", _perform_open)
 
 # ==========================================
 # 2. WEB & INFO TOOLS (PRESERVED)
@@ -89,14 +107,13 @@ async def get_weather(city: str) -> str:
         async with aiohttp.ClientSession() as session:
             async with session.get(f"https://wttr.in/{city}?format=3", timeout=5) as resp:
                 return (await resp.text()).strip() if resp.status == 200 else "Weather unavailable."
-    except: return "Weather Error."
+    except Exception: return "Weather Error."  # not CancelledError: jobs must stay cancellable
 
 async def search_web(query: str) -> str:
     try:
-        loop = asyncio.get_event_loop()
-        res = await loop.run_in_executor(None, lambda: list(DDGS().text(query, max_results=3)))
+        res = await run_in_pool("network", lambda: list(_ddgs()().text(query, max_results=3)))
         return "\n".join([f"- {r['title']}: {r['href']}" for r in res]) if res else "No results."
-    except: return "Search failed."
+    except Exception: return "Search failed."
 
 async def send_email(
     to_email: str,
@@ -157,16 +174,35 @@ async def send_email(
             return f"Email failed: {str(e)}"
 
     # 2. Run in Background
-    loop = asyncio.get_event_loop()
-    return await loop.run_in_executor(None, _send_blocking)
+    return await _offload("network", _send_blocking, busy="Email queue is full. Try again in a moment.")
 
 async def open_website(site: str, q: str = None) -> str:
     url = f"https://www.google.com/search?q={q}" if q else f"https://www.{site}.com"
-    webbrowser.open(url)
+    # webbrowser.open can block for seconds while it launches the browser
+    await _offload("gui", webbrowser.open, url)
     return f"Opened {url}"
 
+async def get_past_memory(query: str, start_date: Optional[str] = None, end_date: Optional[str] = None,
+                          user: Optional[str] = None) -> str:
+    """Searches the user's past conversations (local full-text index). Dates are YYYY-MM-DD."""
+    from agent.memory_index import get_memory_index, parse_date_range
+    try:
+        start = datetime.fromisoformat(start_date) if start_date else None
+        end = datetime.fromisoformat(end_date) if end_date else None
+        if not (start or end): start, end = parse_date_range(query)
+        rows = await run_in_pool("disk", get_memory_index().search, query, start, end, user=user)
+    except Exception as e:
+        return f"Memory search failed: {e}"
+    if not rows: return "No matching past conversations."
+    lines = []
+    for source, role, text, ts in rows:
+        when = datetime.fromtimestamp(ts).strftime("%b %d %Y %I:%M %p") if ts else "unknown date"
+        who = "User" if role == "user" else "Miro"
+        lines.append(f"- [{when}] {who}: {text[:300]}")
+    return "\n".join(lines)
+
 async def manage_shopping(action: str, item: str="", price: float=0) -> str:
-    if action == "add": STORE.cart.append({"name": item, "price": price}); return "Added."
+    if action == "add": STORE.add_to_cart({"name": item, "price": price}); return "Added."
     return str(STORE.cart)
 
 async def book_ride(a: str, b: str) -> str: return "Ride booked."
@@ -180,6 +216,10 @@ class PersonalShopper:
         self.driver = None
 
     def _get_driver(self):
+        from selenium import webdriver
+        from selenium.webdriver.chrome.service import Service
+        from webdriver_manager.chrome import ChromeDriverManager
+
         if self.driver:
             try: 
                 self.driver.current_url
@@ -209,6 +249,9 @@ class PersonalShopper:
 
     def check_platform(self, driver, wait, platform, product):
         """Scrapes price and url from a specific platform."""
+        from selenium.webdriver.common.by import By
+        from selenium.webdriver.common.keys import Keys
+        from selenium.webdriver.support import expected_conditions as EC
         data = {"platform": platform, "price": 99999999, "url": "", "title": ""}
         
         try:
@@ -273,7 +316,10 @@ class PersonalShopper:
         except Exception as e: print(f"Error checking {platform}: {e}")
         return data
 
-    def execute_shopping(self, product, forced_platform=None):
+    def find_best_deal(self, product, forced_platform=None):
+        """Price comparison only. Nothing is clicked, so it may run before the order is confirmed."""
+        from selenium.webdriver.support.ui import WebDriverWait
+
         driver = self._get_driver()
         wait = WebDriverWait(driver, 5)
         
@@ -295,10 +341,18 @@ class PersonalShopper:
             else:
                 best_deal = amazon_deal
 
-        # 2. BUY EXECUTION
         if not best_deal["url"]:
             return f"❌ Could not find URL for '{product}'."
+        return best_deal
+
+    def execute_shopping(self, product, forced_platform=None, best_deal=None):
+        from selenium.webdriver.common.by import By
+
+        if best_deal is None: best_deal = self.find_best_deal(product, forced_platform)
+        if isinstance(best_deal, str): return best_deal  # nothing found
 
+        # 2. BUY EXECUTION
+        driver = self._get_driver()
         print(f"🚀 Winning Deal: {best_deal['platform']} at ₹{best_deal['price']}. Opening...")
         driver.get(best_deal["url"])
         
@@ -328,13 +382,19 @@ class PersonalShopper:
 
 shopper = PersonalShopper()
 
-async def shop_online(product_query: str, platform: str) -> str:
-    loop = asyncio.get_event_loop()
-    return await loop.run_in_executor(None, shopper.execute_shopping, product_query, platform)
+async def compare_prices(product_query: str, platform: str):
+    """Best deal dict (or an error string) without buying; see agent/prefetch.py."""
+    return await _offload("browser", shopper.find_best_deal, product_query, platform,
+                          busy="I'm already shopping for something. One order at a time!")
+
+async def shop_online(product_query: str, platform: str, best_deal: Optional[dict] = None) -> str:
+    return await _offload("browser", shopper.execute_shopping, product_query, platform, best_deal,
+                          busy="I'm already shopping for something. One order at a time!")
 
 AVAILABLE_TOOLS = {
     "get_system_time": get_system_time,
     "get_weather": get_weather,
+    "get_past_memory": get_past_memory,
     "search_web": search_web,
     "send_email": send_email,
     "open_website": open_website,
@@ -345,5 +405,11 @@ AVAILABLE_TOOLS = {
     "take_screenshot": take_screenshot,
     "minimize_windows": minimize_windows,
     "open_application": open_application,
-    "shop_online": shop_online 
-}
\ No newline at end of file
+    "shop_online": shop_online,
+    "compare_prices": compare_prices
+}
+
+# Every tool call is timed (miro_tool_seconds). Module names are rebound too,
+# so direct calls like tools.get_weather(...) are measured as well.
+for _name, _func in list(AVAILABLE_TOOLS.items()):
+    AVAILABLE_TOOLS[_name] = globals()[_name] = instrument_tool(_name, _func)
@@ -0,0 +1,181 @@
+import cv2
+import time
+import math
+import numpy as np
+import pyautogui
+
+# --- DEPENDENCIES ---
+# Run: pip install cvzone mediapipe pyautogui tensorflow
+# Only imported inside the vision process. TensorFlow (via cvzone's
+# ClassificationModule) is deferred until sign mode is first used.
+
+# ==========================================
+# 1. OPTIMIZED VIRTUAL MOUSE LOGIC (FIXED)
+# ==========================================
+class VirtualMouse:
+    def __init__(self):
+        # Safety: Prevents crash when mouse hits corner
+        pyautogui.FAILSAFE = False
+        self.wScr, self.hScr = pyautogui.size()
+
+        # TWEAK THESE FOR SMOOTHNESS
+        self.frameR = 100        # Box size (Lower = more sensitive)
+        self.smoothening = 5     # Lower (3-5) = Faster, Higher (7-10) = Smoother but slower
+
+        self.plocX, self.plocY = 0, 0
+        self.clocX, self.clocY = 0, 0
+        self.last_click_time = 0 # For non-blocking click
+
+    def process(self, img, hands, detector, draw=True):
+        if not hands: return img
+
+        hand = hands[0]
+        lmList = hand['lmList']
+        fingers = detector.fingersUp(hand)
+
+        # Draw Boundary Box (Move hand inside this box to cover full screen)
+        h, w, _ = img.shape
+        frameR = int(self.frameR * w / 640)  # same box at any input size (browser frames are smaller)
+        if draw: cv2.rectangle(img, (frameR, frameR), (w - frameR, h - frameR), (255, 0, 255), 2)
+
+        # 1. Moving Mode: Index Finger Up Only
+        if fingers[1] == 1 and fingers[2] == 0:
+            x1, y1 = lmList[8][0], lmList[8][1]
+
+            # Convert Coordinates (Webcam -> Screen)
+            x3 = np.interp(x1, (frameR, w - frameR), (0, self.wScr))
+            y3 = np.interp(y1, (frameR, h - frameR), (0, self.hScr))
+
+            # Smoothening Logic (Exponential Moving Average)
+            self.clocX = self.plocX + (x3 - self.plocX) / self.smoothening
+            self.clocY = self.plocY + (y3 - self.plocY) / self.smoothening
+
+            # Move Mouse (Inverted X for natural mirror movement)
+            try: pyautogui.moveTo(self.wScr - self.clocX, self.clocY)
+            except: pass
+
+            if draw: cv2.circle(img, (x1, y1), 15, (255, 0, 255), cv2.FILLED)
+            self.plocX, self.plocY = self.clocX, self.clocY
+
+        # 2. Clicking Mode: Index + Middle Fingers Up
+        if fingers[1] == 1 and fingers[2] == 1:
+            if draw: length, info, img = detector.findDistance(lmList[8][0:2], lmList[12][0:2], img)
+            else: length, info = detector.findDistance(lmList[8][0:2], lmList[12][0:2])
+
+            # Click Threshold
+            if length < 40:
+                if draw: cv2.circle(img, (info[4], info[5]), 15, (0, 255, 0), cv2.FILLED)
+
+                # FIXED: Non-blocking timer instead of time.sleep()
+                if time.time() - self.last_click_time > 0.5: # 0.5s delay between clicks
+                    pyautogui.click()
+                    self.last_click_time = time.time()
+
+        return img
+
+# ==========================================
+# 2. EMBEDDED SIGN DETECTOR LOGIC
+# ==========================================
+class SignDetector:
+    def __init__(self):
+        self.classifier = None
+        self.labels = []
+        self.loaded = False
+
+    def load(self):
+        """Loads TensorFlow + the Keras model. Called on first use (or warm-up)."""
+        if self.loaded: return self.classifier
+        self.loaded = True
+        try:
+            from cvzone.ClassificationModule import Classifier
+            # Update these paths if your model is elsewhere
+            self.classifier = Classifier("sign_detection/Model/keras_model.h5", "sign_detection/Model/labels.txt")
+            print("✅ Sign Model Loaded.")
+        except ImportError:
+            print("❌ Missing libraries. Run: pip install cvzone tensorflow")
+        except:
+            print("⚠️ Sign Model not found at 'sign_detection/Model/'. Check paths.")
+        return self.classifier
+
+    def process(self, img, hands, draw=True):
+        if not hands or not self.load(): return img, None
+
+        hand = hands[0]
+        x, y, w, h = hand['bbox']
+
+        imgWhite = np.ones((300, 300, 3), np.uint8) * 255
+        imgCrop = img[y - 20:y + h + 20, x - 20:x + w + 20]
+
+        try:
+            aspectRatio = h / w
+            if aspectRatio > 1:
+                k = 300 / h
+                wCal = math.ceil(k * w)
+                imgResize = cv2.resize(imgCrop, (wCal, 300))
+                wGap = math.ceil((300 - wCal) / 2)
+                imgWhite[:, wGap:wCal + wGap] = imgResize
+            else:
+                k = 300 / w
+                hCal = math.ceil(k * h)
+                imgResize = cv2.resize(imgCrop, (300, hCal))
+                hGap = math.ceil((300 - hCal) / 2)
+                imgWhite[hGap:hCal + hGap, :] = imgResize
+
+            prediction, index = self.classifier.getPrediction(imgWhite, draw=False)
+            label = self.classifier.labels[index]
+
+            if draw:
+                cv2.rectangle(img, (x - 20, y - 20), (x + w + 20, y + h + 20), (255, 0, 255), 4)
+                cv2.putText(img, label, (x, y - 26), cv2.FONT_HERSHEY_COMPLEX, 1.7, (255, 255, 255), 2)
+
+            return img, label
+        except:
+            return img, None
+
+# ==========================================
+# 3. CLIENT-SIDE LANDMARKS (browser ingest)
+# ==========================================
+class HandGeometry:
+    """The two HandDetector helpers VirtualMouse needs, for hands that arrive as landmarks (no MediaPipe here)."""
+    tipIds = [4, 8, 12, 16, 20]
+
+    def fingersUp(self, hand):
+        lm = hand["lmList"]
+        if hand.get("type") == "Right": fingers = [1 if lm[4][0] > lm[3][0] else 0]
+        else: fingers = [1 if lm[4][0] < lm[3][0] else 0]
+        for tip in self.tipIds[1:]:
+            fingers.append(1 if lm[tip][1] < lm[tip - 2][1] else 0)
+        return fingers
+
+    def findDistance(self, p1, p2, img=None):
+        x1, y1 = p1
+        x2, y2 = p2
+        cx, cy = (x1 + x2) // 2, (y1 + y2) // 2
+        length = math.hypot(x2 - x1, y2 - y1)
+        info = (x1, y1, x2, y2, cx, cy)
+        if img is None: return length, info
+        cv2.line(img, (x1, y1), (x2, y2), (255, 0, 255), 3)
+        return length, info, img
+
+def hands_from_landmarks(data, max_size=(1280, 720)):
+    """
+    {"w": 640, "h": 480, "hands": [{"type": "Right", "lm": [[x, y, z], ...21]}]} with
+    normalised x/y (MediaPipe JS output) -> the dicts cvzone's findHands returns.
+    w/h come from the client and are clamped to max_size (w, h). Malformed input
+    raises ValueError, TypeError, KeyError, IndexError or OverflowError.
+    """
+    if not isinstance(data, dict): raise TypeError("landmarks payload must be an object")
+    w = min(max(int(data.get("w", 640)), 1), max_size[0])
+    h = min(max(int(data.get("h", 480)), 1), max_size[1])
+    hands = []
+    for item in data.get("hands", [])[:1]:
+        if not isinstance(item, dict): continue
+        points = item.get("lm", [])
+        if len(points) != 21: continue
+        lmList = [[int(p[0] * w), int(p[1] * h), int((p[2] if len(p) > 2 else 0) * w)] for p in points]
+        xs, ys = [p[0] for p in lmList], [p[1] for p in lmList]
+        bbox = (min(xs), min(ys), max(xs) - min(xs), max(ys) - min(ys))
+        center = (bbox[0] + bbox[2] // 2, bbox[1] + bbox[3] // 2)
+        hands.append({"lmList": lmList, "bbox": bbox, "center": center, "type": item.get("type", "Right")})
+    return hands, (w, h)
+
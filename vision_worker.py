@@ -0,0 +1,552 @@
+import os
+import sys
+import json
+import time
+import threading
+import numpy as np
+import multiprocessing as mp
+from multiprocessing import shared_memory
+
+# NOTE: cv2 / mediapipe / tensorflow are imported inside the worker process
+# only (see vision_engines.py), so the agent process starts without them.
+
+# --- CONFIGURATION ---
+WARMUP = os.getenv("MIRO_VISION_WARMUP") == "1"  # Preload models when the worker starts
+MAX_FRAME_SHAPE = (720, 1280, 3)  # Largest frame a FrameBuffer (and a landmark-only canvas) can hold
+HEADER_SLOTS = 4                  # seq, height, width, channels (uint64 each)
+HEADER_BYTES = HEADER_SLOTS * 8
+STATS_INTERVAL = 2.0              # Seconds between FPS / stage-time reports to the agent
+
+# Camera
+CAMERA_INDEX = int(os.getenv("MIRO_CAMERA_INDEX", "0"))
+CAMERA_SIZE = (640, 480)
+CAMERA_FPS = 30
+CAMERA_PROFILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".camera_profile.json")
+STANDBY_TIMEOUT = float(os.getenv("MIRO_CAMERA_STANDBY", "30"))  # Seconds kept warm after IDLE (0 = release at once)
+STANDBY_FPS = 2                   # Grab rate while warm
+
+# Display / preview
+# Headless: no cv2 window (default when there is no X display on Linux)
+HEADLESS = os.getenv("MIRO_VISION_HEADLESS") == "1" or (
+    sys.platform.startswith("linux") and not os.getenv("DISPLAY") and os.getenv("MIRO_VISION_HEADLESS") != "0"
+)
+OVERLAYS = os.getenv("MIRO_VISION_OVERLAYS", "1") != "0"  # Draw landmarks/boxes when someone is watching
+PREVIEW_FPS = float(os.getenv("MIRO_PREVIEW_FPS", "10"))
+PREVIEW_WIDTH = 480
+PREVIEW_QUALITY = 70
+PREVIEW_MAX_BYTES = 512 * 1024
+
+# Browser-camera ingest (frames or landmarks sent over the agent's WebSocket)
+# auto: use browser input while it keeps arriving, else the local camera
+VISION_SOURCE = os.getenv("MIRO_VISION_SOURCE", "auto")  # auto | camera | remote
+INGEST_MAX_AGE = 0.25             # Seconds; older input is stale and skipped
+INGEST_GRACE = 1.0                # Seconds without input before auto falls back to the camera
+INGEST_POLL = 0.005               # Wait between checks for the next browser frame
+INGEST_JPEG, INGEST_LANDMARKS = 0, 1
+
+# ==========================================
+# 1. SHARED-MEMORY FRAME TRANSPORT
+# ==========================================
+class FrameBuffer:
+    """
+    Single-slot frame buffer in shared memory, guarded by a sequence lock.
+    The writer bumps `seq` to odd before copying and to even after, so a reader
+    can detect torn frames without any lock or pickling.
+    """
+    def __init__(self, name=None, create=False, shape=MAX_FRAME_SHAPE):
+        size = HEADER_BYTES + int(np.prod(shape))
+        self.shm = shared_memory.SharedMemory(name=name, create=create, size=size if create else 0)
+        self.name = self.shm.name
+        self.header = np.ndarray((HEADER_SLOTS,), dtype=np.uint64, buffer=self.shm.buf[:HEADER_BYTES])
+        self.data = np.ndarray((int(np.prod(shape)),), dtype=np.uint8, buffer=self.shm.buf[HEADER_BYTES:])
+        if create: self.header[:] = 0
+
+    def write(self, img):
+        h, w = img.shape[:2]
+        c = img.shape[2] if img.ndim == 3 else 1
+        n = h * w * c
+        if n > self.data.size: return False
+        self.header[0] += 1                       # odd -> writing
+        self.header[1:4] = (h, w, c)
+        self.data[:n] = img.reshape(-1)
+        self.header[0] += 1                       # even -> stable
+        return True
+
+    def read(self, last_seq=0):
+        """Returns (seq, frame copy) or (last_seq, None) when nothing new/stable."""
+        for _ in range(3):
+            seq = int(self.header[0])
+            if seq == last_seq or seq % 2: return last_seq, None
+            h, w, c = (int(v) for v in self.header[1:4])
+            frame = self.data[:h * w * c].reshape((h, w, c)).copy()
+            if int(self.header[0]) == seq: return seq, frame
+        return last_seq, None
+
+    def close(self):
+        # Drop numpy views first, otherwise SharedMemory.close() raises BufferError
+        self.header = self.data = None
+        self.shm.close()
+
+    def unlink(self):
+        try: self.shm.unlink()
+        except FileNotFoundError: pass
+
+class JpegBuffer(FrameBuffer):
+    """The same seqlock slot holding one encoded preview JPEG (header: seq, length)."""
+    def __init__(self, name=None, create=False, size=PREVIEW_MAX_BYTES):
+        super().__init__(name=name, create=create, shape=(size,))
+
+    def write(self, encoded):
+        n = encoded.size
+        if n > self.data.size: return False
+        self.header[0] += 1
+        self.header[1] = n
+        self.data[:n] = encoded.reshape(-1)
+        self.header[0] += 1
+        return True
+
+    def read(self, last_seq=0):
+        """Returns (seq, jpeg bytes) or (last_seq, None) when nothing new/stable."""
+        for _ in range(3):
+            seq = int(self.header[0])
+            if seq == last_seq or seq % 2: return last_seq, None
+            data = self.data[:int(self.header[1])].tobytes()
+            if int(self.header[0]) == seq: return seq, data
+        return last_seq, None
+
+class IngestBuffer(JpegBuffer):
+    """Latest browser input (header: seq, length, kind, arrival ms). Newer writes overwrite older ones."""
+    def write(self, payload, kind=INGEST_JPEG):
+        n = len(payload)
+        if n > self.data.size: return False
+        self.header[0] += 1
+        self.header[1:4] = (n, kind, int(time.time() * 1000))
+        self.data[:n] = np.frombuffer(payload, dtype=np.uint8)
+        self.header[0] += 1
+        return True
+
+    def read(self, last_seq=0):
+        """Returns (seq, kind, arrived_ms, payload) or (last_seq, None, None, None)."""
+        for _ in range(3):
+            seq = int(self.header[0])
+            if seq == last_seq or seq % 2: return last_seq, None, None, None
+            n, kind, arrived = (int(v) for v in self.header[1:4])
+            payload = self.data[:n].tobytes()
+            if int(self.header[0]) == seq: return seq, kind, arrived, payload
+        return last_seq, None, None, None
+
+# ==========================================
+# 2. WORKER PROCESS (owns camera + models)
+# ==========================================
+def parse_command(command):
+    """Maps an agent command ("activate mouse", "stop", ...) to a vision mode."""
+    command = command.lower()
+    if "stop" in command or "disconnect" in command: return "IDLE"
+    if "mouse" in command: return "MOUSE"
+    if "sign" in command or "vision" in command: return "SIGN"
+    return None
+
+class StageTimer:
+    """Per-frame stage timings, flushed to the agent as ("stats", {...}) every STATS_INTERVAL."""
+    def __init__(self, conn):
+        self.conn = conn
+        self.reset()
+
+    def reset(self):
+        self.window_start = time.perf_counter()
+        self.frames = 0
+        self.stages = {}
+        self.dropped = 0
+        self.mark = None
+
+    def start_frame(self):
+        self.mark = time.perf_counter()
+
+    def lap(self, stage):
+        now = time.perf_counter()
+        self.stages.setdefault(stage, []).append(now - self.mark)
+        self.mark = now
+
+    def end_frame(self):
+        self.frames += 1
+
+    def flush(self, mode, force=False):
+        elapsed = time.perf_counter() - self.window_start
+        if elapsed < STATS_INTERVAL and not force: return
+        report = {"mode": mode, "fps": round(self.frames / elapsed, 2) if elapsed else 0.0, "stages": self.stages,
+                  "dropped": self.dropped}
+        try: self.conn.send(("stats", report))
+        except (OSError, EOFError): pass
+        self.reset()
+
+class CommandChannel:
+    """
+    Receives controller messages on a background thread. The frame loop reads
+    `mode` as a plain attribute (no pipe syscall per frame) and, when there is
+    nothing to capture, sleeps on a condition variable that a command wakes at once.
+    """
+    def __init__(self, conn):
+        self.conn = conn
+        self.cond = threading.Condition()
+        self.mode = "IDLE"
+        self.preview = False      # someone is watching the web preview
+        self.running = True
+        self.version = 0
+        threading.Thread(target=self._listen, name="vision-commands", daemon=True).start()
+
+    def _listen(self):
+        while self.running:
+            try: msg = self.conn.recv()
+            except (OSError, EOFError): msg = ("shutdown",)
+            if msg[0] == "shutdown": self._update(running=False)
+            elif msg[0] == "mode": self._update(mode=msg[1])
+            elif msg[0] == "preview": self._update(preview=msg[1])
+
+    def _update(self, mode=None, running=True, preview=None):
+        with self.cond:
+            if mode: self.mode = mode
+            if preview is not None: self.preview = preview
+            self.running = running
+            self.version += 1
+            self.cond.notify_all()
+
+    def set_mode(self, mode):
+        """Local mode change (e.g. 'q' in the preview window)."""
+        self._update(mode=mode)
+
+    def state(self):
+        """(version, mode) read together: pass the version to wait() so no command slips in between."""
+        with self.cond:
+            return self.version, self.mode
+
+    def wait(self, since, timeout=None):
+        """Blocks until a command newer than version `since` (returns at once if one already came) or `timeout` seconds."""
+        with self.cond:
+            self.cond.wait_for(lambda: self.version != since, timeout)
+
+class Camera:
+    """
+    cv2.VideoCapture with a warm standby state. The negotiated format (MJPG,
+    size, FPS) is cached on disk so later opens skip the probing.
+    """
+    def __init__(self, cv2, index=CAMERA_INDEX):
+        self.cv2 = cv2
+        self.index = index
+        self.cap = None
+        self.last_active = 0.0
+
+    @property
+    def is_open(self):
+        return self.cap is not None and self.cap.isOpened()
+
+    def _load_profile(self):
+        try:
+            with open(CAMERA_PROFILE, "r") as f: profile = json.load(f)
+            return profile if profile.get("index") == self.index else None
+        except (OSError, ValueError):
+            return None
+
+    def _negotiate(self, cap):
+        cv2 = self.cv2
+        cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*"MJPG"))
+        cap.set(cv2.CAP_PROP_FRAME_WIDTH, CAMERA_SIZE[0])
+        cap.set(cv2.CAP_PROP_FRAME_HEIGHT, CAMERA_SIZE[1])
+        cap.set(cv2.CAP_PROP_FPS, CAMERA_FPS)
+        code = int(cap.get(cv2.CAP_PROP_FOURCC))
+        profile = {
+            "index": self.index,
+            "fourcc": "".join(chr((code >> 8 * i) & 0xFF) for i in range(4)).strip("\x00"),
+            "width": int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)) or CAMERA_SIZE[0],
+            "height": int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)) or CAMERA_SIZE[1],
+            "fps": int(cap.get(cv2.CAP_PROP_FPS)) or CAMERA_FPS,
+        }
+        try:
+            with open(CAMERA_PROFILE, "w") as f: json.dump(profile, f)
+        except OSError:
+            pass
+        return profile
+
+    def open(self):
+        if self.is_open: return True
+        cv2 = self.cv2
+        cap = cv2.VideoCapture(self.index)
+        if not cap.isOpened(): return False
+        profile = self._load_profile()
+        if profile is None:
+            profile = self._negotiate(cap)
+        else:
+            if profile.get("fourcc") == "MJPG":
+                cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*"MJPG"))
+            cap.set(cv2.CAP_PROP_FRAME_WIDTH, profile["width"])
+            cap.set(cv2.CAP_PROP_FRAME_HEIGHT, profile["height"])
+            cap.set(cv2.CAP_PROP_FPS, profile["fps"])
+        cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)  # always hand out the newest frame
+        self.cap = cap
+        return True
+
+    def read(self):
+        self.last_active = time.monotonic()
+        return self.cap.read()
+
+    def keep_warm(self):
+        """Standby tick: grab without decoding so exposure and the driver stay settled."""
+        if self.is_open: self.cap.grab()
+
+    def idle_for(self):
+        return time.monotonic() - self.last_active
+
+    def release(self):
+        if self.cap is not None: self.cap.release()
+        self.cap = None
+
+class IngestReader:
+    """Latest-frame-wins consumer of the browser ingest slot."""
+    def __init__(self, buffer):
+        self.buffer = buffer
+        self.last_seq = 0
+        self.last_arrival = 0.0
+        self.dropped = 0
+
+    def poll(self):
+        """Newest fresh (kind, payload), or None. Overwritten and stale inputs count as dropped."""
+        seq, kind, arrived, payload = self.buffer.read(self.last_seq)
+        if payload is None: return None
+        if self.last_seq: self.dropped += max(0, (seq - self.last_seq) // 2 - 1)
+        self.last_seq = seq
+        self.last_arrival = arrived / 1000
+        if time.time() - self.last_arrival > INGEST_MAX_AGE:
+            self.dropped += 1
+            return None
+        return kind, payload
+
+    def active(self):
+        if VISION_SOURCE == "camera": return False
+        return VISION_SOURCE == "remote" or time.time() - self.last_arrival < INGEST_GRACE
+
+class PreviewEncoder:
+    """Downscales into a reused array and JPEG-encodes at most PREVIEW_FPS times a second."""
+    def __init__(self, cv2, buffer):
+        self.cv2 = cv2
+        self.buffer = buffer
+        self.small = None
+        self.params = [cv2.IMWRITE_JPEG_QUALITY, PREVIEW_QUALITY]
+        self.next_at = 0.0
+
+    def due(self):
+        return time.monotonic() >= self.next_at
+
+    def publish(self, img):
+        cv2 = self.cv2
+        h, w = img.shape[:2]
+        size = (PREVIEW_WIDTH, int(h * PREVIEW_WIDTH / w)) if w > PREVIEW_WIDTH else (w, h)
+        if self.small is None or self.small.shape[1::-1] != size:
+            self.small = np.empty((size[1], size[0], img.shape[2]), dtype=img.dtype)
+        cv2.resize(img, size, dst=self.small, interpolation=cv2.INTER_AREA)
+        ok, encoded = cv2.imencode(".jpg", self.small, self.params)
+        if ok: self.buffer.write(encoded)
+        self.next_at = time.monotonic() + 1 / PREVIEW_FPS
+
+def vision_worker(conn, preview_buffer_name=None, ingest_buffer_name=None):
+    import cv2
+    from vision_engines import VirtualMouse, SignDetector, HandGeometry, hands_from_landmarks
+
+    preview = PreviewEncoder(cv2, JpegBuffer(name=preview_buffer_name)) if preview_buffer_name else None
+    ingest = IngestReader(IngestBuffer(name=ingest_buffer_name)) if ingest_buffer_name else None
+    geometry = HandGeometry()
+    canvas = None  # reused blank frame for landmark-only input
+    commands = CommandChannel(conn)
+    camera = Camera(cv2)
+    detector = None  # MediaPipe graph, built on first activation
+    window_open = False
+
+    # Initialize Engines
+    mouse_engine = None
+    sign_engine = SignDetector()
+
+    def load_detector():
+        try:
+            from cvzone.HandTrackingModule import HandDetector
+        except ImportError:
+            print("❌ CRITICAL: Missing libraries. Run: pip install cvzone mediapipe pyautogui tensorflow")
+            return None
+        return HandDetector(maxHands=1)
+
+    if WARMUP:
+        detector = load_detector()
+        mouse_engine = VirtualMouse()
+        sign_engine.load()
+
+    timer = StageTimer(conn)
+    last_mode = "IDLE"
+    while commands.running:
+        version, mode = commands.state()
+        if mode != last_mode:
+            timer.flush(last_mode, force=True)
+            last_mode = mode
+
+        if mode == "IDLE":
+            if window_open:
+                cv2.destroyAllWindows()
+                window_open = False
+            # STANDBY: camera stays open and warm until the idle timeout, then OFF.
+            # Either way we sleep on the command channel, so a new mode wakes us at once.
+            if camera.is_open and camera.idle_for() >= STANDBY_TIMEOUT:
+                camera.release()
+                timer.reset()
+                timer.flush(mode, force=True)  # report 0 FPS while off
+            commands.wait(version, 1 / STANDBY_FPS if camera.is_open else None)
+            camera.keep_warm()
+            continue
+
+        if mode == "MOUSE" and mouse_engine is None:
+            mouse_engine = VirtualMouse()
+
+        # Nobody looking (headless, no web preview) -> no drawing, encoding or window
+        streaming = preview is not None and commands.preview
+        draw = OVERLAYS and (streaming or not HEADLESS)
+
+        # --- SOURCE: browser input while it keeps arriving, else the local camera ---
+        timer.start_frame()
+        remote = ingest.poll() if ingest else None
+        if ingest and ingest.active():
+            if camera.is_open and camera.idle_for() >= STANDBY_TIMEOUT: camera.release()
+            if remote is None:
+                commands.wait(version, INGEST_POLL)
+                continue
+            kind, payload = remote
+            if kind == INGEST_LANDMARKS:
+                try:
+                    # Client-supplied: a bad payload is a dropped frame, never a dead worker
+                    hands, (w, h) = hands_from_landmarks(json.loads(payload), MAX_FRAME_SHAPE[1::-1])
+                except (ValueError, TypeError, KeyError, IndexError, OverflowError):
+                    ingest.dropped += 1
+                    continue
+                if canvas is None or canvas.shape[:2] != (h, w): canvas = np.zeros((h, w, 3), np.uint8)
+                else: canvas[:] = 0
+                img, success, geo = canvas, True, geometry
+            else:
+                img = cv2.imdecode(np.frombuffer(payload, np.uint8), cv2.IMREAD_COLOR)
+                success = img is not None
+            timer.lap("decode")
+        else:
+            kind = None
+            if not camera.open():
+                print("❌ Camera unavailable.")
+                commands.set_mode("IDLE")
+                continue
+            success, img = camera.read()
+            timer.lap("capture")
+
+        if success and kind != INGEST_LANDMARKS:
+            if detector is None:
+                detector = load_detector()
+                if detector is None:
+                    commands.set_mode("IDLE")
+                    continue
+            # IMPORTANT: Don't flip for mouse, otherwise left is right
+            # img = cv2.flip(img, 1)
+
+            hands, img = detector.findHands(img, draw=draw, flipType=False)
+            geo = detector
+            timer.lap("detect")
+
+        if success:
+            if mode == "MOUSE":
+                img = mouse_engine.process(img, hands, geo, draw=draw)
+                if draw: cv2.putText(img, "MODE: MOUSE", (10, 50), cv2.FONT_HERSHEY_PLAIN, 2, (0, 255, 0), 2)
+
+            elif mode == "SIGN" and kind != INGEST_LANDMARKS:
+                # The classifier needs pixels: landmark-only input drives the mouse only
+                img, label = sign_engine.process(img, hands, draw=draw)
+                if draw: cv2.putText(img, f"MODE: SIGN ({label if label else ''})", (10, 50), cv2.FONT_HERSHEY_PLAIN, 2, (0, 255, 0), 2)
+
+            timer.lap(mode.lower())
+            if streaming and preview.due():
+                preview.publish(img)
+                timer.lap("preview")
+            if not HEADLESS:
+                cv2.imshow("Miro Vision", img)
+                window_open = True
+                if cv2.waitKey(1) & 0xFF == ord('q'):
+                    commands.set_mode("IDLE")
+                timer.lap("display")
+            timer.end_frame()
+        if ingest:
+            timer.dropped += ingest.dropped
+            ingest.dropped = 0
+        timer.flush(mode)
+
+    camera.release()
+    cv2.destroyAllWindows()
+
+# ==========================================
+# 3. CONTROLLER (lives in the agent process)
+# ==========================================
+class VisionProcess:
+    """Starts the vision worker on its own core and talks to it over a pipe."""
+    def __init__(self):
+        self.ctx = mp.get_context("spawn")
+        self.preview = None
+        self.ingest = None
+        self.process = None
+        self.conn = None
+        self.watchers = 0
+        self._lock = threading.Lock()
+
+    def start(self):
+        self.preview = JpegBuffer(create=True)
+        self.ingest = IngestBuffer(create=True)
+        # Agent workers (same or child processes) attach to these slots by name
+        os.environ["MIRO_VISION_PREVIEW"] = self.preview.name
+        os.environ["MIRO_VISION_INGEST"] = self.ingest.name
+        self.conn, child_conn = self.ctx.Pipe()
+        self.process = self.ctx.Process(
+            target=vision_worker, args=(child_conn, self.preview.name, self.ingest.name),
+            name="miro-vision", daemon=True
+        )
+        self.process.start()
+        threading.Thread(target=self._read_reports, name="miro-vision-stats", daemon=True).start()
+        return self
+
+    def _read_reports(self):
+        """Feeds the worker's FPS / stage reports into agent.metrics (served at /metrics)."""
+        from agent.metrics import record_vision_stats
+        conn = self.conn
+        while True:
+            try: msg = conn.recv()
+            except (OSError, EOFError): return
+            if msg and msg[0] == "stats": record_vision_stats(msg[1])
+
+    def send_command(self, command):
+        """Callback from AI Agent"""
+        if command.startswith("preview:"):
+            self.set_preview(command == "preview:on")
+            return
+        print(f"⚙️ Hardware Command: {command}")
+        mode = parse_command(command)
+        if mode: self._send(("mode", mode))
+
+    def set_preview(self, watching):
+        """Reference-counted across agent workers; the worker only encodes while count > 0."""
+        with self._lock:
+            before = self.watchers
+            self.watchers = max(0, self.watchers + (1 if watching else -1))
+            changed = (before == 0) != (self.watchers == 0)
+        if changed: self._send(("preview", self.watchers > 0))
+
+    def _send(self, msg):
+        # Commands arrive from the IPC server thread and the agent; keep pipe writes whole
+        if not self.conn: return
+        with self._lock:
+            try: self.conn.send(msg)
+            except (OSError, EOFError): pass
+
+    def stop(self):
+        self._send(("shutdown",))
+        if self.process:
+            self.process.join(timeout=3)
+            if self.process.is_alive(): self.process.terminate()
+        for buffer in (self.preview, self.ingest):
+            if buffer:
+                buffer.close()
+                buffer.unlink()
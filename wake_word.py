@@ -1,54 +1,258 @@
+import os
+import time
+import queue
+import asyncio
+import threading
+from collections import namedtuple
+
+import numpy as np
 import pvporcupine
 import pyaudio
-import struct
-import os
 from dotenv import load_dotenv
 
 load_dotenv()
 
+# --- CONFIGURATION ---
+ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+# Comma-separated .ppn files; the bundled "Hey Miro" model is the default
+KEYWORD_PATHS = os.getenv("MIRO_WAKE_KEYWORD", os.path.join(ROOT_DIR, "Hey-miro_en_windows_v4_0_0.ppn"))
+FALLBACK_KEYWORD = "jarvis"    # Built-in keyword when the .ppn is missing or built for another platform
+SENSITIVITY = float(os.getenv("MIRO_WAKE_SENSITIVITY", "0.6"))
+
+RING_SECONDS = 10       # Audio kept in memory (pre-roll and hand-off to speech recognition)
+PREROLL_SECONDS = 1.5   # Audio before the detection attached to each wake event
+
+VAD_RATIO = 3.0         # Voiced when frame RMS exceeds the noise floor by this factor...
+VAD_MIN_RMS = 200       # ...and this absolute int16 level (silent rooms would trigger on hiss)
+VAD_HANGOVER = 0.6      # Seconds the keyword engine keeps running after the voice stops
+VAD_LOOKBACK = 0.3      # Seconds before the voice onset replayed into the engine
+NOISE_ADAPT = 0.05      # Noise floor smoothing while quiet (1/20th of this while voiced)
+IDLE_BATCH = 4          # Frames checked per wake-up while nobody is speaking
+
+WakeEvent = namedtuple("WakeEvent", "keyword position timestamp preroll")
+
+class AudioRing:
+    """
+    Fixed int16 ring written by the capture callback. Positions are absolute sample
+    counts, so a reader can ask for "everything since sample N" at any time; data
+    older than the ring's capacity is simply gone.
+    """
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.buffer = np.zeros(capacity, dtype=np.int16)
+        self.written = 0
+        self._ready = threading.Condition()
+
+    def write(self, samples):
+        n = len(samples)
+        with self._ready:
+            if n > self.capacity:
+                self.written += n - self.capacity
+                samples = samples[-self.capacity:]
+                n = self.capacity
+            start = self.written % self.capacity
+            first = min(n, self.capacity - start)
+            self.buffer[start:start + first] = samples[:first]
+            if first < n: self.buffer[:n - first] = samples[first:]
+            self.written += n
+            self._ready.notify_all()
+
+    def view(self, start, length):
+        """Samples [start, start+length) as a view when they don't wrap, else a copy."""
+        i = start % self.capacity
+        if i + length <= self.capacity: return self.buffer[i:i + length]
+        return np.concatenate((self.buffer[i:], self.buffer[:i + length - self.capacity]))
+
+    def read(self, start, end=None):
+        """Copy of samples [start, end), clipped to what is still in the ring."""
+        with self._ready:
+            end = self.written if end is None else min(end, self.written)
+            start = max(start, end - self.capacity, 0)
+            if start >= end: return np.zeros(0, dtype=np.int16)
+            return np.array(self.view(start, end - start))
+
+    def wait(self, position, timeout):
+        """Blocks until `position` samples exist (or timeout). Returns samples written."""
+        with self._ready:
+            self._ready.wait_for(lambda: self.written >= position, timeout)
+            return self.written
+
+class EnergyGate:
+    """
+    RMS voice gate with an adaptive noise floor. It costs one dot product per frame,
+    so the keyword engine only runs while someone is actually making noise.
+    """
+    def __init__(self, ratio=VAD_RATIO, min_rms=VAD_MIN_RMS):
+        self.ratio = ratio
+        self.min_rms = min_rms
+        self.noise = float(min_rms) / ratio
+
+    def is_voiced(self, pcm):
+        samples = pcm.astype(np.float32)
+        rms = float(np.sqrt(np.dot(samples, samples) / len(samples)))
+        voiced = rms > max(self.min_rms, self.noise * self.ratio)
+        # Creep up slowly while voiced so a fan switching on doesn't hold the gate open forever
+        self.noise += (NOISE_ADAPT / 20 if voiced else NOISE_ADAPT) * (rms - self.noise)
+        return voiced
+
+def _keyword_name(path):
+    """'Hey-miro_en_windows_v4_0_0.ppn' -> 'hey miro'"""
+    return os.path.basename(path).split("_")[0].replace("-", " ").lower()
+
+def create_engine(access_key):
+    """Porcupine on the custom keyword files, falling back to a built-in keyword."""
+    paths = [p.strip() for p in KEYWORD_PATHS.split(",") if p.strip()]
+    found = [p for p in paths if os.path.exists(p)]
+    if found:
+        try:
+            engine = pvporcupine.create(access_key=access_key, keyword_paths=found,
+                                        sensitivities=[SENSITIVITY] * len(found))
+            return engine, [_keyword_name(p) for p in found]
+        except pvporcupine.PorcupineError as e:
+            print(f"⚠️ Keyword file rejected ({e}). Falling back to '{FALLBACK_KEYWORD}'.")
+    else:
+        print(f"⚠️ No keyword file at {', '.join(paths)}. Falling back to '{FALLBACK_KEYWORD}'.")
+    engine = pvporcupine.create(access_key=access_key, keywords=[FALLBACK_KEYWORD], sensitivities=[SENSITIVITY])
+    return engine, [FALLBACK_KEYWORD]
+
 class WakeWordListener:
+    """
+    PortAudio's callback thread copies each buffer into an AudioRing; a detector
+    thread reads int16 views of it, gates them on energy and feeds only voiced
+    audio to Porcupine. Wake events go to an asyncio queue (start(loop)) or, for
+    scripts, to listen().
+    """
     def __init__(self):
         self.access_key = os.getenv("PICOVOICE_API_KEY") # Add this to your .env
         if not self.access_key:
             raise ValueError("❌ Missing PICOVOICE_API_KEY in .env file")
 
-        # Initialize Porcupine with "Jarvis" (Built-in)
-        # You can change keywords=['picovoice'] or ['computer'] if you prefer.
         try:
-            self.porcupine = pvporcupine.create(
-                access_key=self.access_key,
-                keywords=['jarvis'] 
-            )
+            self.porcupine, self.keywords = create_engine(self.access_key)
         except Exception as e:
             print(f"❌ Porcupine Error: {e}")
             raise
 
+        self.sample_rate = self.porcupine.sample_rate
+        self.frame_length = self.porcupine.frame_length
+        # Whole frames only, so a frame never wraps and view() never copies
+        frames = int(RING_SECONDS * self.sample_rate) // self.frame_length
+        self.ring = AudioRing(frames * self.frame_length)
+        self.gate = EnergyGate()
+
+        self.loop = None
+        self.events = None          # asyncio.Queue once start(loop) is called
+        self._sync_events = queue.Queue(maxsize=8)
+        self._running = threading.Event()
+        self._thread = None
+        self.pa = None
+        self.audio_stream = None
+
+    # --- CAPTURE ---
+    def _capture(self, in_data, frame_count, time_info, status):
+        self.ring.write(np.frombuffer(in_data, dtype=np.int16))
+        return None, pyaudio.paContinue
+
+    def start(self, loop=None):
+        """Opens the microphone and starts detecting. With a loop, events go to self.events."""
+        if self._running.is_set(): return self
+        if loop is not None:
+            self.loop = loop
+            self.events = asyncio.Queue(maxsize=8)
         self.pa = pyaudio.PyAudio()
         self.audio_stream = self.pa.open(
-            rate=self.porcupine.sample_rate,
+            rate=self.sample_rate,
             channels=1,
             format=pyaudio.paInt16,
             input=True,
-            frames_per_buffer=self.porcupine.frame_length
+            frames_per_buffer=self.frame_length,
+            stream_callback=self._capture
         )
+        self._running.set()
+        self._thread = threading.Thread(target=self._detect, name="miro-wake-word", daemon=True)
+        self._thread.start()
+        print(f"👂 Wake word listener active ({', '.join(self.keywords)})")
+        return self
 
-    def listen(self):
-        """
-        Listens for the wake word. Returns True when heard.
-        """
+    # --- DETECTION ---
+    def _detect(self):
+        frame = self.frame_length
+        lookback = int(VAD_LOOKBACK * self.sample_rate) // frame * frame
+        hangover = max(1, int(VAD_HANGOVER * self.sample_rate / frame))
+        position = self.ring.written
+        active = 0   # frames left before the engine goes back to sleep
+
+        while self._running.is_set():
+            batch = 1 if active else IDLE_BATCH
+            written = self.ring.wait(position + frame * batch, timeout=0.5)
+            if written - position > self.ring.capacity - frame:
+                position = written - lookback   # fell behind: only recent audio matters
+            while position + frame <= written:
+                pcm = self.ring.view(position, frame)
+                start = position
+                position += frame
+                if self.gate.is_voiced(pcm):
+                    if not active:
+                        # Onset: the first syllable was probably below threshold
+                        for earlier in range(max(0, start - lookback), start, frame):
+                            self._process(self.ring.view(earlier, frame), earlier + frame)
+                    active = hangover
+                elif active:
+                    active -= 1
+                else:
+                    continue
+                self._process(pcm, position)
+
+    def _process(self, pcm, position):
         try:
-            pcm = self.audio_stream.read(self.porcupine.frame_length)
-            pcm = struct.unpack_from("h" * self.porcupine.frame_length, pcm)
             keyword_index = self.porcupine.process(pcm)
-
-            if keyword_index >= 0:
-                return True
         except Exception as e:
             print(f"🎤 Audio Error: {e}")
-            
-        return False
+            return
+        if keyword_index < 0: return
+        preroll = self.ring.read(position - int(PREROLL_SECONDS * self.sample_rate), position)
+        self._deliver(WakeEvent(self.keywords[keyword_index], position, time.time(), preroll))
+
+    def _deliver(self, event):
+        if self.loop is not None:
+            self.loop.call_soon_threadsafe(self._put, self.events, event)
+        else:
+            self._put(self._sync_events, event)
+
+    @staticmethod
+    def _put(target, event):
+        # Stale wake events are worthless: drop the oldest rather than block the detector
+        try:
+            target.put_nowait(event)
+        except (asyncio.QueueFull, queue.Full):
+            target.get_nowait()
+            target.put_nowait(event)
+
+    # --- CONSUMERS ---
+    def audio_since(self, position):
+        """
+        (int16 samples captured after `position`, position to continue from). Start
+        from a WakeEvent's position to hear what was said after the wake word.
+        """
+        end = self.ring.written
+        return self.ring.read(position, end), end
+
+    def listen(self, timeout=None):
+        """
+        Blocks until the wake word is heard. Returns True when heard.
+        """
+        if not self._running.is_set(): self.start()
+        try:
+            self._sync_events.get(timeout=timeout)
+            return True
+        except queue.Empty:
+            return False
 
     def close(self):
-        if self.audio_stream: self.audio_stream.close()
+        self._running.clear()
+        if self._thread: self._thread.join(timeout=1)
+        if self.audio_stream:
+            self.audio_stream.stop_stream()
+            self.audio_stream.close()
         if self.pa: self.pa.terminate()
-        self.porcupine.delete()
\ No newline at end of file
+        self.porcupine.delete()